@@ -1,6 +1,8 @@
 import streamlit as st
 
 from src.utils.i18n import get_text
+from src.utils.instrumentation import is_enabled
+from src.utils.warmup import show_warmup_status, start_warmup
 
 
 # Default language
@@ -38,6 +40,10 @@ with col2:
 st.session_state["lang"] = lang_options[selected_lang]
 
 
+# Cache warm-up (runs once per server process, in the background)
+show_warmup_status(start_warmup(), st.session_state["lang"], details=is_enabled('debug'))
+
+
 # Navigation titles
 home_title = (
     "Início"
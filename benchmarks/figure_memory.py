@@ -0,0 +1,124 @@
+"""Concurrent chart rendering check: no figure leaks and bounded memory.
+
+Usage:
+    python -m benchmarks.figure_memory [--charts 1000] [--threads 8] [--dpi 72]
+                                       [--max-growth-mb 64]
+
+The analysis page charts of a synthetic 100-year station are rendered --charts
+times to PNG on a pool of --threads threads, the way concurrent Streamlit sessions
+render them. After a warm-up round (fonts, glyph and text caches), the resident
+memory must not grow by more than --max-growth-mb, no Figure may survive its
+rendering, and pyplot must never be imported. Exits with status 1 otherwise.
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run_benchmarks import synthetic_series
+from src.functions.analysis import analyze_station
+from src.functions.charts import figure_png, plot_cdf_daily_max_precipitation, plot_idf_curves, plot_monthly_average_precipitation, plot_pdf_daily_max_precipitation, plot_spi, plot_time_series
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def live_figures() -> int:
+    from matplotlib.figure import Figure
+
+    gc.collect()
+    return sum(isinstance(obj, Figure) for obj in gc.get_objects())
+
+
+def chart_factories(analysis: dict, raw_data) -> list:
+    """One callable per chart of the explorer and analysis pages."""
+    daily = raw_data.assign(**{'Data Medicao': lambda df: df['Data Medicao'].astype('datetime64[ns]')})
+    return [
+        lambda: plot_monthly_average_precipitation(None, 'mem', analysis['monthly_dataset'],
+                                                   rainy_season_start=analysis['hydro_init'], lang='en'),
+        lambda: plot_pdf_daily_max_precipitation(None, 'mem', analysis['pdf_data'], lang='en'),
+        lambda: plot_cdf_daily_max_precipitation(None, 'mem', analysis['cdf_data'], lang='en'),
+        lambda: plot_idf_curves(None, 'mem', 'en', analysis['rainfall_matrix']),
+        lambda: plot_spi(None, 'mem', analysis['spi_dataset'], lang='en'),
+        lambda: plot_time_series(None, 'mem', daily, 'Data Medicao',
+                                 'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)', 'mm', lang='en'),
+    ]
+
+
+def render(factory, dpi: int) -> int:
+    return len(figure_png(factory(), dpi=dpi).getbuffer())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render charts concurrently and check that memory stays bounded.')
+    parser.add_argument('--charts', type=int, default=1000,
+                        help='Number of charts to render (default: 1000; lower it for a quick run)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Rendering threads (default: 8)')
+    parser.add_argument('--dpi', type=int, default=72,
+                        help='PNG resolution (default: 72)')
+    parser.add_argument('--max-growth-mb', type=float, default=64.0,
+                        help='Allowed RSS growth after the warm-up round, in MB (default: 64)')
+    args = parser.parse_args()
+
+    raw_data = synthetic_series()
+    factories = chart_factories(analyze_station(raw_data), raw_data)
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        # Warm-up: one round of every chart on every thread
+        list(pool.map(lambda i: render(factories[i % len(factories)], args.dpi),
+                      range(len(factories) * args.threads)))
+        gc.collect()
+        rss_start = current_rss_mb()
+
+        start = time.perf_counter()
+        sizes = list(pool.map(lambda i: render(factories[i % len(factories)], args.dpi),
+                              range(args.charts)))
+        elapsed = time.perf_counter() - start
+
+    remaining = live_figures()
+    rss_end = current_rss_mb()
+    growth = rss_end - rss_start
+
+    print(f"Rendered {len(sizes)} charts on {args.threads} threads in {elapsed:.1f} s "
+          f"({len(sizes) / elapsed:.1f} charts/s, {sum(sizes) / 2 ** 20:.1f} MB of PNG)")
+    print(f"RSS after warm-up {rss_start:.1f} MB, after the run {rss_end:.1f} MB "
+          f"(growth {growth:+.1f} MB, peak {peak_rss_mb():.1f} MB)")
+    print(f"Figures still alive: {remaining}")
+
+    failures = []
+    if growth > args.max_growth_mb:
+        failures.append(f"RSS grew by {growth:.1f} MB (limit {args.max_growth_mb:.0f} MB)")
+    if remaining:
+        failures.append(f"{remaining} figures were not freed")
+    if 'matplotlib.pyplot' in sys.modules:
+        failures.append("matplotlib.pyplot was imported by the chart layer")
+
+    if failures:
+        print("Figure memory failures:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("Figure memory bounded.")
+
+
+if __name__ == "__main__":
+    main()
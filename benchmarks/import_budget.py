@@ -0,0 +1,115 @@
+"""Import-time budget of the home page path (cold start).
+
+Usage:
+    python -m benchmarks.import_budget [--budget-ms 2500] [--repeat 3] [--top 15]
+
+The module-level imports of app.py and pages/home.py are executed in a fresh
+interpreter with -X importtime. The best total of --repeat runs is compared with
+the budget, and the heavy modules that only the analysis pages need (scipy
+submodules, matplotlib) must not be imported at all. Exits with status 1 when the
+budget is exceeded or a deferred module is imported.
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HOME_PATH_FILES = ['app.py', os.path.join('pages', 'home.py')]
+
+# Imported on first use by src/functions; the home page must not pay for them
+DEFERRED_MODULES = [
+    'matplotlib',
+    'matplotlib.pyplot',
+    'scipy.optimize',
+    'scipy.spatial',
+    'scipy.special',
+    'scipy.stats',
+]
+
+
+def module_imports(path_file: str) -> list:
+    """Module-level import statements of a source file."""
+    with open(path_file, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+
+    return [ast.unparse(node) for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative import time (us) of every module, from -X importtime output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level after the separator
+        cumulative[name[1:].rstrip()] = int(cumulative_us)
+
+    return cumulative
+
+
+def measure() -> tuple[float, dict, list]:
+    """Run the home path imports once in a fresh interpreter.
+
+    :return: [0] = Total import time (ms), [1] = Cumulative time of the top-level imports (ms), [2] = Deferred modules imported
+    """
+    statements = []
+    for path_file in HOME_PATH_FILES:
+        statements += module_imports(os.path.join(ROOT, path_file))
+    code = '\n'.join(statements + [
+        'import sys',
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))",
+    ])
+
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    cumulative = parse_importtime(proc.stderr)
+
+    # Top-level entries are not indented; their cumulative times add up to the total
+    top_level = {name: us / 1e3 for name, us in cumulative.items() if not name.startswith(' ')}
+    imported = [m for m in proc.stdout.strip().split(',') if m]
+
+    return sum(top_level.values()), top_level, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check the import time of the RainData home page path.')
+    parser.add_argument('--budget-ms', type=float, default=2500.0,
+                        help='Maximum total import time in ms (default: 2500)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Fresh interpreters to run; the best one counts (default: 3)')
+    parser.add_argument('--top', type=int, default=15,
+                        help='Number of slowest imports to list (default: 15)')
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.repeat)]
+    total_ms, top_level, imported = min(runs, key=lambda r: r[0])
+
+    print(f"Home path import time: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms, "
+          f"best of {args.repeat})")
+    for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.0f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+    if imported:
+        failures.append(f"deferred modules imported on the home path: {', '.join(imported)}")
+
+    if failures:
+        print("Import budget failures:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("Import budget respected.")
+
+
+if __name__ == "__main__":
+    main()
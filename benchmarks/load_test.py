@@ -0,0 +1,221 @@
+"""Concurrent-session load test of the Streamlit pages.
+
+Usage:
+    python -m benchmarks.load_test [--sessions 4] [--walks 3] [--seed 0]
+                                   [--lang en] [--timeout 300] [--json results.json]
+
+Every simulated session is one AppTest of app.py that walks home -> explorer ->
+analysis --walks times with switch_page, each walk on a random station of data/
+(picked on the home map; the explorer's button hands it on to the analysis page), so the
+session state carries over from page to page as in a browser. Sessions run
+concurrently on threads of this process, so they share the st.cache_data /
+st.cache_resource caches exactly like the sessions of one server, and nothing
+goes over the network.
+
+Reported: p50/p95/p99 latency of every page, page views per second, failed runs
+and the peak RSS of the process. The first walk of a station pays the cache
+misses; run with more walks than stations to see the warm behaviour. The run
+takes place in a temporary working directory (where the explorer writes its ZIP)
+with its own station visit file, so the real results/station_visits.json and the
+warm-up ranking are left untouched.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from streamlit.testing.v1 import AppTest
+
+from src.functions.catalog import load_station_catalog
+from src.utils.i18n import get_text
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = os.path.join(ROOT, 'app.py')
+
+# Page -> path relative to app.py, in walking order
+PAGES = {
+    'home': 'pages/home.py',
+    'explorer': 'pages/explorer_page.py',
+    'analysis': 'pages/data_analysis_page.py',
+}
+
+# Read-only inputs linked into the temporary working directory
+LINKED_DIRS = ['data', 'rain_datasets', 'results', '.streamlit']
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile (q in 0-100)."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_page(at: AppTest, page: str, lang: str) -> tuple[float, str | None]:
+    """Move a session to a page and run it.
+
+    The analysis page is reached as a user reaches it, through the explorer's button
+    (which hands on the selected station); the other pages through the navigation.
+
+    :return: [0] = Latency (s), [1] = Error message (None when the page rendered)
+    """
+    go_to_analysis = [button for button in at.button
+                      if button.label == get_text('go_to_hydrologic_page', lang)]
+
+    start = time.perf_counter()
+    try:
+        if page == 'analysis' and go_to_analysis:
+            go_to_analysis[0].click().run()
+            # AppTest does not follow st.switch_page for the next runs of the session
+            at.switch_page(PAGES[page])
+        else:
+            at.switch_page(PAGES[page]).run()
+    except Exception as e:
+        return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+
+    if at.exception:
+        return elapsed, at.exception[0].value
+
+    return elapsed, None
+
+
+def session(session_id: int, stations: list, walks: int, lang: str, timeout: float,
+            results: list, lock: threading.Lock, seed: int):
+    rng = random.Random(seed + session_id)
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.session_state['lang'] = lang
+    try:
+        # switch_page needs a first run of the navigation
+        at.run()
+    except Exception as e:
+        with lock:
+            results.append({'session': session_id, 'walk': 0, 'page': 'home', 'station': None,
+                            'latency_s': 0.0, 'error': f"{type(e).__name__}: {e}"})
+        return
+
+    for walk in range(walks):
+        station = None
+        for page in PAGES:
+            if page == 'home':
+                station = rng.choice(stations)
+            latency, error = run_page(at, page, lang)
+            if page == 'home':
+                # The station clicked on the map
+                at.session_state['selected_station_code'] = station
+            with lock:
+                results.append({'session': session_id, 'walk': walk, 'page': page,
+                                'station': station, 'latency_s': latency, 'error': error})
+
+
+@contextmanager
+def isolated_run():
+    """Temporary working directory and station visit file for the duration of the run."""
+    from src.utils import warmup
+
+    previous_cwd, previous_visits = os.getcwd(), warmup.VISITS_FILE
+    with tempfile.TemporaryDirectory(prefix='raindata-load-') as workdir:
+        for name in LINKED_DIRS:
+            if os.path.exists(os.path.join(ROOT, name)):
+                os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+        warmup.VISITS_FILE = os.path.join(workdir, 'station_visits.json')
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous_cwd)
+            warmup.VISITS_FILE = previous_visits
+
+
+def summarize(results: list, wall_s: float) -> dict:
+    summary = {'wall_s': wall_s, 'page_views': len(results),
+               'throughput_per_s': len(results) / wall_s if wall_s else 0.0,
+               'peak_rss_mb': peak_rss_mb(), 'pages': {}}
+    for page in PAGES:
+        latencies = [r['latency_s'] for r in results if r['page'] == page]
+        if not latencies:
+            continue
+        summary['pages'][page] = {
+            'views': len(latencies),
+            'errors': sum(r['error'] is not None for r in results if r['page'] == page),
+            'mean_s': statistics.fmean(latencies),
+            'p50_s': percentile(latencies, 50),
+            'p95_s': percentile(latencies, 95),
+            'p99_s': percentile(latencies, 99),
+            'max_s': max(latencies),
+        }
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulate concurrent sessions walking through the RainData pages.')
+    parser.add_argument('--sessions', type=int, default=4,
+                        help='Concurrent sessions (default: 4)')
+    parser.add_argument('--walks', type=int, default=3,
+                        help='home -> explorer -> analysis walks per session (default: 3)')
+    parser.add_argument('--stations', type=int, default=None,
+                        help='Draw the stations from the first N with data (default: all)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the station draw (default: 0)')
+    parser.add_argument('--lang', choices=['pt', 'en'], default='en',
+                        help='Interface language (default: en)')
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help='Maximum time of one page run in s (default: 300)')
+    parser.add_argument('--json', default=None,
+                        help='Also write the summary and every page view to this file')
+    args = parser.parse_args()
+
+    catalog = load_station_catalog()
+    if catalog is None:
+        sys.exit("Station metadata not found in data/.")
+    stations = [code for code in catalog.codes if catalog.data_file(code)][:args.stations]
+
+    results = []
+    lock = threading.Lock()
+    with isolated_run():
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            futures = [pool.submit(session, i, stations, args.walks, args.lang, args.timeout,
+                                   results, lock, args.seed)
+                       for i in range(args.sessions)]
+            for future in futures:
+                future.result()
+        summary = summarize(results, time.perf_counter() - start)
+
+    print(f"{args.sessions} sessions x {args.walks} walks over {len(stations)} stations: "
+          f"{summary['page_views']} page views in {summary['wall_s']:.1f} s "
+          f"({summary['throughput_per_s']:.2f} views/s), peak RSS {summary['peak_rss_mb']:.0f} MB")
+    print(f"  {'page':<10} {'views':>5} {'errors':>6} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'max (s)':>8}")
+    for page, s in summary['pages'].items():
+        print(f"  {page:<10} {s['views']:5d} {s['errors']:6d} {s['p50_s']:8.2f} "
+              f"{s['p95_s']:8.2f} {s['p99_s']:8.2f} {s['max_s']:8.2f}")
+
+    errors = [r for r in results if r['error'] is not None]
+    for r in errors[:10]:
+        print(f"  error: {r['page']} {r['station']}: {r['error']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'page_views': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Benchmark suite for the hydrological analysis pipeline.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--repeat 5] [--save-baseline]
+                                        [--baseline benchmarks/baseline.json]
+                                        [--threshold 0.25] [--memory-threshold 0.25]
+
+Each stage of the analysis page (clean_dataset, annual maxima, KS fitting, SPI,
+IDF disaggregation) and the end-to-end page pipeline (analysis + chart rendering)
+is run on representative stations from data/ and on a synthetic 100-year series.
+For every case the best and median wall time of --repeat runs are recorded, plus
+the peak traced memory and the memory still allocated after one traced run.
+
+With --save-baseline the results are written to the baseline file. Otherwise they
+are compared against it and the script exits with status 1 when a case is slower
+(best wall time) or uses more peak memory than the baseline by more than the
+configured threshold.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.functions.analysis import analyze_station, assign_hydrological_year, prepare_extreme_dataset
+from src.functions.charts import plot_monthly_average_precipitation, plot_pdf_daily_max_precipitation, plot_cdf_daily_max_precipitation, plot_idf_curves, plot_spi, figure_png
+from src.functions.data import clean_dataset
+from src.functions.hydrology import compute_max_daily_preciptation, compute_max_precipitation_durations, desag_max_daily_preciptation_intesity, compute_spi
+from src.functions.nonstationary import fit_nonstationary_gev
+from src.functions.statistic import verify_probability_distribuition
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Representative stations: short, medium and 25-year records
+STATIONS = {
+    'short_A046': 'A046',
+    'medium_A034': 'A034',
+    'long_A001': 'A001',
+}
+
+SYNTHETIC_YEARS = 100
+
+
+def load_station(code: str) -> pd.DataFrame:
+    files = glob.glob(f"data/dados_{code}_*.parquet")
+    if not files:
+        raise FileNotFoundError(f"Data file for station {code} not found.")
+    return pd.read_parquet(files[0])
+
+
+def synthetic_series(n_years: int = SYNTHETIC_YEARS, seed: int = 42) -> pd.DataFrame:
+    """Daily series in the raw parquet schema with a seasonal wet-day regime.
+
+    About 2 % of the days are missing so every completeness rule is exercised.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('1925-01-01', periods=int(n_years * 365.25), freq='D')
+    wet_probability = 0.35 + 0.25 * np.cos(2 * np.pi * (dates.dayofyear - 15) / 365.25)
+    wet = rng.random(len(dates)) < wet_probability
+    precipitation = np.where(wet, rng.gamma(0.8, 12.0, len(dates)), 0.0)
+    precipitation[rng.random(len(dates)) < 0.02] = np.nan
+
+    return pd.DataFrame({
+        'Data Medicao': dates.strftime('%Y-%m-%d'),
+        'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)': np.round(precipitation, 1),
+    })
+
+
+def render_page_charts(name: str, analysis: dict):
+    """Render the five figures of the analysis page as 300 dpi PNGs."""
+    figures = [
+        plot_monthly_average_precipitation(None, name, analysis['monthly_dataset'],
+                                           rainy_season_start=analysis['hydro_init'], lang='en'),
+        plot_pdf_daily_max_precipitation(None, name, analysis['pdf_data'], lang='en'),
+        plot_cdf_daily_max_precipitation(None, name, analysis['cdf_data'], lang='en'),
+        plot_idf_curves(None, name, 'en', analysis['rainfall_matrix']),
+        plot_spi(None, name, analysis['spi_dataset'], lang='en'),
+    ]
+    for fig in figures:
+        figure_png(fig, dpi=300)
+
+
+def build_cases(name: str, raw_data: pd.DataFrame) -> dict:
+    """Return {stage: callable} with the inputs of every stage prepared beforehand."""
+    analysis = analyze_station(raw_data)
+    if analysis['dataset'].empty:
+        raise ValueError(f"{name}: no complete months after clean_dataset.")
+
+    extreme_dataset = assign_hydrological_year(
+        prepare_extreme_dataset(raw_data), analysis['method'], analysis['hydro_init'])
+    spi_input = analysis['spi_dataset'].drop(columns=['SPI_1'])
+
+    hmax1d = analysis['hmax1d']
+
+    return {
+        'clean_dataset': lambda: clean_dataset(raw_data),
+        'compute_max_daily_preciptation': lambda: compute_max_daily_preciptation(
+            extreme_dataset, hydro_init=analysis['hydro_init'], max_missing_days=15),
+        'compute_max_precipitation_durations': lambda: compute_max_precipitation_durations(
+            extreme_dataset, hydro_init=analysis['hydro_init'], max_missing_days=15),
+        'verify_probability_distribuition': lambda: verify_probability_distribuition(
+            analysis['hmax1d']),
+        'fit_nonstationary_gev': lambda: fit_nonstationary_gev(
+            hmax1d['precipitacao máxima anual (mm)'].to_numpy(), hmax1d['ano hidrologico'].to_numpy()),
+        'compute_spi': lambda: compute_spi(spi_input.copy()),
+        'desag_max_daily_preciptation_intesity': lambda: desag_max_daily_preciptation_intesity(
+            analysis['df_hmax']),
+        'page_pipeline': lambda: render_page_charts(name, analyze_station(raw_data)),
+    }
+
+
+def measure(func, repeat: int) -> dict:
+    """Wall time over repeat runs, then one run under tracemalloc for memory."""
+    func()  # warm-up (imports, caches)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    retained = after.compare_to(before, 'filename')
+
+    return {
+        'wall_s': min(times),
+        'wall_median_s': statistics.median(times),
+        'peak_mb': peak / 2 ** 20,
+        'retained_kb': sum(stat.size_diff for stat in retained) / 2 ** 10,
+        'retained_blocks': sum(stat.count_diff for stat in retained),
+    }
+
+
+def run(repeat: int, only: list | None = None) -> dict:
+    datasets = {name: load_station(code) for name, code in STATIONS.items()}
+    datasets[f'synthetic_{SYNTHETIC_YEARS}y'] = synthetic_series()
+
+    results = {}
+    for name, raw_data in datasets.items():
+        for stage, func in build_cases(name, raw_data).items():
+            if only and stage not in only:
+                continue
+            key = f"{name}/{stage}"
+            results[key] = measure(func, repeat)
+            r = results[key]
+            print(f"{key:<60} {r['wall_s'] * 1e3:10.2f} ms  "
+                  f"{r['peak_mb']:8.2f} MB peak  {r['retained_blocks']:7d} blocks")
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, memory_threshold: float) -> list:
+    """Return the list of regressions of current against baseline."""
+    regressions = []
+    for key, result in current['results'].items():
+        reference = baseline['results'].get(key)
+        if reference is None:
+            continue
+        for metric, limit in (('wall_s', threshold), ('peak_mb', memory_threshold)):
+            if reference[metric] > 0 and result[metric] > reference[metric] * (1 + limit):
+                regressions.append(
+                    f"{key}: {metric} {result[metric]:.4g} > baseline "
+                    f"{reference[metric]:.4g} (+{limit:.0%} allowed)")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the RainData analysis pipeline.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per case (default: 5)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results as the new baseline')
+    parser.add_argument('--output', default=None,
+                        help='Also write the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed wall-time increase over baseline (default: 0.25)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='Allowed peak-memory increase over baseline (default: 0.25)')
+    parser.add_argument('--only', nargs='*', default=None,
+                        help='Run only these stages')
+    args = parser.parse_args()
+
+    current = run(args.repeat, args.only)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressions = compare(current, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print("Performance regressions:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+
+    print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
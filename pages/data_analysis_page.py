@@ -1,195 +1,126 @@
-import glob
-import io
-import numpy as np
-import pandas as pd
-import scipy as sc
 import streamlit as st
+import pandas as pd
 
 from src.utils.i18n import get_text, translate_value, translate_column
-from src.functions.data import clean_dataset, get_dry_season, get_hydrological_year_init, get_monthly_mean_precipitation, load_metadata, load_station_data
-from src.functions.hydrology import compute_max_daily_preciptation, compute_gev, compute_hmax_gev, desag_max_daily_preciptation_intesity, compute_spi
-from src.functions.statistic import compute_cdf, verify_probability_distribuition
-from src.functions.charts import plot_monthly_average_precipitation, plot_pdf_daily_max_precipitation, plot_cdf_daily_max_precipitation, plot_idf_curves, plot_spi
+from src.utils.compute import PoolFullError, current_session_id, get_compute_pool, wait_with_status
+from src.utils.instrumentation import finish_run, is_enabled, show_debug_panel, stage, start_run
+from src.utils.warmup import record_station_visit
+from src.functions.analysis import MIN_QUANTILE_YEARS, InvalidQuantilesError, load_station_analysis
+from src.functions.catalog import load_station_catalog
+from src.functions.data import load_design_rainfall_grid, load_result_table, result_mtime_ns
+from src.functions.hydrology import desag_max_daily_preciptation_intesity
+from src.functions.idf import IDF_MIN_R2, fit_idf_equation, idf_intensity
+from src.functions.nonstationary import NSGEV_ALPHA, NSGEV_MIN_YEARS, effective_return_levels
+from src.functions.charts import plot_monthly_average_precipitation, plot_pdf_daily_max_precipitation, plot_cdf_daily_max_precipitation, plot_idf_curves, plot_spi, figure_png
+from src.functions.interactive_charts import plotly_spi
 
 lang = st.session_state.get("lang")
 
 
 st.title(get_text('data_analysis', lang))
 
-df_meta = load_metadata()
+run = start_run('data_analysis_page', profile=is_enabled('profile'))
+
+catalog = load_station_catalog()
 
-if df_meta is None:
+if catalog is None:
     st.warning(get_text('rain_no_metadata', lang))
 else:
     st.sidebar.header(get_text('filters', lang))
 
-    if 'Situacao' in df_meta.columns:
+    if catalog.statuses:
         st.sidebar.markdown(f"**{get_text('operational_status', lang)}**")
-        situacoes = sorted(df_meta['Situacao'].dropna().unique())
         selected_situacao = []
-        for situacao in situacoes:
+        for situacao in catalog.statuses:
             if st.sidebar.checkbox(
                 translate_value(situacao, lang),
                 value=True,
                 key=f"situacao_filter_{situacao}"
             ):
                 selected_situacao.append(situacao)
-
-        if selected_situacao:
-            df_filtered = df_meta[df_meta['Situacao'].isin(selected_situacao)]
-        else:
-            df_filtered = df_meta[df_meta['Situacao'].isin([])]
+        codes = catalog.codes_with_status(selected_situacao)
     else:
-        df_filtered = df_meta
-
-    if 'Codigo Estacao' in df_filtered.columns:
-        df_filtered = df_filtered.sort_values(by='Codigo Estacao')
+        codes = catalog.codes
 
     st.sidebar.markdown(get_text('stations_available',
-                        lang, count=len(df_filtered)))
-
-    if not df_filtered.empty:
-        col_codigo = 'Codigo Estacao' if 'Codigo Estacao' in df_filtered.columns else 'id_arquivo'
-        col_nome = 'Nome' if 'Nome' in df_filtered.columns else 'id_arquivo'
-
-        df_filtered['display_label'] = df_filtered[col_codigo].astype(
-            str) + " - " + df_filtered[col_nome].astype(str)
-
-        default_index = 0
-        options = df_filtered['display_label'].unique()
+                        lang, count=len(codes)))
 
+    if codes:
+        # A station handed on by another page becomes the selection of the keyed
+        # selectbox, which then keeps it across the reruns of this page
         if 'selected_station_code' in st.session_state:
-            pre_selected_code = st.session_state['selected_station_code']
-            match = df_filtered[df_filtered[col_codigo] == pre_selected_code]
-            if not match.empty:
-                label_to_select = match.iloc[0]['display_label']
-                if label_to_select in options:
-                    default_index = list(options).index(label_to_select)
-            del st.session_state['selected_station_code']
-
-        station_option = st.selectbox(
+            pre_selected_code = st.session_state.pop('selected_station_code')
+            if pre_selected_code in catalog and pre_selected_code in codes:
+                st.session_state['analysis_station'] = pre_selected_code
+
+        station_id = st.selectbox(
             get_text('select_station', lang),
-            options=options,
-            index=default_index
+            options=codes,
+            key='analysis_station',
+            format_func=catalog.label
         )
 
-        station_meta = df_filtered[df_filtered['display_label']
-                                   == station_option].iloc[0]
-        station_id = station_meta['id_arquivo']
+        # Optional: rerun the analysis with the missing days estimated from the neighbours
+        gap_fill = False
+        gap_fill_version = result_mtime_ns('gap_fill.parquet')
+        if gap_fill_version is not None:
+            gap_fill = st.checkbox(get_text('gap_fill_toggle', lang),
+                                   help=get_text('gap_fill_help', lang), key='gap_fill')
+
+        station_meta = catalog.get(station_id)
+        run.context['station'] = station_id
 
-        patterns = [
-            f"rain_datasets/dados_{station_id}_*.parquet",
-            f"data/dados_{station_id}_*.parquet"
-        ]
+        parquet_file = catalog.data_file(station_id)
 
-        parquet_file = None
-        for p in patterns:
-            files = glob.glob(p)
-            if files:
-                parquet_file = files[0]
-                break
+        # Visits rank the stations pre-computed by the warm-up
+        if st.session_state.get('last_visited_station') != station_id:
+            st.session_state['last_visited_station'] = station_id
+            record_station_visit(station_id)
 
         if parquet_file:
             try:
-                raw_data = load_station_data(parquet_file)
-                metadata, dataset, spi_dataset = clean_dataset(raw_data)
-
-                               
-                # --- Daily dataset for extreme-value analysis ---
-                # Unlike the monthly/SPI dataset, incomplete months are not removed here.
-                extreme_dataset = raw_data.copy()
-                
-                # Normalize column names
-                extreme_dataset.columns = extreme_dataset.columns.str.strip()
-                
-                extreme_dataset.rename(columns={
-                    'Data Medicao': 'data medicao',
-                    'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)': 'precipitacao total diaria (mm)',
-                    'data medicao': 'data medicao',
-                    'precipitacao total, diario(mm)': 'precipitacao total diaria (mm)',
-                    'precipitacao total, diario (aut)(mm)': 'precipitacao total diaria (mm)'
-                }, inplace=True)
-                
-                # Convert date and precipitation fields
-                extreme_dataset['data medicao'] = pd.to_datetime(
-                    extreme_dataset['data medicao'],
-                    errors='coerce'
-                )
-                
-                extreme_dataset['precipitacao total diaria (mm)'] = pd.to_numeric(
-                    extreme_dataset['precipitacao total diaria (mm)'],
-                    errors='coerce'
-                )
-                
-                # Remove only invalid dates.
-                # Missing precipitation values remain identifiable through the annual
-                # coverage calculation performed later.
-                extreme_dataset = extreme_dataset.dropna(
-                    subset=['data medicao']
-                ).copy()
-                
-                # Calendar variables
-                extreme_dataset['ano civil'] = extreme_dataset['data medicao'].dt.year
-                extreme_dataset['mes'] = extreme_dataset['data medicao'].dt.month
-
-                                
+                # Fits run on the shared compute pool; sessions asking for the same file share them.
+                # supersede: the analysis of a station this session has left is abandoned.
+                compute_pool = get_compute_pool()
+                analysis_key = (('analysis', parquet_file, 'gap_fill', gap_fill_version) if gap_fill
+                                else ('analysis', parquet_file))
+                analysis_job = compute_pool.submit(
+                    current_session_id(), analysis_key,
+                    load_station_analysis, parquet_file,
+                    gap_fill_mtime_ns=gap_fill_version if gap_fill else None, supersede=True)
+                with stage('wait_station_analysis'):
+                    analysis = wait_with_status(analysis_job, compute_pool, lang)
+                dataset = analysis['dataset']
+
+                # Fits of the unfilled record, to compare with the filled one
+                baseline = None
+                if gap_fill:
+                    baseline_job = compute_pool.submit(
+                        current_session_id(), ('analysis', parquet_file),
+                        load_station_analysis, parquet_file)
+                    with stage('wait_station_analysis'):
+                        try:
+                            baseline = wait_with_status(baseline_job, compute_pool, lang)
+                        except ValueError:
+                            # No valid fit without the filled days
+                            baseline = None
+
                 if not dataset.empty:
                     st.subheader(get_text('station_details', lang,
                                           name=station_meta.get('Nome', station_id)))
 
                     # --- Monthly data (used in tab 1) ---
-                    monthly_dataset = get_monthly_mean_precipitation(dataset)
-                    dry_season_df = get_dry_season(monthly_dataset)
-                    
-                                      
-                    # --- Hydrological-year definition ---
-                    method, hydro_init = get_hydrological_year_init(
-                        dry_season_df
-                    )
-                    
-                    mes_inicio_ano_hidro = hydro_init
-                    
-                    if method != "Ano hidrológico":
-                    
-                        # Civil year
-                        dataset['ano hidrologico'] = dataset['ano civil']
-                    
-                        extreme_dataset['ano hidrologico'] = (
-                            extreme_dataset['ano civil']
-                        )
-                    
-                                           
-                    else:
-                    
-                        dataset['ano hidrologico'] = np.where(
-                            dataset['mes'] >= hydro_init,
-                            dataset['ano civil'] + 1,
-                            dataset['ano civil']
-                        )
-                    
-                        extreme_dataset['ano hidrologico'] = np.where(
-                            extreme_dataset['mes'] >= hydro_init,
-                            extreme_dataset['ano civil'] + 1,
-                            extreme_dataset['ano civil']
-                        )
-                    
-                                                               
-                    # --- Max daily precipitation pipeline ---
-                    # Annual maxima are calculated from the original daily observations,
-                    # independently of the strict complete-month filter used for monthly
-                    # statistics and SPI.
-                    hmax1d = compute_max_daily_preciptation(
-                        extreme_dataset,
-                        hydro_init=hydro_init,
-                        max_missing_days=15
-                    )
-                    
+                    monthly_dataset = analysis['monthly_dataset']
+                    dry_season_df = analysis['dry_season_df']
+                    mes_inicio_ano_hidro = analysis['hydro_init']
+
+                    # --- Max daily precipitation and KS test results ---
+                    hmax1d = analysis['hmax1d']
                     n_years = len(hmax1d)
-                    
-                    # --- KS test for best distribution ---
-                    dist_df, params, nome_dist = verify_probability_distribuition(
-                        hmax1d
-                    )
+
+                    dist_df = analysis['dist_df']
+                    params = analysis['params']
+                    nome_dist = analysis['nome_dist']
 
                     distribution_names = {
                         'genextreme': get_text('dist_gev', lang),
@@ -263,80 +194,11 @@ else:
                     st.markdown(" | ".join(formatted_params))
                                        
                     
-                    # Best fitted distribution
-                    dist_obj = getattr(sc.stats, nome_dist)
-                    
-                    # Return periods
-                    Tr_list = [2, 5, 10, 15, 20, 25, 50, 100]
-                    
-                    p = 1 - 1 / np.array(Tr_list, dtype=float)
-                    
-                    # Quantiles calculated with the best fitted distribution
-                    x_Tr = dist_obj.ppf(p, *params)
-
-                    if np.any(~np.isfinite(x_Tr)) or np.any(x_Tr <= 0):
-                        raise ValueError(
-                            get_text('invalid_quantiles_error', lang)
-                        )
-    
-                    df_hmax = pd.DataFrame({
-                        "t_r (anos)": Tr_list,
-                        "1/Tr": 1 / np.array(Tr_list, dtype=float),
-                        "h_max,1 (mm)": x_Tr
-                    })
-                    
-                    rainfall_matrix = desag_max_daily_preciptation_intesity(
-                        df_hmax)
-
-                    # --- CDF data ---
-                    x_dados, y_dados = compute_cdf(
-                        hmax1d['precipitacao máxima anual (mm)'].values)
-                    
-                    x_numerico = np.linspace(
-                        hmax1d['precipitacao máxima anual (mm)'].min(),
-                        hmax1d['precipitacao máxima anual (mm)'].max(),
-                        1000
-                    )
-                    y_numerico = dist_obj.cdf(x_numerico, *params)
-
-                    # --- PDF data ---
-                    pdf_observed = (
-                        hmax1d['precipitacao máxima anual (mm)']
-                        .dropna()
-                        .to_numpy(dtype=float)
-                    )
-                    
-                    # Domain used to evaluate the theoretical fitted PDF
-                    x_min = pdf_observed.min()
-                    x_max = pdf_observed.max()
-                    
-                    span = x_max - x_min
-                    margin = 0.05 * span if span > 0 else 1.0
-                    
-                    x_pdf = np.linspace(
-                        x_min - margin,
-                        x_max + margin,
-                        1000
-                    )
-                    
-                    # Theoretical PDF of the selected fitted distribution
-                    y_pdf = dist_obj.pdf(x_pdf, *params)
-                    
-                    pdf_data = {
-                        'observed': pdf_observed,
-                        'fitted': {
-                            'x': x_pdf,
-                            'y': y_pdf
-                        }
-                    }
-
-                    cdf_data = {
-                        'real': {'x': x_dados, 'y': y_dados},
-                        'numerica': {'x': list(x_numerico), 'y': list(y_numerico)}
-                    }
-
-                    # --- SPI data ---
-                    spi_dataset = compute_spi(spi_dataset)
+                    df_hmax = analysis['df_hmax']
+                    rainfall_matrix = analysis['rainfall_matrix']
+                    pdf_data = analysis['pdf_data']
+                    cdf_data = analysis['cdf_data']
+                    spi_dataset = analysis['spi_dataset']
 
                     # Number of valid monthly observations available
                     # for each calendar month
@@ -391,6 +253,17 @@ else:
                             )
                         )
 
+                    # Short records: the POT fit uses every storm above the threshold
+                    pot = analysis.get('pot')
+                    if pot is not None and n_years < 20:
+                        quality_notes.append(
+                            get_text(
+                                'quality_frequency_pot',
+                                lang,
+                                n_peaks=len(pot['peaks'])
+                            )
+                        )
+
                     # SPI-1
                     spi_note = get_text(
                         'quality_spi',
@@ -438,11 +311,42 @@ else:
                     else:
                         st.info(quality_message)
 
+                    # --- Gap filling: provenance and comparison with the unfilled record ---
+                    if gap_fill:
+                        st.caption(get_text('gap_fill_summary', lang, filled_days=analysis['filled_days']))
+                        with st.expander(get_text('gap_fill_compare', lang)):
+                            if baseline is None or 'df_hmax' not in baseline:
+                                st.info(get_text('gap_fill_no_baseline', lang))
+                            else:
+                                st.markdown(get_text(
+                                    'gap_fill_fits', lang,
+                                    years_before=len(baseline['hmax1d']), years_after=n_years,
+                                    dist_before=distribution_names.get(baseline['nome_dist'], baseline['nome_dist']),
+                                    dist_after=display_dist_name
+                                ))
+                                compare_cols = ['t_r (anos)', 'h_max,1 sem preenchimento (mm)',
+                                                'h_max,1 com preenchimento (mm)']
+                                comparison = pd.DataFrame({
+                                    't_r (anos)': df_hmax['t_r (anos)'],
+                                    'h_max,1 sem preenchimento (mm)': baseline['df_hmax']['h_max,1 (mm)'],
+                                    'h_max,1 com preenchimento (mm)': df_hmax['h_max,1 (mm)'],
+                                })
+                                st.dataframe(
+                                    comparison.style.format(precision=1, subset=compare_cols[1:]),
+                                    hide_index=True, width='stretch',
+                                    column_config={
+                                        c: st.column_config.Column(translate_column(c, lang))
+                                        for c in compare_cols
+                                    }
+                                )
+
                     # --- Tabs ---
-                    tab_monthly, tab_pdf, tab_cdf, tab_idf, tab_spi = st.tabs([
+                    tab_monthly, tab_pdf, tab_cdf, tab_pot, tab_nsgev, tab_idf, tab_spi = st.tabs([
                         get_text('monthly_average_precipitation', lang),
                         get_text('tab_pdf', lang),
                         get_text('tab_cdf', lang),
+                        get_text('tab_pot', lang),
+                        get_text('tab_nsgev', lang),
                         get_text('tab_idf', lang),
                         get_text('tab_spi', lang),
                     ])
@@ -460,11 +364,9 @@ else:
                                 rainy_season_start=mes_inicio_ano_hidro,
                                 lang=lang
                             )
-                            st.pyplot(fig)
-                            buf = io.BytesIO()
-                            fig.savefig(buf, format="png", dpi=300,
-                                        bbox_inches='tight')
-                            buf.seek(0)
+                            with stage('render_monthly_chart'):
+                                buf = figure_png(fig)
+                                st.image(buf, width='stretch')
                             st.download_button(
                                 label=get_text('download_chart', lang),
                                 data=buf,
@@ -508,11 +410,9 @@ else:
                                 output_folder=None, name=station_id,
                                 data=pdf_data, lang=lang
                             )
-                            st.pyplot(fig_pdf)
-                            buf_pdf = io.BytesIO()
-                            fig_pdf.savefig(buf_pdf, format="png",
-                                            dpi=300, bbox_inches='tight')
-                            buf_pdf.seek(0)
+                            with stage('render_pdf_chart'):
+                                buf_pdf = figure_png(fig_pdf)
+                                st.image(buf_pdf, width='stretch')
                             st.download_button(
                                 label=get_text('download_chart', lang),
                                 data=buf_pdf,
@@ -544,11 +444,9 @@ else:
                                 output_folder=None, name=station_id,
                                 data=cdf_data, lang=lang
                             )
-                            st.pyplot(fig_cdf)
-                            buf_cdf = io.BytesIO()
-                            fig_cdf.savefig(buf_cdf, format="png",
-                                            dpi=300, bbox_inches='tight')
-                            buf_cdf.seek(0)
+                            with stage('render_cdf_chart'):
+                                buf_cdf = figure_png(fig_cdf)
+                                st.image(buf_cdf, width='stretch')
                             st.download_button(
                                 label=get_text('download_chart', lang),
                                 data=buf_cdf,
@@ -571,6 +469,119 @@ else:
                                 }
                             )
 
+                    with tab_pot:
+                        if pot is None:
+                            st.info(get_text('pot_unavailable', lang))
+                        else:
+                            chart_col, data_col = st.columns([1, 1])
+                            sweep = pot['sweep'].set_index('limiar (mm)')
+                            with chart_col:
+                                st.markdown(get_text('pot_mrl_title', lang))
+                                mrl_cols = ['excesso medio (mm)', 'excesso medio inferior (mm)',
+                                            'excesso medio superior (mm)']
+                                st.line_chart(
+                                    sweep[mrl_cols].rename(columns=lambda c: translate_column(c, lang)),
+                                    x_label=translate_column('limiar (mm)', lang),
+                                    color=['#1f77b4', '#aec7e8', '#aec7e8']
+                                )
+                                st.markdown(get_text('pot_stability_title', lang))
+                                st.line_chart(
+                                    sweep[['forma (xi)']].rename(columns=lambda c: translate_column(c, lang)),
+                                    x_label=translate_column('limiar (mm)', lang)
+                                )
+                            with data_col:
+                                shape, threshold, scale = pot['params']
+                                st.markdown(get_text(
+                                    'pot_summary', lang,
+                                    threshold=threshold, n_peaks=len(pot['peaks']),
+                                    years=pot['years'], rate=pot['rate'],
+                                    shape=shape, scale=scale
+                                ))
+                                st.markdown(get_text('pot_hmax_table', lang))
+                                pot_hmax = df_hmax[['t_r (anos)', 'h_max,1 (mm)']].assign(**{
+                                    'h_max,1 POT (mm)': pot['df_hmax']['h_max,1 (mm)'].to_numpy()
+                                })
+                                pot_cols = ['t_r (anos)', 'h_max,1 (mm)', 'h_max,1 POT (mm)']
+                                st.dataframe(
+                                    pot_hmax.style.format(precision=1, subset=pot_cols[1:]),
+                                    hide_index=True, width='stretch',
+                                    column_config={
+                                        c: st.column_config.Column(translate_column(c, lang))
+                                        for c in pot_cols
+                                    }
+                                )
+
+                    with tab_nsgev:
+                        nsgev = analysis.get('nsgev')
+                        if nsgev is None:
+                            st.info(get_text('nsgev_unavailable', lang, min_years=NSGEV_MIN_YEARS))
+                        else:
+                            best = nsgev.loc[nsgev['selecionado']].iloc[0]
+                            trend_p = nsgev['p-valor'].min()
+                            st.markdown(get_text(
+                                'nsgev_significant' if trend_p < NSGEV_ALPHA else 'nsgev_not_significant',
+                                lang, p=trend_p, model=translate_value(best['modelo'], lang)
+                            ))
+                            st.markdown(get_text('nsgev_models_title', lang))
+                            nsgev_cols = ['modelo', 'mu1 (mm/ano)', 'sigma1 (%/ano)', 'forma (c)',
+                                          'AIC', 'razao de verossimilhanca', 'p-valor']
+                            st.dataframe(
+                                nsgev[nsgev_cols]
+                                .assign(modelo=nsgev['modelo'].map(lambda m: translate_value(m, lang)))
+                                .style.format(precision=3, subset=nsgev_cols[1:], na_rep='—'),
+                                hide_index=True, width='stretch',
+                                column_config={
+                                    c: st.column_config.Column(translate_column(c, lang))
+                                    for c in nsgev_cols
+                                }
+                            )
+
+                            first_year = int(hmax1d['ano hidrologico'].min())
+                            m1, m2 = st.columns([1, 1])
+                            nsgev_model = m1.selectbox(
+                                get_text('nsgev_model', lang),
+                                options=nsgev['modelo'].tolist(),
+                                index=int(best.name),
+                                format_func=lambda m: translate_value(m, lang),
+                                key='nsgev_model'
+                            )
+                            target_year = int(m2.number_input(
+                                get_text('nsgev_target_year', lang),
+                                min_value=first_year, max_value=2150, value=2050, step=5,
+                                key='nsgev_target_year'
+                            ))
+                            fit = nsgev.set_index('modelo').loc[nsgev_model]
+                            tr_list = df_hmax['t_r (anos)'].tolist()
+
+                            chart_col, data_col = st.columns([1, 1])
+                            with chart_col:
+                                # Effective 10- and 100-year levels from the first year of data to the target
+                                st.markdown(get_text('nsgev_levels_title', lang))
+                                years = range(first_year, max(first_year, target_year) + 1)
+                                levels = pd.DataFrame(
+                                    [effective_return_levels(fit, year, [10, 100])['h_max,1 (mm)'].to_numpy()
+                                     for year in years],
+                                    index=years, columns=['Tr = 10', 'Tr = 100']
+                                )
+                                levels[translate_column('precipitacao máxima anual (mm)', lang)] = (
+                                    hmax1d.set_index('ano hidrologico')['precipitacao máxima anual (mm)'])
+                                st.line_chart(levels, x_label=translate_column('ano hidrologico', lang))
+                            with data_col:
+                                st.markdown(get_text('nsgev_hmax_table', lang, year=target_year))
+                                effective = df_hmax[['t_r (anos)', 'h_max,1 (mm)']].assign(**{
+                                    'h_max,1 efetivo (mm)': effective_return_levels(
+                                        fit, target_year, tr_list)['h_max,1 (mm)'].to_numpy()
+                                })
+                                effective_cols = ['t_r (anos)', 'h_max,1 (mm)', 'h_max,1 efetivo (mm)']
+                                st.dataframe(
+                                    effective.style.format(precision=1, subset=effective_cols[1:]),
+                                    hide_index=True, width='stretch',
+                                    column_config={
+                                        c: st.column_config.Column(translate_column(c, lang))
+                                        for c in effective_cols
+                                    }
+                                )
+
                     with tab_idf:
                         chart_col, data_col = st.columns([1, 1])
                         with chart_col:
@@ -578,11 +589,9 @@ else:
                                 output_folder=None, name=station_id,
                                 lang=lang, rainfall_matrix=rainfall_matrix
                             )
-                            st.pyplot(fig_idf)
-                            buf_idf = io.BytesIO()
-                            fig_idf.savefig(buf_idf, format="png",
-                                            dpi=300, bbox_inches='tight')
-                            buf_idf.seek(0)
+                            with stage('render_idf_chart'):
+                                buf_idf = figure_png(fig_idf)
+                                st.image(buf_idf, width='stretch')
 
                             idf_csv = rainfall_matrix.to_csv(
                                 index=False).encode('utf-8')
@@ -621,19 +630,67 @@ else:
                                 }
                             )
 
+                            # --- Closed-form IDF equation ---
+                            # The stored equations were fitted to the unfilled catalog: with the
+                            # gaps filled, refit to this tab's matrix so both agree
+                            idf_params = None
+                            idf_table = None if gap_fill else load_result_table('idf_parameters.parquet')
+                            if idf_table is not None:
+                                idf_row = idf_table[idf_table['Codigo Estacao'] == station_id]
+                                if not idf_row.empty:
+                                    idf_params = idf_row.iloc[0].to_dict()
+                            if idf_params is None:
+                                idf_params = fit_idf_equation(rainfall_matrix)
+
+                            st.divider()
+                            st.markdown(get_text('idf_equation_title', lang))
+                            st.latex(
+                                rf"i = \frac{{{idf_params['K']:.2f} \cdot T_r^{{{idf_params['a']:.4f}}}}}"
+                                rf"{{(t + {idf_params['b']:.3f})^{{{idf_params['c']:.4f}}}}}"
+                            )
+                            st.caption(get_text(
+                                'idf_equation_fit', lang,
+                                rmse=idf_params['rmse (mm/h)'], r2=idf_params['r2']))
+                            if n_years < MIN_QUANTILE_YEARS or not idf_params['ajuste aceitavel']:
+                                st.warning(get_text(
+                                    'idf_equation_unreliable', lang,
+                                    n_years=n_years, min_years=MIN_QUANTILE_YEARS, min_r2=IDF_MIN_R2))
+
+                            calc_col1, calc_col2 = st.columns(2)
+                            idf_t = calc_col1.number_input(
+                                get_text('idf_calc_duration', lang),
+                                min_value=5.0, max_value=1440.0, value=60.0, step=5.0)
+                            idf_tr = calc_col2.number_input(
+                                get_text('idf_calc_return_period', lang),
+                                min_value=2.0, max_value=100.0, value=10.0, step=1.0)
+                            st.metric(
+                                get_text('idf_calc_result', lang),
+                                f"{idf_intensity(idf_params['K'], idf_params['a'], idf_params['b'], idf_params['c'], idf_t, idf_tr):.1f} mm/h")
+
                     with tab_spi:                                            
                         st.markdown(get_text('spi_chart_title', lang))
-                        fig_spi = plot_spi(
-                            output_folder=None,
-                            name=station_id,
-                            dataset=spi_dataset,
-                            lang=lang
-                        )
-                        st.pyplot(fig_spi, width='stretch')
-                        buf_spi = io.BytesIO()
-                        fig_spi.savefig(buf_spi, format="png",
-                                        dpi=300, bbox_inches='tight')
-                        buf_spi.seek(0)
+                        interactive_spi = st.toggle(get_text('interactive_chart', lang), value=True,
+                                                    key='spi_interactive_chart')
+
+                        def spi_png() -> bytes:
+                            # Publication-quality matplotlib figure for the download
+                            fig_spi = plot_spi(
+                                output_folder=None,
+                                name=station_id,
+                                dataset=spi_dataset,
+                                lang=lang
+                            )
+                            return figure_png(fig_spi).getvalue()
+
+                        with stage('render_spi_chart'):
+                            if interactive_spi:
+                                fig_spi_interactive, _ = plotly_spi(spi_dataset, lang=lang)
+                                st.plotly_chart(fig_spi_interactive, width='stretch')
+                                # Rendered only when the download is clicked
+                                png_spi = spi_png
+                            else:
+                                png_spi = spi_png()
+                                st.image(png_spi, width='stretch')
 
                         spi_export = spi_dataset.copy()
                         preferred_cols = ['ano civil', 'mes',
@@ -649,7 +706,7 @@ else:
                         with btn_col1:
                             st.download_button(
                                 label=get_text('download_chart', lang),
-                                data=buf_spi,
+                                data=png_spi,
                                 file_name=f"spi_{station_id}.png",
                                 mime="image/png",
                                 width='stretch'
@@ -666,8 +723,48 @@ else:
                 else:
                     st.warning(get_text('clean_no_valid_data', lang))
 
+            except PoolFullError:
+                st.warning(get_text('compute_busy', lang))
+                st.button(get_text('compute_retry', lang))
+            except InvalidQuantilesError:
+                st.error(get_text('error_processing_station', lang,
+                          error=get_text('invalid_quantiles_error', lang)))
             except Exception as e:
                 st.error(get_text('error_processing_station',
                           lang, error=str(e)))
         else:
             st.error(get_text('data_file_not_found', lang, id=station_id))
+
+        # --- Design rainfall at any point (precomputed grid, no live fit) ---
+        design_grid = load_design_rainfall_grid()
+        if design_grid is not None:
+            with st.expander(get_text('grid_query_title', lang)):
+                lat_col, lon_col = st.columns(2)
+                query_lat = lat_col.number_input(
+                    get_text('grid_query_lat', lang), min_value=-90.0, max_value=90.0,
+                    value=float(station_meta.get('Latitude', -15.0)), format="%.4f")
+                query_lon = lon_col.number_input(
+                    get_text('grid_query_lon', lang), min_value=-180.0, max_value=180.0,
+                    value=float(station_meta.get('Longitude', -47.0)), format="%.4f")
+
+                with stage('grid_lookup'):
+                    grid_hmax = design_grid.hmax_table(query_lat, query_lon)
+
+                if grid_hmax is None:
+                    st.info(get_text('grid_query_outside', lang))
+                else:
+                    grid_matrix = desag_max_daily_preciptation_intesity(grid_hmax).pivot(
+                        index='t_c (min)', columns='t_r (anos)', values='y_obs (mm/h)'
+                    ).sort_index()
+
+                    st.markdown(get_text('grid_query_hmax', lang))
+                    st.dataframe(
+                        grid_hmax.set_index('t_r (anos)')[['h_max,1 (mm)']].T.round(1),
+                        width='stretch'
+                    )
+                    st.markdown(get_text('grid_query_idf', lang))
+                    st.dataframe(grid_matrix.round(1), width='stretch')
+
+finish_run(run)
+if is_enabled('debug'):
+    show_debug_panel(run)
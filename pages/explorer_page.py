@@ -1,12 +1,12 @@
-import glob
-import io
-
 import pandas as pd
 import streamlit as st
 
 from src.utils.i18n import get_text, translate_value, translate_column
-from src.functions.data import download_zip_dataset, load_metadata, load_station_data
-from src.functions.charts import plot_time_series
+from src.functions.catalog import load_station_catalog
+from src.functions.data import download_zip_dataset, load_station_data
+from src.functions.charts import figure_png, plot_time_series
+from src.functions.interactive_charts import plotly_time_series
+from src.utils.table import show_paginated_table
 
 
 lang = st.session_state.get("lang")
@@ -14,76 +14,52 @@ lang = st.session_state.get("lang")
 
 st.title(get_text('dataset_explorer', lang))
 
-df_meta = load_metadata()
+catalog = load_station_catalog()
 
-if df_meta is None:
+if catalog is None:
     st.warning(get_text('rain_no_metadata', lang))
 else:
     st.sidebar.header(get_text('filters', lang))
 
-    if 'Situacao' in df_meta.columns:
+    if catalog.statuses:
         st.sidebar.markdown(f"**{get_text('operational_status', lang)}**")
-        situacoes = sorted(df_meta['Situacao'].dropna().unique())
         selected_situacao = []
-        for situacao in situacoes:
+        for situacao in catalog.statuses:
             if st.sidebar.checkbox(
                 translate_value(situacao, lang),
                 value=True,
                 key=f"situacao_filter_{situacao}"
             ):
                 selected_situacao.append(situacao)
-
-        if selected_situacao:
-            df_filtered = df_meta[df_meta['Situacao'].isin(selected_situacao)]
-        else:
-            df_filtered = df_meta[df_meta['Situacao'].isin([])]
+        codes = catalog.codes_with_status(selected_situacao)
     else:
-        df_filtered = df_meta
-
-    if 'Codigo Estacao' in df_filtered.columns:
-        df_filtered = df_filtered.sort_values(by='Codigo Estacao')
+        codes = catalog.codes
 
     st.sidebar.markdown(get_text('stations_available',
-                        lang, count=len(df_filtered)))
-
-    if not df_filtered.empty:
-        col_codigo = 'Codigo Estacao' if 'Codigo Estacao' in df_filtered.columns else 'id_arquivo'
-        col_nome = 'Nome' if 'Nome' in df_filtered.columns else 'id_arquivo'
-
-        df_filtered['display_label'] = df_filtered[col_codigo].astype(
-            str) + " - " + df_filtered[col_nome].astype(str)
-
-        default_index = 0
-        options = df_filtered['display_label'].unique()
+                        lang, count=len(codes)))
 
+    if codes:
+        # A station handed on by another page becomes the selection of the keyed
+        # selectbox, which then keeps it across the reruns of this page
         if 'selected_station_code' in st.session_state:
-            pre_selected_code = st.session_state['selected_station_code']
-            match = df_filtered[df_filtered[col_codigo] == pre_selected_code]
+            pre_selected_code = st.session_state.pop('selected_station_code')
+            if pre_selected_code in catalog and pre_selected_code in codes:
+                st.session_state['explorer_station'] = pre_selected_code
 
-            if not match.empty:
-                label_to_select = match.iloc[0]['display_label']
-                if label_to_select in options:
-                    default_index = list(options).index(label_to_select)
-            del st.session_state['selected_station_code']
-
-        station_option = st.selectbox(
+        station_id = st.selectbox(
             get_text('select_station', lang),
-            options=options,
-            index=default_index
+            options=codes,
+            key='explorer_station',
+            format_func=catalog.label
         )
 
+        station_meta = catalog.get(station_id)
+
         if st.button(get_text('go_to_hydrologic_page', lang)):
-            selected_meta = df_filtered[df_filtered['display_label']
-                                        == station_option].iloc[0]
-            code_to_pass = selected_meta[col_codigo]
-            st.session_state['selected_station_code'] = code_to_pass
+            st.session_state['selected_station_code'] = station_id
 
             st.switch_page("pages/data_analysis_page.py")
 
-        station_meta = df_filtered[df_filtered['display_label']
-                                   == station_option].iloc[0]
-        station_id = station_meta['id_arquivo']
-
         st.divider()
         st.subheader(get_text('station_details', lang,
                      name=station_meta.get('Nome', station_id)))
@@ -98,17 +74,7 @@ else:
         c4.metric(get_text('status', lang), translate_value(
             station_meta.get('Situacao', '-'), lang))
 
-        patterns = [
-            f"rain_datasets/dados_{station_id}_*.parquet",
-            f"data/dados_{station_id}_*.parquet"
-        ]
-
-        parquet_file = None
-        for p in patterns:
-            files = glob.glob(p)
-            if files:
-                parquet_file = files[0]
-                break
+        parquet_file = catalog.data_file(station_id)
 
         if parquet_file:
             try:
@@ -154,14 +120,7 @@ else:
                         df_data = df_data.loc[mask]
 
                 with st.expander(get_text('view_data_table', lang)):
-                    st.dataframe(
-                        df_data,
-                        width='stretch',
-                        column_config={
-                            c: st.column_config.Column(translate_column(c, lang))
-                            for c in df_data.columns
-                        }
-                    )
+                    show_paginated_table(df_data, key='explorer_table', lang=lang)
 
                 if date_col:
                     numeric_cols = df_data.select_dtypes(
@@ -175,24 +134,43 @@ else:
 
                         st.markdown(get_text('time_series', lang,
                                     col=translate_column(col_plot, lang)))
-                        fig = plot_time_series(
-                            output_folder=None,
-                            name=station_id,
-                            df=df_data,
-                            date_col=date_col,
-                            value_col=col_plot,
-                            value_label=translate_column(col_plot, lang),
-                            lang=lang
-                        )
-                        st.pyplot(fig)
+                        interactive = st.toggle(get_text('interactive_chart', lang), value=True,
+                                                key='explorer_interactive_chart')
+
+                        def time_series_png() -> bytes:
+                            # Publication-quality matplotlib figure for the download
+                            fig = plot_time_series(
+                                output_folder=None,
+                                name=station_id,
+                                df=df_data,
+                                date_col=date_col,
+                                value_col=col_plot,
+                                value_label=translate_column(col_plot, lang),
+                                lang=lang
+                            )
+                            return figure_png(fig).getvalue()
+
+                        if interactive:
+                            fig_interactive, n_points = plotly_time_series(
+                                df=df_data,
+                                date_col=date_col,
+                                value_col=col_plot,
+                                value_label=translate_column(col_plot, lang),
+                                lang=lang
+                            )
+                            st.plotly_chart(fig_interactive, width='stretch')
+                            if n_points < len(df_data):
+                                st.caption(get_text('interactive_chart_points', lang,
+                                                    shown=n_points, total=len(df_data)))
+                            # Rendered only when the download is clicked
+                            png = time_series_png
+                        else:
+                            png = time_series_png()
+                            st.image(png, width='stretch')
 
-                        buf = io.BytesIO()
-                        fig.savefig(buf, format="png", dpi=300,
-                                    bbox_inches='tight')
-                        buf.seek(0)
                         st.download_button(
                             label=get_text('download_chart', lang),
-                            data=buf,
+                            data=png,
                             file_name=f"timeseries_{station_id}.png",
                             mime="image/png",
                             width='stretch'
@@ -1,11 +1,15 @@
-import os
-
-import pandas as pd
 import streamlit as st
 import folium
+import numpy as np
+import pandas as pd
 from streamlit_folium import st_folium
 
 from src.utils.i18n import get_text, translate_value, translate_column
+from src.functions.catalog import load_station_catalog
+from src.functions.data import load_design_rainfall_grid, load_result_table, load_spi_cube
+from src.functions.maps import station_markers
+from src.functions.spi_cube import SPI_CATEGORIES, spi_category
+from src.functions.trends import MIN_TREND_YEARS, TREND_CLASSES, TREND_TESTS, trend_map_classes
 
 lang = st.session_state.get("lang")
 
@@ -13,33 +17,27 @@ st.title(get_text('home_title', lang))
 
 
 @st.cache_data
-def load_data():
-    if os.path.exists("./data/metadata_estacoes.parquet"):
-        try:
-            df = pd.read_parquet("./data/metadata_estacoes.parquet")
+def grid_overlay(tr: float, grid_mtime_ns: int):
+    """RGBA image (north row first) and value range of one return period of the grid
+    (grid_mtime_ns: version of the grid file, so a rebuilt grid is redrawn)."""
+    from matplotlib import colormaps
 
-            for col in ['Latitude', 'Longitude']:
-                if col in df.columns:
-                    if df[col].dtype == 'object':
-                        df[col] = df[col].astype(str).str.replace(
-                            ',', '.', regex=False)
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
+    layer = load_design_rainfall_grid().layer(tr)
+    vmin, vmax = float(np.nanmin(layer)), float(np.nanmax(layer))
+    rgba = colormaps['YlGnBu']((layer - vmin) / (vmax - vmin), bytes=True)
+    rgba[np.isnan(layer), 3] = 0
 
-            df = df.dropna(subset=['Latitude', 'Longitude'])
-            return df
-        except Exception as e:
-            st.error(get_text('error_reading_metadata', lang, error=str(e)))
-            return None
-    return None
+    return rgba[::-1], vmin, vmax
 
 
-df = load_data()
+catalog = load_station_catalog()
+df = catalog.coordinates if catalog is not None else None
 
 if df is not None and not df.empty:
     st.write(get_text('home_viewing', lang, count=len(df)))
 
     with st.expander(get_text('home_expand', lang)):
-        display_df = df.copy()
+        display_df = df[catalog.metadata_columns].copy()
         for col in ['Situacao', 'Periodicidade da Medicao']:
             if col in display_df.columns:
                 display_df[col] = display_df[col].apply(
@@ -52,21 +50,224 @@ if df is not None and not df.empty:
             }
         )
 
+    ks_report = load_result_table('ks_report.parquet')
+
+    if ks_report is not None and not ks_report.empty:
+        with st.expander(get_text('ks_report_title', lang)):
+            if 'duracao (dias)' in ks_report.columns:
+                ks_duration = st.selectbox(
+                    get_text('ks_report_duration', lang),
+                    options=sorted(ks_report['duracao (dias)'].unique().tolist())
+                )
+                ks_report = ks_report[ks_report['duracao (dias)'] == ks_duration]
+
+            distribution_names = {
+                'genextreme': get_text('dist_gev', lang),
+                'gumbel_r': get_text('dist_gumbel', lang),
+                'lognorm': get_text('dist_lognorm', lang),
+                'pearson3': get_text('dist_pearson3', lang),
+            }
+
+            winners = (
+                ks_report.loc[ks_report['selecionada'], 'Nome Scipy']
+                .map(distribution_names)
+                .value_counts()
+            )
+            st.markdown(f"**{get_text('ks_report_counts', lang)}**")
+            st.bar_chart(winners, horizontal=True)
+
+            f1, f2, f3 = st.columns(3)
+            selected_dists = f1.multiselect(
+                get_text('ks_report_filter_dist', lang),
+                options=list(distribution_names),
+                default=list(distribution_names),
+                format_func=distribution_names.get
+            )
+            max_ks = f2.slider(
+                get_text('ks_report_max_ks', lang),
+                min_value=0.0, max_value=1.0, value=1.0, step=0.01
+            )
+            min_years = f3.number_input(
+                get_text('ks_report_min_years', lang),
+                min_value=0, value=0, step=1
+            )
+            only_selected = st.checkbox(
+                get_text('ks_report_only_selected', lang), value=True)
+
+            view = ks_report[
+                ks_report['Nome Scipy'].isin(selected_dists)
+                & (ks_report['Estatística KS'] <= max_ks)
+                & (ks_report['n anos'] >= min_years)
+            ]
+            if only_selected:
+                view = view[view['selecionada']]
+
+            view = view.merge(
+                df[['Codigo Estacao', 'Nome', 'Latitude', 'Longitude']],
+                on='Codigo Estacao', how='left'
+            )
+            view['Tipo de Distribuição'] = view['Nome Scipy'].map(
+                distribution_names)
+
+            ks_cols = ['Codigo Estacao', 'Nome', 'Latitude', 'Longitude',
+                       'Tipo de Distribuição', 'Estatística KS', 'posicao', 'n anos',
+                       'parametro 1', 'parametro 2', 'parametro 3']
+            st.caption(get_text('ks_report_rows', lang, count=len(view)))
+            st.dataframe(
+                view[ks_cols],
+                hide_index=True,
+                column_config={
+                    c: st.column_config.Column(translate_column(c, lang))
+                    for c in ks_cols
+                }
+            )
+
     st.subheader(get_text('home_subtitle', lang))
 
+    design_grid = load_design_rainfall_grid()
+    overlay_tr = None
+    if design_grid is not None:
+        g1, g2 = st.columns([1, 2])
+        if g1.checkbox(get_text('grid_overlay_show', lang)):
+            overlay_tr = g2.selectbox(
+                get_text('grid_overlay_tr', lang),
+                options=design_grid.tr.astype(int).tolist(),
+                index=2
+            )
+
+    spi_cube = None
+    trend_classes = None
+    map_mode = st.radio(
+        get_text('map_mode', lang),
+        options=['stations', 'spi', 'trend'],
+        format_func=lambda mode: get_text(f'map_mode_{mode}', lang),
+        horizontal=True
+    )
+    if map_mode == 'spi':
+        spi_cube = load_spi_cube()
+        if spi_cube is None:
+            st.info(get_text('spi_map_unavailable', lang))
+        else:
+            s1, s2 = st.columns([1, 3])
+            spi_scale = s1.selectbox(
+                get_text('spi_map_scale', lang),
+                options=spi_cube.scales
+            )
+            spi_month = s2.select_slider(
+                get_text('spi_map_month', lang),
+                options=spi_cube.months,
+                value=spi_cube.latest_month(spi_scale)
+            )
+            # One slice of the cube: switching months never refits anything
+            spi_values = spi_cube.snapshot(spi_month, spi_scale)
+            spi_categories = pd.Series(spi_category(spi_values.to_numpy()), index=spi_values.index)
+
+            counts = spi_categories[spi_categories >= 0].value_counts()
+            st.caption(get_text(
+                'spi_map_counts', lang, scale=spi_scale, month=spi_month,
+                counts=', '.join(
+                    f"{get_text(f'spi_cat_{key}', lang)} {counts.get(i, 0)}"
+                    for i, (_, _, key) in enumerate(SPI_CATEGORIES)),
+                missing=int((spi_categories < 0).sum())
+            ))
+    elif map_mode == 'trend':
+        trends = load_result_table('trend_tests.parquet')
+        if trends is None:
+            st.info(get_text('trend_map_unavailable', lang))
+        else:
+            t1, t2 = st.columns(2)
+            trend_series = t1.selectbox(
+                get_text('trend_map_series', lang),
+                options=['maximos anuais', 'totais mensais'],
+                format_func=lambda series: get_text(f"trend_series_{series.replace(' ', '_')}", lang)
+            )
+            trend_test = t2.selectbox(
+                get_text('trend_map_test', lang),
+                options=list(TREND_TESTS),
+                format_func=lambda test: get_text(f'trend_test_{test}', lang)
+            )
+            trend_classes = trend_map_classes(trends, trend_series, trend_test)
+            trend_rows = trends[trends['serie'] == trend_series].set_index('Codigo Estacao')
+
+            # Caption doubling as the legend: Streamlit colour of each marker class
+            legend = {'aumento': 'blue', 'reducao': 'red', 'mudanca': 'violet', 'sem tendencia': 'gray'}
+            counts = trend_classes.value_counts()
+            st.caption(get_text(
+                'trend_map_counts', lang,
+                counts=', '.join(
+                    f":{legend[key]}[●] {get_text('trend_class_' + key.replace(' ', '_'), lang)} {counts[key]}"
+                    for key, _ in TREND_CLASSES if key in counts),
+                tested=len(trend_classes), min_years=MIN_TREND_YEARS
+            ))
+
     m = folium.Map(location=[-15, -55], zoom_start=4, tiles="CartoDB positron")
 
-    for idx, row in df.iterrows():
-        tooltip_html = f'<div style="font-size: 16px; white-space: nowrap;"><b>{row.get("Nome", get_text("unknown_station", lang))}</b><br>{get_text("code", lang)}: {row.get("Codigo Estacao", "-")}</div>'
+    if overlay_tr is not None:
+        from branca.colormap import LinearColormap
+        from matplotlib import colormaps
+
+        image, vmin, vmax = grid_overlay(overlay_tr, design_grid.mtime_ns)
+        south, west, north, east = design_grid.bounds
+        half_lat, half_lon = design_grid.dlat / 2, design_grid.dlon / 2
+        folium.raster_layers.ImageOverlay(
+            image=image,
+            bounds=[[south - half_lat, west - half_lon], [north + half_lat, east + half_lon]],
+            opacity=0.6,
+            mercator_project=True
+        ).add_to(m)
+        LinearColormap(
+            [colormaps['YlGnBu'](v) for v in np.linspace(0, 1, 6)],
+            vmin=vmin, vmax=vmax,
+            caption=get_text('grid_overlay_legend', lang, tr=overlay_tr)
+        ).add_to(m)
+
+    if spi_cube is not None:
+        from branca.colormap import StepColormap
+
+        StepColormap(
+            [color for _, color, _ in SPI_CATEGORIES],
+            index=[-3.0, -2.0, -1.5, -1.0, 1.0, 1.5, 2.0, 3.0],
+            vmin=-3.0, vmax=3.0,
+            caption=get_text('spi_map_legend', lang, scale=spi_scale, month=spi_month)
+        ).add_to(m)
 
+    for marker in station_markers(lang):
+        color, opacity = "#1f77b4", 0.7
+        tooltip = marker['tooltip']
+        if trend_classes is not None:
+            key = trend_classes.get(marker['code'])
+            if key is None:
+                # Record too short for the tests
+                color, opacity = "#9E9E9E", 0.2
+            else:
+                color = dict(TREND_CLASSES)[key]
+                row = trend_rows.loc[marker['code']]
+                detail = (get_text('trend_map_tooltip_mk', lang, slope=row['declividade de Sen (mm/ano)'],
+                                   p=row['p-valor MK'])
+                          if trend_test == 'mk' else
+                          get_text('trend_map_tooltip_change', lang, when=row[f'mudanca {TREND_TESTS[trend_test]}'],
+                                   p=row[f'p-valor {TREND_TESTS[trend_test]}']))
+                tooltip = tooltip.replace('</div>', f"<br>{detail}</div>")
+        elif spi_cube is not None:
+            category = spi_categories.get(marker['code'], -1)
+            if category < 0:
+                # No SPI for this station and month: drawn faintly
+                color, opacity = "#9E9E9E", 0.2
+            else:
+                _, color, key = SPI_CATEGORIES[category]
+                tooltip = tooltip.replace(
+                    '</div>',
+                    f"<br>SPI-{spi_scale}: {spi_values[marker['code']]:.2f} "
+                    f"({get_text(f'spi_cat_{key}', lang)})</div>")
         folium.CircleMarker(
-            location=[row["Latitude"], row["Longitude"]],
+            location=marker['location'],
             radius=4,
-            color="#1f77b4",
+            color=color,
+            opacity=min(1.0, opacity + 0.3),
             fill=True,
-            fill_color="#1f77b4",
-            fill_opacity=0.7,
-            tooltip=tooltip_html
+            fill_color=color,
+            fill_opacity=opacity,
+            tooltip=tooltip
         ).add_to(m)
 
     map_data = st_folium(
@@ -0,0 +1,323 @@
+"""HTTP API serving the station data and the analysis results.
+
+Usage:
+    uvicorn src.api.app:app [--port 8000]
+
+Environment:
+    RAINDATA_DATA_DIR     Parquet store directory (default: ./data)
+    RAINDATA_RESULTS_DIR  Precomputed results directory (default: ./results)
+    RAINDATA_API_WORKERS  Processes running the station analysis on cache misses (default: 2)
+
+Every table endpoint answers JSON records by default and an Arrow IPC stream with
+?format=arrow (or 'Accept: application/vnd.apache.arrow.stream'). Responses carry a
+weak ETag derived from the source files (path, size and modification time), so a
+request with a matching If-None-Match is answered 304 before anything is read or
+computed. Bodies larger than 1 kB are gzip-compressed when the client accepts it.
+
+Endpoints:
+    GET /stations                              Station metadata
+    GET /stations/{code}/daily                 Daily records as stored
+    GET /stations/{code}/annual-maxima         Annual maximum daily precipitation
+    GET /stations/{code}/multiday-maxima       Annual maxima accumulated over 1 to 10 days
+    GET /stations/{code}/ks                    KS comparison of the candidate distributions
+    GET /stations/{code}/hmax                  Maximum daily precipitation by return period
+    GET /stations/{code}/idf                   Disaggregated intensity matrix
+    GET /stations/{code}/spi                   Monthly precipitation and SPI-1
+    GET /daily/{date}?min_mm=                  Precipitation of every station on one day
+                                               (precomputed precipitation matrix)
+    GET /results/{name}                        Precomputed table (ks_report, idf_parameters, ...)
+"""
+import asyncio
+import glob
+import hashlib
+import io
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+import pandas as pd
+import pyarrow as pa
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from src.functions.analysis import InvalidQuantilesError, analyze_station
+from src.functions.precipitation_matrix import INDEX_FILE, PRECIPITATION_COLUMN, VALUES_FILE, PrecipitationMatrix
+
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+STATION_CODE = re.compile(r'^[A-Za-z0-9]+$')
+RESULT_NAME = re.compile(r'^[a-z0-9_]+$')
+
+# Tables of analyze_station served by the station endpoints
+STATION_PRODUCTS = {
+    'annual-maxima': 'hmax1d',
+    'multiday-maxima': 'hmax_durations',
+    'ks': 'dist_df',
+    'hmax': 'df_hmax',
+    'idf': 'rainfall_matrix',
+    'spi': 'spi_dataset',
+}
+
+ANALYSIS_CACHE_SIZE = 32
+
+
+def station_products(path_file: str) -> dict:
+    """Run the analysis page pipeline on one store file and keep the served tables.
+
+    Runs in the worker processes, so only the DataFrames travel back.
+    """
+    analysis = analyze_station(pd.read_parquet(path_file))
+    if analysis['dataset'].empty:
+        raise ValueError("No complete month of data for this station.")
+
+    return {product: analysis[key] for product, key in STATION_PRODUCTS.items()}
+
+
+def station_maxima(annual_maxima: pd.DataFrame, code: str, multiday: bool) -> pd.DataFrame:
+    """Rows of one station of annual_maxima.parquet, shaped like hmax1d or hmax_durations."""
+    df = annual_maxima[annual_maxima['Codigo Estacao'] == code]
+    if not multiday:
+        df = df[df['duracao (dias)'] == 1].drop(columns='duracao (dias)')
+
+    return df.drop(columns=['Codigo Estacao', 'mes inicio ano hidrologico']).reset_index(drop=True)
+
+
+def file_signature(*path_files: str) -> str:
+    """Weak ETag of a representation derived from the given files."""
+    h = hashlib.sha1()
+    for path_file in path_files:
+        stat = os.stat(path_file)
+        h.update(f"{os.path.abspath(path_file)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+
+    return h.hexdigest()
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def wants_arrow(request: Request) -> bool:
+    fmt = request.query_params.get('format')
+    if fmt is not None:
+        if fmt not in ('json', 'arrow'):
+            raise HTTPException(400, "format must be 'json' or 'arrow'.")
+        return fmt == 'arrow'
+
+    return ARROW_MEDIA_TYPE in request.headers.get('accept', '')
+
+
+def table_response(df: pd.DataFrame, arrow: bool, etag: str) -> Response:
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept, Accept-Encoding'}
+    if arrow:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue(), media_type=ARROW_MEDIA_TYPE, headers=headers)
+
+    body = df.to_json(orient='records', date_format='iso', force_ascii=False)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+class AnalysisPool:
+    """Bounded process pool computing station products, with an LRU of the results.
+
+    Concurrent requests for the same station file share one computation.
+    """
+
+    def __init__(self, max_workers: int, cache_size: int = ANALYSIS_CACHE_SIZE):
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._executor = None
+        self._cache = OrderedDict()
+        self._pending = {}
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def _compute(self, key: tuple) -> dict:
+        self.start()
+        try:
+            products = await asyncio.wrap_future(
+                self._executor.submit(station_products, key[0]))
+        finally:
+            del self._pending[key]
+
+        self._cache[key] = products
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return products
+
+    async def get(self, path_file: str, signature: str) -> dict:
+        key = (path_file, signature)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key))
+            self._pending[key] = task
+
+        # A disconnecting client must not cancel the computation shared with the others
+        return await asyncio.shield(task)
+
+
+def create_app(
+        data_dir: str = './data',
+        results_dir: str = './results',
+        max_workers: int = 2
+    ) -> Starlette:
+    """Build the API application.
+
+    :param data_dir: Directory with metadata_estacoes.parquet and the dados_*.parquet files
+    :param results_dir: Directory with the tables written by src.utils.build_results
+    :param max_workers: Size of the process pool running the station analysis
+    """
+    pool = AnalysisPool(max_workers)
+    metadata_file = os.path.join(data_dir, 'metadata_estacoes.parquet')
+    matrix_dir = os.path.join(results_dir, 'precipitation_matrix')
+    opened_matrix = {}
+
+    def precipitation_matrix(signature: str) -> PrecipitationMatrix:
+        # Reopened when build_results updates it
+        if opened_matrix.get('signature') != signature:
+            opened_matrix.update(signature=signature, matrix=PrecipitationMatrix(matrix_dir))
+        return opened_matrix['matrix']
+
+    def station_file(code: str) -> str:
+        if not STATION_CODE.match(code):
+            raise HTTPException(404, f"Station {code} not found.")
+        files = sorted(glob.glob(os.path.join(data_dir, f"dados_{code}_*.parquet")))
+        if not files:
+            raise HTTPException(404, f"Station {code} not found.")
+        return files[0]
+
+    def not_modified(etag: str) -> Response:
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    async def serve_file_table(request: Request, path_file: str, transform=None) -> Response:
+        arrow = wants_arrow(request)
+        etag = f'W/"{file_signature(path_file)}-{int(arrow)}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        df = await run_in_threadpool(pd.read_parquet, path_file)
+        if transform is not None:
+            df = transform(df)
+        return table_response(df, arrow, etag)
+
+    async def stations(request: Request) -> Response:
+        if not os.path.exists(metadata_file):
+            raise HTTPException(404, "Station metadata not found.")
+        return await serve_file_table(request, metadata_file)
+
+    async def daily(request: Request) -> Response:
+        return await serve_file_table(request, station_file(request.path_params['code']))
+
+    async def station_product(request: Request) -> Response:
+        code = request.path_params['code']
+        product = request.path_params['product']
+        if product not in STATION_PRODUCTS:
+            raise HTTPException(404, f"Unknown product {product}.")
+        path_file = station_file(code)
+
+        arrow = wants_arrow(request)
+        signature = file_signature(path_file)
+        etag = f'W/"{signature}-{product}-{int(arrow)}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        # Annual maxima of the whole catalog may already be precomputed
+        annual_maxima_file = os.path.join(results_dir, 'annual_maxima.parquet')
+        if product in ('annual-maxima', 'multiday-maxima') and os.path.exists(annual_maxima_file) \
+                and os.path.getmtime(annual_maxima_file) >= os.path.getmtime(path_file):
+            return await serve_file_table(
+                request, annual_maxima_file,
+                lambda df: station_maxima(df, code, multiday=product == 'multiday-maxima'))
+
+        try:
+            products = await pool.get(path_file, signature)
+        except (InvalidQuantilesError, ValueError) as e:
+            raise HTTPException(422, str(e))
+
+        return table_response(products[product], arrow, etag)
+
+    async def daily_snapshot(request: Request) -> Response:
+        try:
+            date = pd.Timestamp(request.path_params['date'])
+            min_mm = float(request.query_params.get('min_mm', '-inf'))
+        except ValueError:
+            raise HTTPException(400, "Expected a date (YYYY-MM-DD) and a numeric min_mm.")
+        index_file = os.path.join(matrix_dir, INDEX_FILE)
+        if not os.path.exists(index_file):
+            raise HTTPException(404, "Precipitation matrix not built.")
+
+        arrow = wants_arrow(request)
+        signature = file_signature(index_file, os.path.join(matrix_dir, VALUES_FILE))
+        etag = f'W/"{signature}-{date.date()}-{min_mm}-{int(arrow)}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        snapshot = precipitation_matrix(signature).exceedances(date, min_mm)
+        # float32 storage: back to the 0.1 mm resolution of the source
+        df = pd.DataFrame({'Codigo Estacao': snapshot.index,
+                           PRECIPITATION_COLUMN: snapshot.to_numpy().round(1)})
+        return table_response(df, arrow, etag)
+
+    async def result_table(request: Request) -> Response:
+        name = request.path_params['name']
+        path_file = os.path.join(results_dir, f"{name}.parquet")
+        if not RESULT_NAME.match(name) or not os.path.exists(path_file):
+            raise HTTPException(404, f"Result {name} not found.")
+        return await serve_file_table(request, path_file)
+
+    async def http_error(request: Request, exc: HTTPException) -> Response:
+        return JSONResponse({'detail': exc.detail}, status_code=exc.status_code)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        pool.shutdown()
+
+    return Starlette(
+        routes=[
+            Route('/stations', stations),
+            Route('/stations/{code}/daily', daily),
+            Route('/stations/{code}/{product}', station_product),
+            Route('/daily/{date}', daily_snapshot),
+            Route('/results/{name}', result_table),
+        ],
+        middleware=[Middleware(GZipMiddleware, minimum_size=1000)],
+        exception_handlers={HTTPException: http_error},
+        lifespan=lifespan,
+    )
+
+
+app = create_app(
+    data_dir=os.environ.get('RAINDATA_DATA_DIR', './data'),
+    results_dir=os.environ.get('RAINDATA_RESULTS_DIR', './results'),
+    max_workers=int(os.environ.get('RAINDATA_API_WORKERS', '2')),
+)
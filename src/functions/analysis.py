@@ -0,0 +1,393 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.functions.data import clean_dataset, get_dry_season, get_hydrological_year_init, get_monthly_mean_precipitation, load_gap_fills, load_station_data
+from src.functions.gap_filling import FILLED_COLUMN, apply_gap_fill
+from src.functions.hydrology import MIN_QUANTILE_YEARS, compute_max_precipitation_durations, desag_max_daily_preciptation_intesity, compute_spi, plausible_quantiles
+from src.functions.nonstationary import NSGEV_MIN_YEARS, fit_nonstationary_gev
+from src.functions.pot import compute_pot_analysis
+from src.functions.statistic import compute_cdf, verify_probability_distribuition
+from src.utils.cancellation import checkpoint
+from src.utils.instrumentation import record_cache_miss, timed_stage
+
+
+TR_LIST = [2, 5, 10, 15, 20, 25, 50, 100]
+
+
+class InvalidQuantilesError(ValueError):
+    """The selected distribution produced non-finite or non-positive quantiles."""
+
+
+@timed_stage()
+def prepare_extreme_dataset(raw_data: pd.DataFrame) -> pd.DataFrame:
+    """Normalize the raw station records for extreme-value analysis.
+
+    Unlike clean_dataset, incomplete months are not removed: only invalid dates are
+    dropped, and missing precipitation values remain identifiable through the annual
+    coverage calculation of compute_max_daily_preciptation.
+
+    :param raw_data: Station records as stored in the dados_*.parquet files
+
+    :return: Daily dataset ('data medicao', 'precipitacao total diaria (mm)', 'ano civil', 'mes')
+    """
+    extreme_dataset = raw_data.copy()
+
+    # Normalize column names
+    extreme_dataset.columns = extreme_dataset.columns.str.strip()
+
+    extreme_dataset.rename(columns={
+        'Data Medicao': 'data medicao',
+        'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)': 'precipitacao total diaria (mm)',
+        'data medicao': 'data medicao',
+        'precipitacao total, diario(mm)': 'precipitacao total diaria (mm)',
+        'precipitacao total, diario (aut)(mm)': 'precipitacao total diaria (mm)'
+    }, inplace=True)
+
+    # Convert date and precipitation fields
+    extreme_dataset['data medicao'] = pd.to_datetime(
+        extreme_dataset['data medicao'],
+        errors='coerce'
+    )
+
+    extreme_dataset['precipitacao total diaria (mm)'] = pd.to_numeric(
+        extreme_dataset['precipitacao total diaria (mm)'],
+        errors='coerce'
+    )
+
+    extreme_dataset = extreme_dataset.dropna(
+        subset=['data medicao']
+    ).copy()
+
+    # Calendar variables
+    extreme_dataset['ano civil'] = extreme_dataset['data medicao'].dt.year
+    extreme_dataset['mes'] = extreme_dataset['data medicao'].dt.month
+
+    return extreme_dataset
+
+
+def assign_hydrological_year(dataset: pd.DataFrame, method: str, hydro_init: int) -> pd.DataFrame:
+    """Add the 'ano hidrologico' column (civil year when method is not 'Ano hidrológico').
+
+    A hydrological year starting in month hydro_init is labelled by the civil year in
+    which it ends.
+    """
+    if method != "Ano hidrológico" or hydro_init == 1:
+        dataset['ano hidrologico'] = dataset['ano civil']
+    else:
+        dataset['ano hidrologico'] = np.where(
+            dataset['mes'] >= hydro_init,
+            dataset['ano civil'] + 1,
+            dataset['ano civil']
+        )
+
+    return dataset
+
+
+def define_hydrological_year(dataset: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, str, int]:
+    """Identify the hydrological year from the six driest months of the clean dataset.
+
+    :param dataset: Clean dataset returned by clean_dataset
+
+    :return: [0] = Mean monthly precipitation, [1] = Dry season, [2] = Method ('Ano hidrológico' or 'Ano civil'), [3] = First month of the year
+    """
+    monthly_dataset = get_monthly_mean_precipitation(dataset)
+    dry_season_df = get_dry_season(monthly_dataset)
+    method, hydro_init = get_hydrological_year_init(dry_season_df)
+
+    return monthly_dataset, dry_season_df, method, hydro_init
+
+
+@timed_stage()
+def analyze_station(raw_data: pd.DataFrame, max_missing_days: int = 15) -> dict:
+    """Run the hydrological analysis pipeline of the analysis page for one station.
+
+    :param raw_data: Station records as stored in the dados_*.parquet files
+    :param max_missing_days: Maximum missing days for a year to enter the annual maxima
+
+    :return: Dictionary with the intermediate and final results. When no complete month
+             survives clean_dataset only 'metadata', 'dataset', 'spi_dataset' and
+             'filled_days' are set.
+    """
+    from scipy import stats
+
+    metadata, dataset, spi_dataset = clean_dataset(raw_data)
+    results = {
+        'metadata': metadata,
+        'dataset': dataset,
+        'spi_dataset': spi_dataset,
+        # Provenance: days estimated by apply_gap_fill
+        'filled_days': int(raw_data[FILLED_COLUMN].sum()) if FILLED_COLUMN in raw_data else 0,
+    }
+    if dataset.empty:
+        return results
+
+    # checkpoint(): abandon the pipeline between stages when its request is cancelled
+    checkpoint()
+    extreme_dataset = prepare_extreme_dataset(raw_data)
+
+    # --- Monthly data and hydrological-year definition ---
+    monthly_dataset, dry_season_df, method, hydro_init = define_hydrological_year(
+        dataset)
+
+    assign_hydrological_year(dataset, method, hydro_init)
+    assign_hydrological_year(extreme_dataset, method, hydro_init)
+    checkpoint()
+
+    # --- Max daily precipitation pipeline ---
+    # Annual maxima are calculated from the original daily observations,
+    # independently of the strict complete-month filter used for monthly
+    # statistics and SPI.
+    hmax_durations = compute_max_precipitation_durations(
+        extreme_dataset,
+        hydro_init=hydro_init,
+        max_missing_days=max_missing_days
+    )
+    hmax1d = (hmax_durations[hmax_durations['duracao (dias)'] == 1]
+              .drop(columns='duracao (dias)')
+              .reset_index(drop=True))
+
+    checkpoint()
+
+    # --- KS test for best distribution ---
+    dist_df, params, nome_dist = verify_probability_distribuition(hmax1d)
+    dist_obj = getattr(stats, nome_dist)
+
+    # Quantiles calculated with the best fitted distribution
+    p = 1 - 1 / np.array(TR_LIST, dtype=float)
+    x_Tr = dist_obj.ppf(p, *params)
+
+    if np.any(~np.isfinite(x_Tr)) or np.any(x_Tr <= 0):
+        raise InvalidQuantilesError(
+            "The selected probability distribution produced "
+            "invalid precipitation quantiles."
+        )
+
+    df_hmax = pd.DataFrame({
+        "t_r (anos)": TR_LIST,
+        "1/Tr": 1 / np.array(TR_LIST, dtype=float),
+        "h_max,1 (mm)": x_Tr
+    })
+
+    # --- Peaks over threshold: uses every storm, not only the largest of each year ---
+    checkpoint()
+    try:
+        pot = compute_pot_analysis(extreme_dataset, TR_LIST)
+    except ValueError:
+        pot = None
+
+    # --- Non-stationary GEV: location and/or scale linear in the year ---
+    checkpoint()
+    nsgev = None
+    if len(hmax1d) >= NSGEV_MIN_YEARS:
+        nsgev = fit_nonstationary_gev(hmax1d['precipitacao máxima anual (mm)'].to_numpy(dtype=float),
+                                      hmax1d['ano hidrologico'].to_numpy(dtype=float))
+
+    checkpoint()
+    rainfall_matrix = desag_max_daily_preciptation_intesity(df_hmax)
+
+    # --- CDF data ---
+    x_dados, y_dados = compute_cdf(
+        hmax1d['precipitacao máxima anual (mm)'].values)
+
+    x_numerico = np.linspace(
+        hmax1d['precipitacao máxima anual (mm)'].min(),
+        hmax1d['precipitacao máxima anual (mm)'].max(),
+        1000
+    )
+    y_numerico = dist_obj.cdf(x_numerico, *params)
+
+    # --- PDF data ---
+    pdf_observed = (
+        hmax1d['precipitacao máxima anual (mm)']
+        .dropna()
+        .to_numpy(dtype=float)
+    )
+
+    # Domain used to evaluate the theoretical fitted PDF
+    x_min = pdf_observed.min()
+    x_max = pdf_observed.max()
+
+    span = x_max - x_min
+    margin = 0.05 * span if span > 0 else 1.0
+
+    x_pdf = np.linspace(
+        x_min - margin,
+        x_max + margin,
+        1000
+    )
+
+    # Theoretical PDF of the selected fitted distribution
+    y_pdf = dist_obj.pdf(x_pdf, *params)
+
+    # --- SPI data ---
+    checkpoint()
+    spi_dataset = compute_spi(spi_dataset)
+
+    results.update({
+        'spi_dataset': spi_dataset,
+        'extreme_dataset': extreme_dataset,
+        'monthly_dataset': monthly_dataset,
+        'dry_season_df': dry_season_df,
+        'method': method,
+        'hydro_init': hydro_init,
+        'hmax1d': hmax1d,
+        'hmax_durations': hmax_durations,
+        'dist_df': dist_df,
+        'params': params,
+        'nome_dist': nome_dist,
+        'df_hmax': df_hmax,
+        'pot': pot,
+        'nsgev': nsgev,
+        'rainfall_matrix': rainfall_matrix,
+        'pdf_data': {
+            'observed': pdf_observed,
+            'fitted': {
+                'x': x_pdf,
+                'y': y_pdf
+            }
+        },
+        'cdf_data': {
+            'real': {'x': x_dados, 'y': y_dados},
+            'numerica': {'x': list(x_numerico), 'y': list(y_numerico)}
+        },
+    })
+
+    return results
+
+
+@timed_stage(cached=True)
+@st.cache_data(max_entries=64)
+def load_station_analysis(path_file: str, max_missing_days: int = 15, gap_fill_mtime_ns: int | None = None) -> dict:
+    """analyze_station of a station file, cached across sessions and pre-computed by the warm-up.
+
+    With gap_fill_mtime_ns (the version of gap_fill.parquet of build_results, see
+    result_mtime_ns), the missing days estimated from the neighbouring stations are
+    filled in first; a rebuilt file gives a new cache entry.
+    """
+    record_cache_miss()
+    raw_data = load_station_data(path_file)
+    if gap_fill_mtime_ns is not None:
+        fills = load_gap_fills()
+        if fills is not None:
+            fills = fills.get(station_code_from_path(path_file))
+        raw_data = apply_gap_fill(raw_data, fills)
+
+    return analyze_station(raw_data, max_missing_days)
+
+
+def station_code_from_path(path_file: str) -> str:
+    """Station code of a store file, e.g. 'dados_A001_D_2000-05-06_2025-04-25.parquet' -> 'A001'."""
+    return os.path.basename(path_file).split('_')[1]
+
+
+ANNUAL_MAXIMA_COLUMNS = [
+    'Codigo Estacao',
+    'ano hidrologico',
+    'duracao (dias)',
+    'precipitacao máxima anual (mm)',
+    'dias validos',
+    'dias ausentes',
+    'mes inicio ano hidrologico',
+]
+
+
+def station_annual_maxima(path_file: str, max_missing_days: int = 15) -> pd.DataFrame:
+    """Annual maximum precipitation of one store file for every duration of MAX_DURATIONS,
+    as computed by the analysis page.
+
+    :param path_file: Path to a dados_*.parquet file
+    :param max_missing_days: Maximum missing days for a year to enter the annual maxima
+
+    :return: Annual maxima with the station code and the first month of the hydrological year
+    """
+    raw_data = pd.read_parquet(path_file)
+    _, dataset, _ = clean_dataset(raw_data)
+    if dataset.empty:
+        return pd.DataFrame(columns=ANNUAL_MAXIMA_COLUMNS)
+
+    _, _, method, hydro_init = define_hydrological_year(dataset)
+    extreme_dataset = assign_hydrological_year(
+        prepare_extreme_dataset(raw_data), method, hydro_init)
+
+    maxima = compute_max_precipitation_durations(
+        extreme_dataset,
+        hydro_init=hydro_init,
+        max_missing_days=max_missing_days
+    )
+    maxima.insert(0, 'Codigo Estacao', station_code_from_path(path_file))
+    maxima['mes inicio ano hidrologico'] = hydro_init
+
+    return maxima[ANNUAL_MAXIMA_COLUMNS]
+
+
+def compute_catalog_annual_maxima(data_dir: str = './data', max_workers: int | None = None) -> pd.DataFrame:
+    """Annual maxima of every station in the store, in long format.
+
+    :param data_dir: Directory with the dados_*.parquet files
+    :param max_workers: Number of processes (None = number of CPUs)
+
+    :return: Concatenation of station_annual_maxima for all stations
+    """
+    files = sorted(glob.glob(os.path.join(data_dir, 'dados_*.parquet')))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        frames = [f for f in executor.map(station_annual_maxima, files, chunksize=4)
+                  if not f.empty]
+
+    if not frames:
+        return pd.DataFrame(columns=ANNUAL_MAXIMA_COLUMNS)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def catalog_hmax_quantiles(ks_report: pd.DataFrame, duration: int = 1,
+                           min_years: int = MIN_QUANTILE_YEARS) -> pd.DataFrame:
+    """Maximum precipitation of one duration by return period of every station of the KS report.
+
+    Quantiles are computed with the selected distribution of each station, as on the
+    analysis page. Stations with fewer than min_years annual maxima, or whose
+    quantiles are not plausible (plausible_quantiles), are skipped: the fits of
+    records of a few years can have shapes far outside the hydrological range, with
+    quantiles of thousands of metres.
+
+    :param ks_report: Output of verify_probability_distribuition_batch
+    :param duration: Accumulation duration in days (reports without a 'duracao (dias)'
+                     column hold the 1-day maxima only)
+    :param min_years: Fewest annual maxima ('n anos' of the report)
+
+    :return: Long table with 'Codigo Estacao', 'n anos', 't_r (anos)', '1/Tr' and 'h_max,{duration} (mm)'
+    """
+    from scipy import stats
+
+    value_column = f'h_max,{duration} (mm)'
+    columns = ['Codigo Estacao', 'n anos', 't_r (anos)', '1/Tr', value_column]
+    selected = ks_report[ks_report['selecionada'] & (ks_report['n anos'] >= min_years)]
+    if 'duracao (dias)' in selected.columns:
+        selected = selected[selected['duracao (dias)'] == duration]
+    elif duration != 1:
+        selected = selected.iloc[0:0]
+
+    p = 1 - 1 / np.array(TR_LIST, dtype=float)
+    frames = []
+    for _, row in selected.iterrows():
+        params = row[['parametro 1', 'parametro 2', 'parametro 3']].dropna().to_numpy(dtype=float)
+        x_Tr = getattr(stats, row['Nome Scipy']).ppf(p, *params)
+        if not plausible_quantiles(x_Tr)[0]:
+            continue
+        frames.append(pd.DataFrame({
+            'Codigo Estacao': row['Codigo Estacao'],
+            'n anos': int(row['n anos']),
+            't_r (anos)': TR_LIST,
+            '1/Tr': 1 / np.array(TR_LIST, dtype=float),
+            value_column: x_Tr
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(frames, ignore_index=True)[columns]
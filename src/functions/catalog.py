@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.functions.data import METADATA_FILE, station_file_index
+from src.utils.instrumentation import record_cache_miss, timed_stage
+
+
+class StationCatalog:
+    """Station metadata prepared once per process and shared, read-only, by all pages.
+
+    Rows are sorted by station code, coordinates are numeric, 'Situacao' is categorical
+    and every row carries its 'display_label' and data file ('arquivo'). Lookups by
+    code go through a hash index instead of scanning the DataFrame.
+    """
+
+    def __init__(self, metadata: pd.DataFrame, files: dict):
+        self.metadata_columns = list(metadata.columns)
+        df = metadata.copy()
+
+        for col in ['Latitude', 'Longitude']:
+            if col in df.columns:
+                if not pd.api.types.is_numeric_dtype(df[col]):
+                    df[col] = df[col].astype(str).str.replace(
+                        ',', '.', regex=False)
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        col_codigo = 'Codigo Estacao' if 'Codigo Estacao' in df.columns else 'id_arquivo'
+        col_nome = 'Nome' if 'Nome' in df.columns else 'id_arquivo'
+        df = df.sort_values(by=col_codigo).reset_index(drop=True)
+
+        if 'Situacao' in df.columns:
+            df['Situacao'] = df['Situacao'].astype('category')
+        df['display_label'] = df[col_codigo].astype(str) + " - " + df[col_nome].astype(str)
+        df['arquivo'] = df['id_arquivo'].map(files)
+
+        self.frame = df
+        self.codes = df['id_arquivo'].tolist()
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self._rows = df.to_dict('records')
+
+        if 'Situacao' in df.columns:
+            self.statuses = sorted(df['Situacao'].dropna().unique())
+            self._status_positions = {
+                status: np.flatnonzero((df['Situacao'] == status).to_numpy())
+                for status in self.statuses
+            }
+        else:
+            self.statuses = []
+            self._status_positions = {}
+
+        self.coordinates = df.dropna(subset=['Latitude', 'Longitude']).reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code) -> bool:
+        return code in self._index
+
+    def get(self, code: str) -> dict | None:
+        """Metadata row of a station (None if unknown)."""
+        i = self._index.get(code)
+        return None if i is None else self._rows[i]
+
+    def position(self, code: str) -> int | None:
+        return self._index.get(code)
+
+    def label(self, code: str) -> str:
+        return self._rows[self._index[code]]['display_label']
+
+    def data_file(self, code: str) -> str | None:
+        """Path to the dados_*.parquet file of a station (None if missing)."""
+        row = self.get(code)
+        if row is None or pd.isna(row['arquivo']):
+            return None
+        return row['arquivo']
+
+    def codes_with_status(self, statuses: list) -> list:
+        """Codes of the stations in any of the given statuses, sorted (all codes when the metadata has no status)."""
+        if not self.statuses:
+            return list(self.codes)
+        positions = [self._status_positions[s] for s in statuses if s in self._status_positions]
+        if not positions:
+            return []
+        return [self.codes[i] for i in np.sort(np.concatenate(positions))]
+
+
+@timed_stage(cached=True)
+@st.cache_resource
+def load_station_catalog():
+    """Build the StationCatalog of the metadata file (None if missing or unreadable)."""
+    record_cache_miss()
+    if os.path.exists(METADATA_FILE):
+        try:
+            return StationCatalog(pd.read_parquet(METADATA_FILE), station_file_index())
+        except Exception:
+            return None
+    return None
@@ -1,14 +1,11 @@
+import functools
+import io
 import os
+import threading
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib as mpl
 
-mpl.rcParams.update({
-    'font.family': 'serif',
-    'mathtext.fontset': 'cm',
-    'axes.unicode_minus': False
-})
+from src.utils.instrumentation import timed_stage
 
 _PLOT_CONFIG = {
     'width_cm': 12,
@@ -20,6 +17,78 @@ _PLOT_CONFIG = {
     'alpha': 0.4,
 }
 
+# Matplotlib's mathtext parser is a single pyparsing grammar shared by every figure
+# (with packrat caching) and is not thread-safe: parses of the $...$ labels take turns.
+# Figures, canvases and their rendering are otherwise independent and run in parallel.
+_MATHTEXT_LOCK = threading.Lock()
+_SETUP_LOCK = threading.Lock()
+
+
+@functools.cache
+def _figure_classes():
+    """Import matplotlib on the first chart (it is slow to import), apply the chart style
+    and serialize the mathtext parser (_MATHTEXT_LOCK)."""
+    with _SETUP_LOCK:
+        import matplotlib as mpl
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.mathtext import MathTextParser
+
+        mpl.rcParams.update({
+            'font.family': 'serif',
+            'mathtext.fontset': 'cm',
+            'axes.unicode_minus': False
+        })
+
+        parse = MathTextParser.parse
+        if not getattr(parse, 'serialized', False):
+            @functools.wraps(parse)
+            def serialized_parse(self, *args, **kwargs):
+                with _MATHTEXT_LOCK:
+                    return parse(self, *args, **kwargs)
+
+            serialized_parse.serialized = True
+            MathTextParser.parse = serialized_parse
+
+    return Figure, FigureCanvasAgg
+
+
+def _new_figure(figsize: tuple[float, float]):
+    """Figure with its own Agg canvas and a single axes.
+
+    The figure is not registered in pyplot's global figure manager: nothing is shared
+    between the sessions rendering charts on different threads, and the figure is
+    freed as soon as the caller drops it (no plt.close needed).
+
+    :return: [0] = Figure, [1] = Axes
+    """
+    Figure, FigureCanvasAgg = _figure_classes()
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+
+    return fig, fig.subplots()
+
+
+def figure_png(fig, dpi: int = 300) -> io.BytesIO:
+    """Render a chart to PNG, ready for st.image and st.download_button.
+
+    The figure is cleared afterwards (also when rendering fails), so its artists are
+    released at once instead of waiting for the garbage collector: render it only once.
+
+    :param fig: Figure returned by one of the plot_* functions
+    :param dpi: Resolution
+
+    :return: Buffer positioned at its start
+    """
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    finally:
+        fig.clear()
+    buf.seek(0)
+
+    return buf
+
 
 def _get_fig_size() -> tuple[float, float]:
     cfg = _PLOT_CONFIG
@@ -28,6 +97,7 @@ def _get_fig_size() -> tuple[float, float]:
     return width_in, height_in
 
 
+@timed_stage()
 def plot_monthly_average_precipitation(output_folder: str, name: str, monthly: pd.DataFrame, rainy_season_start: int = 1, lang: str = 'pt'):
     labels = {
         'pt': {
@@ -51,7 +121,7 @@ def plot_monthly_average_precipitation(output_folder: str, name: str, monthly: p
     cfg = _PLOT_CONFIG
     width_in, height_in = _get_fig_size()
 
-    fig, ax = plt.subplots(figsize=(width_in, height_in))
+    fig, ax = _new_figure((width_in, height_in))
     ax.plot(monthly['mes'], monthly['precipitacao media mensal (mm)'],
             marker='o', color='red')
 
@@ -87,6 +157,7 @@ def plot_monthly_average_precipitation(output_folder: str, name: str, monthly: p
     return fig
 
 
+@timed_stage()
 def plot_pdf_daily_max_precipitation(
         output_folder: str,
         name: str,
@@ -115,7 +186,7 @@ def plot_pdf_daily_max_precipitation(
     cfg = _PLOT_CONFIG
     width_in, height_in = _get_fig_size()
 
-    fig, ax = plt.subplots(figsize=(width_in, height_in))
+    fig, ax = _new_figure((width_in, height_in))
 
     ax.tick_params(
         axis='both',
@@ -205,6 +276,7 @@ def plot_pdf_daily_max_precipitation(
     return fig
 
 
+@timed_stage()
 def plot_cdf_daily_max_precipitation(output_folder: str, name: str, data: dict, lang: str = 'pt'):
     labels = {
         'pt': {
@@ -225,7 +297,7 @@ def plot_cdf_daily_max_precipitation(output_folder: str, name: str, data: dict,
     width_in, height_in = _get_fig_size()
     colors = ['blue', 'red']
 
-    fig, ax = plt.subplots(figsize=(width_in, height_in))
+    fig, ax = _new_figure((width_in, height_in))
     ax.scatter(data['real']['x'], data['real']['y'],
                label=labels[lang]['legend'][0], color=colors[0], s=30)
     ax.plot(data['numerica']['x'], data['numerica']['y'],
@@ -236,10 +308,10 @@ def plot_cdf_daily_max_precipitation(output_folder: str, name: str, data: dict,
                   fontsize=cfg['label_size'], color='black')
     ax.tick_params(axis='both', which='major',
                    labelsize=cfg['axis_size'], colors='black')
-    plt.grid(True, linestyle='-', linewidth=0.2, alpha=cfg['alpha'])
-    plt.legend(fontsize=cfg['legend_size'], loc='lower center',
-               bbox_to_anchor=(0.5, 1.02), frameon=True)
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
+    ax.grid(True, linestyle='-', linewidth=0.2, alpha=cfg['alpha'])
+    ax.legend(fontsize=cfg['legend_size'], loc='lower center',
+              bbox_to_anchor=(0.5, 1.02), frameon=True)
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
 
     if output_folder is not None:
         fig.savefig(os.path.join(output_folder,
@@ -248,6 +320,7 @@ def plot_cdf_daily_max_precipitation(output_folder: str, name: str, data: dict,
     return fig
 
 
+@timed_stage()
 def plot_idf_curves(output_folder: str, name: str, lang: str, rainfall_matrix: pd.DataFrame):
     labels = {
         'pt': {
@@ -272,7 +345,7 @@ def plot_idf_curves(output_folder: str, name: str, lang: str, rainfall_matrix: p
         .unique()
     )
 
-    fig, ax = plt.subplots(figsize=(width_in, height_in))
+    fig, ax = _new_figure((width_in, height_in))
     for period in return_periods:
         filtered = rainfall_matrix[rainfall_matrix['t_r (anos)'] == period]
         ax.plot(filtered['t_c (min)'], filtered['y_obs (mm/h)'],
@@ -281,7 +354,7 @@ def plot_idf_curves(output_folder: str, name: str, lang: str, rainfall_matrix: p
     ax.set_ylabel(labels[lang]['y_label'], fontsize=cfg['label_size'])
     ax.grid(True, which="both", linestyle="--", alpha=cfg['alpha'])
     ax.legend(ncol=2, title=labels[lang]['title'], fontsize=cfg['legend_size'])
-    plt.tight_layout()
+    fig.tight_layout()
 
     if output_folder is not None:
         fig.savefig(os.path.join(output_folder,
@@ -290,6 +363,7 @@ def plot_idf_curves(output_folder: str, name: str, lang: str, rainfall_matrix: p
     return fig
 
 
+@timed_stage()
 def plot_time_series(output_folder: str, name: str, df: pd.DataFrame, date_col: str, value_col: str, value_label: str, lang: str = 'pt'):
     """Plot a generic time series (e.g. daily total precipitation) for a station.
 
@@ -319,7 +393,7 @@ def plot_time_series(output_folder: str, name: str, df: pd.DataFrame, date_col:
     width_in = 32 * cfg['inches_per_cm']
     height_in = 11 * cfg['inches_per_cm']
 
-    fig, ax = plt.subplots(figsize=(width_in, height_in))
+    fig, ax = _new_figure((width_in, height_in))
     ax.plot(df[date_col], df[value_col], color='steelblue',
             linewidth=0.8, label=labels[lang]['legend'])
     ax.set_xlabel(labels[lang]['xlabel'], fontsize=cfg['label_size'])
@@ -342,6 +416,7 @@ def plot_time_series(output_folder: str, name: str, df: pd.DataFrame, date_col:
 
     return fig
 
+@timed_stage()
 def plot_spi(
         output_folder: str,
         name: str,
@@ -416,8 +491,8 @@ def plot_spi(
             .reset_index()
         )
 
-    fig, ax = plt.subplots(
-        figsize=(width_in, height_in)
+    fig, ax = _new_figure(
+        (width_in, height_in)
     )
 
     # ---------------------------------------------------------
@@ -1,26 +1,227 @@
+import glob
 import os
 import shutil
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from src.functions.grid import DesignRainfallGrid
+from src.functions.precipitation_matrix import INDEX_FILE, PrecipitationMatrix
+from src.functions.spi_cube import SPICube
+from src.utils.instrumentation import record_cache_miss, timed_stage
 
+METADATA_FILE = "./data/metadata_estacoes.parquet"
+
+# Precomputed catalog-wide results (see src/utils/build_results.py)
+RESULTS_DIR = "./results"
+
+# Directories searched for the dados_*.parquet station files, in order of precedence
+STATION_DATA_DIRS = ["rain_datasets", "data"]
+
+# Number of 'Chave: valor' lines preceding the data table in a raw BDMEP export
+BDMEP_HEADER_LINES = 9
+
+BDMEP_DATE_COLUMN = 'Data Medicao'
+
+# Explicit dtypes of the BDMEP daily columns, so nothing is inferred while parsing
+BDMEP_DTYPES = {
+    'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)': 'float64',
+    'TEMPERATURA MEDIA, DIARIA (AUT)(°C)': 'float64',
+    'UMIDADE RELATIVA DO AR, MEDIA DIARIA (AUT)(%)': 'float64',
+    'VENTO, VELOCIDADE MEDIA DIARIA (AUT)(m/s)': 'float64',
+}
+
+
+def station_file_index() -> dict:
+    """Map each station code to its data file (first match in STATION_DATA_DIRS)."""
+    index = {}
+    for data_dir in STATION_DATA_DIRS:
+        for path_file in sorted(glob.glob(os.path.join(data_dir, "dados_*.parquet"))):
+            index.setdefault(os.path.basename(path_file).split('_')[1], path_file)
+    return index
+
+
+def result_mtime_ns(file_name: str) -> int | None:
+    """Version (modification time) of a file of the results directory, None if not built yet."""
+    try:
+        return os.stat(os.path.join(RESULTS_DIR, file_name)).st_mtime_ns
+    except OSError:
+        return None
+
+
+@timed_stage(cached=True)
 @st.cache_data
-def load_metadata():
-    if os.path.exists("./data/metadata_estacoes.parquet"):
-        try:
-            return pd.read_parquet("./data/metadata_estacoes.parquet")
-        except Exception:
-            return None
-    return None
+def _read_result_table(path_file: str, mtime_ns: int):
+    record_cache_miss()
+    try:
+        return pd.read_parquet(path_file)
+    except Exception:
+        return None
+
+
+def load_result_table(file_name: str):
+    """Load a precomputed table from the results directory (None if not built yet).
+
+    Reloaded whenever build_results rewrites it.
+    """
+    mtime_ns = result_mtime_ns(file_name)
+    if mtime_ns is None:
+        return None
+
+    return _read_result_table(os.path.join(RESULTS_DIR, file_name), mtime_ns)
+
+
+@timed_stage(cached=True)
+@st.cache_resource
+def _open_design_rainfall_grid(path_file: str, mtime_ns: int):
+    record_cache_miss()
+    try:
+        return DesignRainfallGrid(path_file)
+    except Exception:
+        return None
+
+
+def load_design_rainfall_grid(file_name: str = 'hmax_grid.bin'):
+    """Open the memory-mapped design-rainfall grid of the results directory (None if not built yet).
+
+    Reopened whenever build_results rewrites it.
+    """
+    path_file = os.path.join(RESULTS_DIR, file_name)
+    try:
+        mtime_ns = os.stat(path_file).st_mtime_ns
+    except OSError:
+        return None
+
+    return _open_design_rainfall_grid(path_file, mtime_ns)
+
+
+@timed_stage(cached=True)
+@st.cache_resource
+def _open_precipitation_matrix(directory: str, index_mtime_ns: int):
+    record_cache_miss()
+    try:
+        return PrecipitationMatrix(directory)
+    except Exception:
+        return None
+
+
+def load_precipitation_matrix(dir_name: str = 'precipitation_matrix'):
+    """Open the memory-mapped days x stations matrix of the results directory (None if not built yet).
+
+    Reopened whenever its index changes (incremental update by build_results).
+    """
+    directory = os.path.join(RESULTS_DIR, dir_name)
+    try:
+        index_mtime_ns = os.stat(os.path.join(directory, INDEX_FILE)).st_mtime_ns
+    except OSError:
+        return None
+
+    return _open_precipitation_matrix(directory, index_mtime_ns)
+
+
+@timed_stage(cached=True)
+@st.cache_resource
+def _open_spi_cube(path_file: str, mtime_ns: int):
+    record_cache_miss()
+    try:
+        return SPICube(path_file)
+    except Exception:
+        return None
 
 
+def load_spi_cube(file_name: str = 'spi_cube.npz'):
+    """Open the station x month SPI cube of the results directory (None if not built yet).
+
+    Reloaded whenever build_results rewrites it.
+    """
+    path_file = os.path.join(RESULTS_DIR, file_name)
+    try:
+        mtime_ns = os.stat(path_file).st_mtime_ns
+    except OSError:
+        return None
+
+    return _open_spi_cube(path_file, mtime_ns)
+
+
+@timed_stage(cached=True)
+@st.cache_resource
+def _open_gap_fills(path_file: str, mtime_ns: int):
+    record_cache_miss()
+    try:
+        fills = pd.read_parquet(path_file)
+    except Exception:
+        return None
+    return {code: group.reset_index(drop=True)
+            for code, group in fills.groupby('Codigo Estacao', sort=False)}
+
+
+def load_gap_fills(file_name: str = 'gap_fill.parquet'):
+    """Estimated days of the results directory split by station (None if not built yet).
+
+    Shared, not copied, by every caller (st.cache_resource): read only. Reloaded
+    whenever build_results rewrites the file.
+
+    :return: {'Codigo Estacao': rows of catalog_gap_fill}
+    """
+    mtime_ns = result_mtime_ns(file_name)
+    if mtime_ns is None:
+        return None
+
+    return _open_gap_fills(os.path.join(RESULTS_DIR, file_name), mtime_ns)
+
+
+@timed_stage(cached=True)
 @st.cache_data
 def load_station_data(file_path):
+    record_cache_miss()
     return pd.read_parquet(file_path)
 
 
+def write_parquet_atomic(df: pd.DataFrame, path_file: str):
+    """Write df to path_file through a temporary file so readers never see a partial file."""
+    tmp_path = path_file + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path_file)
+
+
+@timed_stage()
+def slice_table(
+        df: pd.DataFrame,
+        page: int,
+        page_size: int,
+        sort_by: str | None = None,
+        ascending: bool = True,
+        value_range: tuple | None = None
+    ) -> tuple[pd.DataFrame, int]:
+    """Rows of one page of a table after filtering and sorting (server-side pagination).
+
+    Only the sort column is sorted; the page rows are then taken by position, so the
+    whole table is never reordered or copied.
+
+    :param page: Page number, starting at 1
+    :param page_size: Rows per page
+    :param sort_by: Column to sort by (None keeps the table order); missing values go last
+    :param value_range: (column, minimum, maximum) keeping the rows with minimum <= column <= maximum
+
+    :return: [0] = Rows of the page, [1] = Number of rows after filtering
+    """
+    positions = np.arange(len(df))
+    if value_range is not None:
+        column, minimum, maximum = value_range
+        positions = positions[df[column].between(minimum, maximum).to_numpy()]
+
+    if sort_by is not None:
+        key = df[sort_by].iloc[positions].reset_index(drop=True)
+        order = key.sort_values(ascending=ascending, na_position='last', kind='stable').index
+        positions = positions[order.to_numpy()]
+
+    start = max(page - 1, 0) * page_size
+
+    return df.iloc[positions[start:start + page_size]], len(positions)
+
+
 def download_zip_dataset():
     project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
     source_dir = os.path.join(project_root, "data")
@@ -95,6 +296,79 @@ def get_hydrological_year_init(dataset: pd.DataFrame) -> tuple[str, int]:
     return method, hydrological_year_init
 
 
+def parse_bdmep_header(lines: list) -> dict:
+    """Parse the header lines of a raw BDMEP export into a metadata dict.
+
+    Keys are lower-cased with spaces replaced by underscores (e.g. 'codigo_estacao'),
+    coordinates are converted to float and the initial/final dates to datetime.date.
+
+    :param lines: Header lines from the BDMEP file ('Chave: valor')
+
+    :return: Metadata from the file (nome, codigo_estacao, latitude, ..., etc)
+    """
+    cabecalho = {}
+    for linha in lines:
+        linha = linha.strip()
+        if ':' in linha:
+            chave, valor = linha.split(':', 1)
+            chave_formatada = chave.strip().lower().replace(' ', '_')
+            valor = valor.strip()
+            if chave_formatada in ['latitude', 'longitude', 'altitude']:
+                valor = float(valor.replace(',', '.'))
+            elif chave_formatada in ['data_inicial', 'data_final']:
+                valor = datetime.strptime(valor, '%Y-%m-%d').date()
+            cabecalho[chave_formatada] = valor
+
+    return cabecalho
+
+
+def _close_after(f, chunks):
+    try:
+        yield from chunks
+    finally:
+        f.close()
+
+
+def read_bdmep_csv(path_file: str, chunksize: int | None = None, parse_dates: bool = True):
+    """Read a raw BDMEP CSV export (header and daily table) in a single pass.
+
+    The file is opened once: the header lines are consumed from the same handle that
+    is then given to the C parser, with explicit dtypes, decimal comma and 'null' as
+    missing value. With chunksize the daily table is returned as an iterator of
+    DataFrames so large exports are processed in bounded memory.
+
+    :param path_file: Path to the BDMEP CSV file
+    :param chunksize: Number of rows per chunk (None reads the whole table)
+    :param parse_dates: Parse 'Data Medicao' as datetime (False keeps the 'YYYY-MM-DD' strings)
+
+    :return: [0] = Metadata from the file header, [1] = Daily records (DataFrame or iterator of DataFrames)
+    """
+    f = open(path_file, 'r', encoding='utf-8')
+    try:
+        cabecalho = parse_bdmep_header(
+            [next(f) for _ in range(BDMEP_HEADER_LINES)])
+        reader = pd.read_csv(
+            f,
+            sep=';',
+            decimal=',',
+            na_values=['null'],
+            dtype={BDMEP_DATE_COLUMN: str, **BDMEP_DTYPES},
+            parse_dates=[BDMEP_DATE_COLUMN] if parse_dates else False,
+            date_format='%Y-%m-%d',
+            chunksize=chunksize,
+        )
+    except BaseException:
+        f.close()
+        raise
+
+    if chunksize is None:
+        f.close()
+        return cabecalho, reader
+
+    return cabecalho, _close_after(f, reader)
+
+
+@timed_stage()
 def clean_dataset(input_data: str | pd.DataFrame) -> tuple[dict, pd.DataFrame, pd.DataFrame]:
     """Read data file from BDMEP and extract cabecalho or process existing DataFrame
 
@@ -107,19 +381,7 @@ def clean_dataset(input_data: str | pd.DataFrame) -> tuple[dict, pd.DataFrame, p
 
     if isinstance(input_data, str):
         path_file = input_data
-        with open(path_file, 'r', encoding='utf-8') as f:
-            linhas = [next(f).strip() for _ in range(9)]
-            for linha in linhas:
-                if ':' in linha:
-                    chave, valor = linha.split(':', 1)
-                    chave_formatada = chave.strip().lower().replace(' ', '_')
-                    valor = valor.strip()
-                    if chave_formatada in ['latitude', 'longitude', 'altitude']:
-                        valor = float(valor)
-                    elif chave_formatada in ['data_inicial', 'data_final']:
-                        valor = datetime.strptime(valor, '%Y-%m-%d').date()
-                    cabecalho[chave_formatada] = valor
-        df = pd.read_csv(path_file, sep=";", encoding="utf-8", skiprows=9)
+        cabecalho, df = read_bdmep_csv(path_file)
 
     elif isinstance(input_data, pd.DataFrame):
         df = input_data.copy()
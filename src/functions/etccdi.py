@@ -0,0 +1,180 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.functions.hydrology import expected_days, hydrological_year_labels, rolling_sum
+from src.utils.instrumentation import timed_stage
+
+
+# Wet day: at least 1 mm (ETCCDI definition); dry day: less than that
+WET_DAY_MM = 1.0
+
+# Index columns of the output tables, in ETCCDI order
+ETCCDI_COLUMNS = [
+    'Rx1day (mm)',
+    'Rx5day (mm)',
+    'CDD (dias)',
+    'CWD (dias)',
+    'R10mm (dias)',
+    'R20mm (dias)',
+    'R95pTOT (mm)',
+    'PRCPTOT (mm)',
+    'SDII (mm/dia)',
+]
+
+ETCCDI_TABLE_COLUMNS = [
+    'Codigo Estacao',
+    'ano hidrologico',
+    'mes inicio ano hidrologico',
+    'dias validos',
+    'dias ausentes',
+] + ETCCDI_COLUMNS
+
+
+def run_lengths(condition: np.ndarray, segment_starts: np.ndarray) -> np.ndarray:
+    """Length of the run of True values ending at every row, restarting at every segment.
+
+    :param condition: Boolean array (days, stations)
+    :param segment_starts: First row of every segment (year)
+
+    :return: Integer array of the same shape (0 where condition is False)
+    """
+    rows = np.arange(len(condition))[:, None]
+    # Row of the last False at or before each row; a segment start acts as if the
+    # previous row were False, so runs never cross years
+    breaks = np.where(condition, -1, rows)
+    breaks[segment_starts] = np.where(condition[segment_starts], segment_starts[:, None] - 1,
+                                      breaks[segment_starts])
+
+    return rows - np.maximum.accumulate(breaks, axis=0)
+
+
+def _indices_block(values: np.ndarray, valid: np.ndarray, dates: pd.DatetimeIndex, hydro_init: int,
+                   wet_percentile: np.ndarray) -> tuple[np.ndarray, np.ndarray, dict]:
+    """Indices of the stations of one hydro_init, per (year, station).
+
+    :return: [0] = Years, [1] = Valid days (years, stations), [2] = {column: (years, stations) array}
+    """
+    labels = hydrological_year_labels(dates, hydro_init)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    years = labels[starts]
+
+    x = np.where(valid, values, 0.0)
+    wet = valid & (values >= WET_DAY_MM)
+    dry = valid & (values < WET_DAY_MM)
+    n_wet = np.add.reduceat(wet.astype(np.int32), starts, axis=0)
+    prcptot = np.add.reduceat(np.where(wet, x, 0.0), starts, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        indices = {
+            'Rx1day (mm)': np.fmax.reduceat(np.where(valid, values, np.nan), starts, axis=0),
+            'Rx5day (mm)': np.fmax.reduceat(rolling_sum(values, valid, 5), starts, axis=0),
+            'CDD (dias)': np.maximum.reduceat(run_lengths(dry, starts), starts, axis=0).astype(float),
+            'CWD (dias)': np.maximum.reduceat(run_lengths(wet, starts), starts, axis=0).astype(float),
+            'R10mm (dias)': np.add.reduceat((valid & (values >= 10)).astype(np.int32), starts, axis=0).astype(float),
+            'R20mm (dias)': np.add.reduceat((valid & (values >= 20)).astype(np.int32), starts, axis=0).astype(float),
+            'R95pTOT (mm)': np.add.reduceat(np.where(wet & (values > wet_percentile), x, 0.0), starts, axis=0),
+            'PRCPTOT (mm)': prcptot,
+            'SDII (mm/dia)': np.where(n_wet > 0, prcptot / n_wet, np.nan),
+        }
+    valid_days = np.add.reduceat(valid.astype(np.int32), starts, axis=0)
+
+    return years, valid_days, indices
+
+
+@timed_stage()
+def compute_etccdi_indices(
+        values: np.ndarray,
+        valid: np.ndarray,
+        start: pd.Timestamp,
+        codes: list,
+        hydro_inits: dict | None = None,
+        max_missing_days: int = 15
+    ) -> pd.DataFrame:
+    """ETCCDI extreme-precipitation indices of every station and hydrological year.
+
+    Rx1day, Rx5day (5-day windows ending in the year), CDD and CWD (longest dry and
+    wet spells, cut at the year limits and at missing days), R10mm, R20mm, R95pTOT
+    (precipitation of the wet days above the station's 95th percentile of wet days
+    over its whole record), PRCPTOT and SDII. As in compute_max_daily_preciptation,
+    negative values count as missing and a year is kept only when at most
+    max_missing_days of its days are missing.
+
+    All stations are computed together, in one array pass per distinct hydro_init.
+
+    :param values: Daily precipitation (days, stations), NaN when missing
+    :param valid: Validity of the same shape
+    :param start: Date of the first row
+    :param codes: Station code of every column
+    :param hydro_inits: First month of the hydrological year of each code (default: 1, civil year)
+    :param max_missing_days: Maximum missing days for a year to be kept
+
+    :return: Long table with the columns of ETCCDI_TABLE_COLUMNS
+    """
+    hydro_inits = hydro_inits or {}
+    valid = valid & (np.nan_to_num(values, nan=-1.0) >= 0)
+    values = np.where(valid, values, np.nan).astype(np.float64)
+    dates = pd.date_range(start, periods=len(values), freq='D')
+
+    with warnings.catch_warnings():
+        # Stations without any wet day
+        warnings.simplefilter('ignore', RuntimeWarning)
+        wet_percentile = np.nanpercentile(np.where(values >= WET_DAY_MM, values, np.nan), 95, axis=0)
+
+    column_inits = np.array([int(hydro_inits.get(code, 1)) for code in codes])
+    frames = []
+    for hydro_init in np.unique(column_inits):
+        columns = np.flatnonzero(column_inits == hydro_init)
+        years, valid_days, indices = _indices_block(
+            values[:, columns], valid[:, columns], dates, int(hydro_init), wet_percentile[columns])
+        missing_days = expected_days(years, int(hydro_init))[:, None] - valid_days
+
+        year_idx, station_idx = np.nonzero((missing_days <= max_missing_days) & (valid_days > 0))
+        frame = pd.DataFrame({
+            'Codigo Estacao': np.asarray(codes, dtype=object)[columns[station_idx]],
+            'ano hidrologico': years[year_idx],
+            'mes inicio ano hidrologico': int(hydro_init),
+            'dias validos': valid_days[year_idx, station_idx],
+            'dias ausentes': missing_days[year_idx, station_idx],
+        })
+        for column in ETCCDI_COLUMNS:
+            frame[column] = indices[column][year_idx, station_idx]
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=ETCCDI_TABLE_COLUMNS)
+
+    return (pd.concat(frames, ignore_index=True)
+            .sort_values(['Codigo Estacao', 'ano hidrologico'], ignore_index=True))
+
+
+def station_etccdi_indices(dataset: pd.DataFrame, hydro_init: int = 1, max_missing_days: int = 15) -> pd.DataFrame:
+    """ETCCDI indices of one station from its daily dataset.
+
+    :param dataset: Daily dataset with 'data medicao' and 'precipitacao total diaria (mm)'
+                    (clean_dataset or prepare_extreme_dataset output)
+    :param hydro_init: First month of the hydrological year
+    :param max_missing_days: Maximum missing days for a year to be kept
+
+    :return: compute_etccdi_indices table without the station code
+    """
+    series = (dataset.dropna(subset=['data medicao'])
+              .groupby('data medicao')['precipitacao total diaria (mm)'].last())
+    if series.empty:
+        return pd.DataFrame(columns=ETCCDI_TABLE_COLUMNS[1:])
+
+    series = series.reindex(pd.date_range(series.index.min(), series.index.max(), freq='D'))
+    values = series.to_numpy(dtype=float)[:, None]
+
+    indices = compute_etccdi_indices(values, ~np.isnan(values), series.index[0], ['station'],
+                                     {'station': hydro_init}, max_missing_days)
+
+    return indices.drop(columns='Codigo Estacao')
+
+
+def catalog_etccdi_indices(matrix, hydro_inits: dict | None = None, max_missing_days: int = 15) -> pd.DataFrame:
+    """compute_etccdi_indices of every station of a PrecipitationMatrix."""
+    values, valid = matrix.query()
+
+    return compute_etccdi_indices(values, valid, matrix.start, matrix.codes, hydro_inits, max_missing_days)
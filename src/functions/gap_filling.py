@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from src.functions.grid import station_neighbours
+from src.utils.instrumentation import timed_stage
+
+
+# Estimation methods: inverse-distance weighting of the neighbours' observations, or
+# regression through the origin on each neighbour over the concurrent days, weighted by its r²
+GAP_FILL_METHODS = ('idw', 'regressao')
+
+GAP_FILL_NEIGHBOURS = 5
+GAP_FILL_MAX_DISTANCE_KM = 100.0
+
+# Fewest days observed at both stations for a neighbour to enter a regression
+GAP_FILL_MIN_OVERLAP = 365
+
+# Stations per array block (bounds the days x stations x neighbours arrays)
+GAP_FILL_BLOCK = 64
+
+# Provenance column of the filled station records: True on estimated days
+FILLED_COLUMN = 'precipitacao preenchida'
+
+GAP_FILL_COLUMNS = [
+    'Codigo Estacao',
+    'Data Medicao',
+    'precipitacao estimada (mm)',
+    'vizinhos utilizados',
+    'metodo',
+]
+
+
+def _regression_weights(target: np.ndarray, target_valid: np.ndarray,
+                        neighbour: np.ndarray, neighbour_valid: np.ndarray,
+                        min_overlap: int) -> tuple[np.ndarray, np.ndarray]:
+    """Slope through the origin and r² of every (station, neighbour) pair on their concurrent days.
+
+    The slope is the weighted least-squares fit with variance proportional to the
+    neighbour's value, i.e. the ratio of the two means: unlike ordinary least squares
+    it does not shrink the estimates, so the filled totals stay unbiased.
+
+    :param target: Station values (days, stations)
+    :param neighbour: Neighbour values (days, stations, neighbours)
+
+    :return: [0] = Slopes, [1] = Weights r² (0 with less than min_overlap concurrent days
+             or a non-positive correlation), both (stations, neighbours)
+    """
+    both = target_valid[:, :, None] & neighbour_valid
+    y = np.where(both, target[:, :, None], 0.0)
+    x = np.where(both, neighbour, 0.0)
+
+    n = both.sum(axis=0)
+    sx, sy = x.sum(axis=0), y.sum(axis=0)
+    sxx, syy, sxy = (x * x).sum(axis=0), (y * y).sum(axis=0), (x * y).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = sy / sx
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+    usable = (n >= min_overlap) & (r > 0) & np.isfinite(slope)
+
+    return np.where(usable, slope, 0.0), np.where(usable, r ** 2, 0.0)
+
+
+@timed_stage()
+def fill_matrix_gaps(
+        values: np.ndarray,
+        valid: np.ndarray,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        method: str = 'regressao',
+        neighbours: int = GAP_FILL_NEIGHBOURS,
+        max_distance_km: float = GAP_FILL_MAX_DISTANCE_KM,
+        min_overlap: int = GAP_FILL_MIN_OVERLAP,
+        power: float = 2.0
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Estimate the missing days of every station from its neighbours on the same days.
+
+    'idw' averages the neighbours' observations with weights 1/d^power. 'regressao'
+    scales each neighbour's observation by its slope through the origin against the
+    station (_regression_weights, over their concurrent days) and averages them with
+    weights r². Each day
+    uses only the neighbours observed on it, and only days between the first and the
+    last observation of the station are filled. All days of a block of stations are
+    computed together on (days, stations, neighbours) arrays.
+
+    :param values: Daily precipitation (days, stations), NaN when missing
+    :param valid: Validity of the same shape
+    :param latitude, longitude: Coordinates of every column (NaN: never filled nor used)
+    :param method: One of GAP_FILL_METHODS
+    :param neighbours: Neighbours per station (station_neighbours)
+    :param max_distance_km: Farther stations are not used
+    :param min_overlap: Fewest concurrent days of a regression neighbour
+    :param power: IDW exponent
+
+    :return: [0] = Filled values (float64), [1] = Filled-day mask, [2] = Neighbours used
+             on every filled day (0 elsewhere)
+    """
+    if method not in GAP_FILL_METHODS:
+        raise ValueError(f"Unknown gap-filling method: {method}.")
+
+    valid = valid & (np.nan_to_num(values, nan=-1.0) >= 0)
+    values = np.where(valid, values, np.nan).astype(np.float64)
+    filled = values.copy()
+    filled_mask = np.zeros(values.shape, dtype=bool)
+    used = np.zeros(values.shape, dtype=np.int16)
+
+    located = np.isfinite(latitude) & np.isfinite(longitude)
+    positions = np.flatnonzero(located)
+    index, distance = station_neighbours(latitude[located], longitude[located], neighbours, max_distance_km)
+    index = np.where(index >= 0, positions[np.maximum(index, 0)], -1)
+
+    # Rows between the first and the last observation of every station
+    rows = np.arange(len(values))[:, None]
+    observed = valid.any(axis=0)
+    first = np.where(observed, valid.argmax(axis=0), len(values))
+    last = np.where(observed, len(values) - 1 - valid[::-1].argmax(axis=0), -1)
+
+    for start in range(0, len(positions), GAP_FILL_BLOCK):
+        block = positions[start:start + GAP_FILL_BLOCK]
+        block_index = index[start:start + GAP_FILL_BLOCK]
+        present = block_index >= 0
+        x = values[:, np.maximum(block_index, 0)]
+        x_valid = valid[:, np.maximum(block_index, 0)] & present
+
+        if method == 'idw':
+            slope = np.ones(block_index.shape)
+            weight = np.where(present, 1.0 / np.maximum(distance[start:start + GAP_FILL_BLOCK], 1e-6) ** power, 0.0)
+        else:
+            slope, weight = _regression_weights(values[:, block], valid[:, block], x, x_valid, min_overlap)
+
+        day_weight = np.where(x_valid, weight, 0.0)
+        total = day_weight.sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            estimate = np.einsum('dsk,dsk->ds', day_weight, np.where(x_valid, x, 0.0) * slope) / total
+
+        target = (~valid[:, block] & (total > 0)
+                  & (rows >= first[block]) & (rows <= last[block]))
+        filled[:, block] = np.where(target, estimate, filled[:, block])
+        filled_mask[:, block] = target
+        used[:, block] = np.where(target, (day_weight > 0).sum(axis=2), 0)
+
+    return filled, filled_mask, used
+
+
+def catalog_gap_fill(matrix, coordinates: pd.DataFrame, method: str = 'regressao', **kwargs) -> pd.DataFrame:
+    """Estimated days of every station of a PrecipitationMatrix (fill_matrix_gaps).
+
+    :param matrix: PrecipitationMatrix
+    :param coordinates: 'Codigo Estacao', 'Latitude' and 'Longitude' (metadata_estacoes.parquet)
+    :param method: One of GAP_FILL_METHODS; kwargs go to fill_matrix_gaps
+
+    :return: One row per filled station-day (columns of GAP_FILL_COLUMNS)
+    """
+    values, valid = matrix.query()
+    located = (coordinates.drop_duplicates('Codigo Estacao').set_index('Codigo Estacao')
+               .reindex(matrix.codes))
+
+    filled, filled_mask, used = fill_matrix_gaps(
+        values, valid,
+        pd.to_numeric(located['Latitude'], errors='coerce').to_numpy(dtype=float),
+        pd.to_numeric(located['Longitude'], errors='coerce').to_numpy(dtype=float),
+        method=method, **kwargs)
+
+    day, station = np.nonzero(filled_mask)
+    table = pd.DataFrame({
+        'Codigo Estacao': np.asarray(matrix.codes, dtype=object)[station],
+        'Data Medicao': (matrix.start + pd.to_timedelta(day, unit='D')).strftime('%Y-%m-%d'),
+        'precipitacao estimada (mm)': filled[day, station],
+        'vizinhos utilizados': used[day, station],
+        'metodo': method,
+    }, columns=GAP_FILL_COLUMNS)
+
+    return table.sort_values(['Codigo Estacao', 'Data Medicao'], ignore_index=True)
+
+
+def apply_gap_fill(raw_data: pd.DataFrame, fills: pd.DataFrame) -> pd.DataFrame:
+    """Station records with their missing precipitation replaced by the estimates.
+
+    Estimates only replace missing (or negative) observations, on the existing rows
+    or on new rows for absent dates; the FILLED_COLUMN flag marks them.
+
+    :param raw_data: Station records as stored in the dados_*.parquet files
+    :param fills: Rows of one station of catalog_gap_fill
+
+    :return: Records in the same schema plus FILLED_COLUMN
+    """
+    date_column, precipitation_column = 'Data Medicao', 'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)'
+    data = raw_data.copy()
+    data[FILLED_COLUMN] = False
+    if fills is None or fills.empty:
+        return data
+
+    estimates = pd.Series(fills['precipitacao estimada (mm)'].to_numpy(dtype=float),
+                          index=pd.to_datetime(fills['Data Medicao']))
+    dates = pd.to_datetime(data[date_column], errors='coerce')
+    observed = pd.to_numeric(data[precipitation_column], errors='coerce')
+
+    replace = (observed.isna() | (observed < 0)).to_numpy() & dates.isin(estimates.index).to_numpy()
+    data.loc[replace, precipitation_column] = estimates.reindex(dates[replace]).to_numpy()
+    data.loc[replace, FILLED_COLUMN] = True
+
+    absent = estimates[~estimates.index.isin(dates)]
+    if not absent.empty:
+        data = pd.concat([data, pd.DataFrame({
+            date_column: absent.index.strftime('%Y-%m-%d'),
+            precipitation_column: absent.to_numpy(),
+            FILLED_COLUMN: True,
+        })], ignore_index=True).sort_values(date_column, ignore_index=True)
+
+    return data
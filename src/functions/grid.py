@@ -0,0 +1,242 @@
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from src.functions.hydrology import MIN_QUANTILE_YEARS, plausible_quantiles
+from src.utils.instrumentation import timed_stage
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# File layout: fixed header, return periods (float64) and the float32 values
+# of shape (n_lat, n_lon, n_tr), row 0 being the southernmost latitude
+GRID_MAGIC = b'RDGRID01'
+GRID_HEADER = struct.Struct('<8sIIII4d')
+
+
+def _unit_vectors(latitude, longitude) -> np.ndarray:
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def station_neighbours(
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        neighbours: int = 5,
+        max_distance_km: float = 100.0
+    ) -> tuple[np.ndarray, np.ndarray]:
+    """Nearest other stations of every station, from a k-d tree over their coordinates.
+
+    :param latitude, longitude: Station coordinates
+    :param neighbours: Neighbours per station
+    :param max_distance_km: Farther stations are not neighbours
+
+    :return: [0] = Neighbour positions (n_stations, neighbours), -1 where there is none,
+             [1] = Great-circle distances (km), inf where there is none
+    """
+    from scipy.spatial import cKDTree
+
+    points = _unit_vectors(latitude, longitude)
+    k = min(neighbours + 1, len(points))
+    chord, index = cKDTree(points).query(points, k=k)
+    chord = chord.reshape(len(points), k)
+    index = index.reshape(len(points), k)
+
+    # Drop each station itself (the first hit, unless it shares its coordinates)
+    own = index == np.arange(len(points))[:, None]
+    own[~own.any(axis=1), -1] = True
+    index = index[~own].reshape(len(points), k - 1)
+    chord = chord[~own].reshape(len(points), k - 1)
+
+    distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+    far = distance_km > max_distance_km
+
+    return np.where(far, -1, index), np.where(far, np.inf, distance_km)
+
+
+@timed_stage()
+def idw_interpolate(
+        station_lat: np.ndarray,
+        station_lon: np.ndarray,
+        station_values: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        neighbours: int = 8,
+        power: float = 2.0,
+        max_distance_km: float = 150.0
+    ) -> np.ndarray:
+    """Inverse-distance weighting of station values at arbitrary points.
+
+    Distances are great-circle distances; points farther than max_distance_km from
+    every station are left as NaN.
+
+    :param station_values: Array (n_stations, n_values), e.g. one column per return period
+    :param lat, lon: Coordinates of the points to interpolate
+
+    :return: Array (n_points, n_values)
+    """
+    from scipy.spatial import cKDTree
+
+    station_values = np.asarray(station_values, dtype=float)
+    tree = cKDTree(_unit_vectors(station_lat, station_lon))
+    k = min(neighbours, len(station_values))
+    chord, index = tree.query(_unit_vectors(lat, lon), k=k)
+    chord = chord.reshape(len(chord), k)
+    index = index.reshape(len(index), k)
+
+    distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+    weights = 1.0 / np.maximum(distance_km, 1e-6) ** power
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    result = np.einsum('pk,pkv->pv', weights, station_values[index])
+    result[distance_km[:, 0] > max_distance_km] = np.nan
+
+    return result
+
+
+@timed_stage()
+def build_design_rainfall_grid(
+        hmax_quantiles: pd.DataFrame,
+        coordinates: pd.DataFrame,
+        resolution: float = 0.1,
+        max_distance_km: float = 150.0,
+        min_years: int = MIN_QUANTILE_YEARS
+    ) -> tuple[np.ndarray, dict]:
+    """Grid of the maximum daily precipitation quantiles over the station bounding box.
+
+    Only stations with at least min_years annual maxima and plausible quantiles
+    (plausible_quantiles) are interpolated: a single short record with a degenerate
+    fit would otherwise spread quantiles of thousands of metres over its neighbourhood.
+
+    :param hmax_quantiles: 'Codigo Estacao', 't_r (anos)' and 'h_max,1 (mm)' of every station,
+                           and 'n anos' for the record-length filter (catalog_hmax_quantiles)
+    :param coordinates: 'Codigo Estacao', 'Latitude' and 'Longitude'
+    :param resolution: Cell size (degrees)
+    :param max_distance_km: Cells farther than this from every station are NaN
+    :param min_years: Fewest annual maxima of an interpolated station
+
+    :return: [0] = Values (n_lat, n_lon, n_tr) in mm, [1] = Grid geometry for write_design_rainfall_grid
+    """
+    if 'n anos' in hmax_quantiles.columns:
+        hmax_quantiles = hmax_quantiles[hmax_quantiles['n anos'] >= min_years]
+    table = hmax_quantiles.pivot_table(
+        index='Codigo Estacao', columns='t_r (anos)', values='h_max,1 (mm)')
+    table = table[plausible_quantiles(table.to_numpy())]
+    stations = (
+        table.reset_index()[['Codigo Estacao']]
+        .merge(coordinates[['Codigo Estacao', 'Latitude', 'Longitude']]
+               .drop_duplicates('Codigo Estacao'), on='Codigo Estacao', how='left')
+    )
+    valid = stations[['Latitude', 'Longitude']].notna().all(axis=1).to_numpy()
+    station_lat = stations.loc[valid, 'Latitude'].to_numpy(dtype=float)
+    station_lon = stations.loc[valid, 'Longitude'].to_numpy(dtype=float)
+
+    lat0 = np.floor(station_lat.min() / resolution - 1) * resolution
+    lon0 = np.floor(station_lon.min() / resolution - 1) * resolution
+    n_lat = int(np.ceil((station_lat.max() - lat0) / resolution)) + 2
+    n_lon = int(np.ceil((station_lon.max() - lon0) / resolution)) + 2
+
+    grid_lat, grid_lon = np.meshgrid(
+        lat0 + resolution * np.arange(n_lat), lon0 + resolution * np.arange(n_lon), indexing='ij')
+    values = idw_interpolate(
+        station_lat, station_lon, table.to_numpy()[valid],
+        grid_lat.ravel(), grid_lon.ravel(), max_distance_km=max_distance_km)
+
+    geometry = {
+        'lat0': float(lat0), 'lon0': float(lon0),
+        'dlat': float(resolution), 'dlon': float(resolution),
+        'tr': [float(tr) for tr in table.columns],
+    }
+
+    return values.reshape(n_lat, n_lon, len(table.columns)).astype(np.float32), geometry
+
+
+def write_design_rainfall_grid(values: np.ndarray, geometry: dict, path_file: str):
+    """Write the grid (header + raw float32 values) through a temporary file."""
+    n_lat, n_lon, n_tr = values.shape
+    header = GRID_HEADER.pack(GRID_MAGIC, n_lat, n_lon, n_tr, 0, geometry['lat0'],
+                              geometry['lon0'], geometry['dlat'], geometry['dlon'])
+
+    tmp_path = path_file + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(np.asarray(geometry['tr'], dtype='<f8').tobytes())
+        f.write(np.ascontiguousarray(values, dtype='<f4').tobytes())
+    os.replace(tmp_path, path_file)
+
+
+class DesignRainfallGrid:
+    """Memory-mapped design-rainfall grid written by write_design_rainfall_grid."""
+
+    def __init__(self, path_file: str):
+        with open(path_file, 'rb') as f:
+            magic, n_lat, n_lon, n_tr, _, lat0, lon0, dlat, dlon = GRID_HEADER.unpack(
+                f.read(GRID_HEADER.size))
+            if magic != GRID_MAGIC:
+                raise ValueError(f"{path_file} is not a design-rainfall grid.")
+            self.tr = np.frombuffer(f.read(8 * n_tr), dtype='<f8').copy()
+
+        self.path_file = path_file
+        # Version of the file, to key what is derived from it
+        self.mtime_ns = os.stat(path_file).st_mtime_ns
+        self.lat0, self.lon0, self.dlat, self.dlon = lat0, lon0, dlat, dlon
+        self.n_lat, self.n_lon = n_lat, n_lon
+        self.values = np.memmap(path_file, dtype='<f4', mode='r',
+                                offset=GRID_HEADER.size + 8 * n_tr, shape=(n_lat, n_lon, n_tr))
+        self._view = self.values.view(np.ndarray)
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        """(south, west, north, east) of the cell centres."""
+        return (self.lat0, self.lon0,
+                self.lat0 + self.dlat * (self.n_lat - 1), self.lon0 + self.dlon * (self.n_lon - 1))
+
+    def lookup(self, lat: float, lon: float) -> np.ndarray | None:
+        """Bilinear interpolation of every return period at one point.
+
+        Corners without value (far from any station) are left out of the weighting.
+
+        :return: Values in the order of self.tr, or None outside the grid or its coverage
+        """
+        y = (lat - self.lat0) / self.dlat
+        x = (lon - self.lon0) / self.dlon
+        if not (0.0 <= y <= self.n_lat - 1 and 0.0 <= x <= self.n_lon - 1):
+            return None
+
+        i = min(int(y), self.n_lat - 2)
+        j = min(int(x), self.n_lon - 2)
+        fy = y - i
+        fx = x - j
+
+        # Plain ndarray view of the memmap: indexing it skips the memmap subclass overhead
+        v = self._view
+        total = 0.0
+        result = 0.0
+        for corner, weight in ((v[i, j], (1 - fy) * (1 - fx)), (v[i, j + 1], (1 - fy) * fx),
+                               (v[i + 1, j], fy * (1 - fx)), (v[i + 1, j + 1], fy * fx)):
+            if weight > 0.0 and corner[0] == corner[0]:
+                result = result + weight * corner
+                total += weight
+        if total <= 0.0:
+            return None
+
+        return result / total
+
+    def hmax_table(self, lat: float, lon: float) -> pd.DataFrame | None:
+        """Interpolated quantiles at one point, in the format of the analysis page df_hmax."""
+        values = self.lookup(lat, lon)
+        if values is None:
+            return None
+
+        return pd.DataFrame({
+            "t_r (anos)": self.tr.astype(int),
+            "1/Tr": 1 / self.tr,
+            "h_max,1 (mm)": values
+        })
+
+    def layer(self, tr: float) -> np.ndarray:
+        """Grid of one return period (n_lat, n_lon), row 0 being the southernmost."""
+        return np.asarray(self.values[:, :, int(np.argmin(np.abs(self.tr - tr)))])
@@ -1,8 +1,141 @@
 import numpy as np
-import scipy as sc
 import pandas as pd
 
+from src.utils.instrumentation import timed_stage
 
+
+# Durations (days) of the accumulated annual maxima
+MAX_DURATIONS = (1, 2, 3, 5, 10)
+
+# Fewest annual maxima of a station whose quantiles enter the catalog products
+# (the threshold of the 'short record' quality warning of the analysis page)
+MIN_QUANTILE_YEARS = 10
+
+# Largest plausible ratio between the quantiles of the longest and the shortest return
+# period (Tr = 100 and 2 years): fits of short records with very heavy tails go far beyond it
+MAX_QUANTILE_GROWTH = 5.0
+
+# Largest plausible daily quantile (mm), above the world-record daily rainfall
+MAX_PLAUSIBLE_HMAX_MM = 2000.0
+
+
+def hydrological_year_labels(dates: pd.DatetimeIndex, hydro_init: int) -> np.ndarray:
+    """Hydrological year of every date, labelled by the civil year in which it ends
+    (the civil year when hydro_init is 1), as in assign_hydrological_year."""
+    years = dates.year.to_numpy()
+    if hydro_init == 1:
+        return years
+
+    return years + (dates.month.to_numpy() >= hydro_init)
+
+
+def hydrological_year_bounds(years: np.ndarray, hydro_init: int) -> tuple[np.ndarray, np.ndarray]:
+    """First day of the hydrological years and of the following ones (datetime64[D])."""
+    offset = 0 if hydro_init == 1 else 1
+    first_month = (np.asarray(years) - offset - 1970) * 12 + (hydro_init - 1)
+
+    return (first_month.astype('datetime64[M]').astype('datetime64[D]'),
+            (first_month + 12).astype('datetime64[M]').astype('datetime64[D]'))
+
+
+def expected_days(years: np.ndarray, hydro_init: int) -> np.ndarray:
+    """Length in days of the hydrological years starting in month hydro_init."""
+    starts, ends = hydrological_year_bounds(years, hydro_init)
+
+    return (ends - starts).astype(int)
+
+
+def rolling_sum(values: np.ndarray, valid: np.ndarray, window: int) -> np.ndarray:
+    """Sum of the window days ending at every row (NaN if any of them is missing).
+
+    :param values: Daily values (days, ...)
+    :param valid: Validity of the same shape
+    """
+    zero = np.zeros((1,) + values.shape[1:])
+    totals = np.concatenate([zero, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    missing = np.concatenate([zero, np.cumsum(~valid, axis=0)])
+
+    sums = np.full(values.shape, np.nan)
+    sums[window - 1:] = totals[window:] - totals[:-window]
+    sums[window - 1:][(missing[window:] - missing[:-window]) > 0] = np.nan
+
+    return sums
+
+
+@timed_stage()
+def compute_max_precipitation_durations(
+        dataset: pd.DataFrame,
+        hydro_init: int = 1,
+        max_missing_days: int = 15,
+        durations: tuple = MAX_DURATIONS
+    ) -> pd.DataFrame:
+    """
+    Compute the annual maximum precipitation accumulated over several
+    durations (consecutive days) using valid daily observations.
+
+    A civil or hydrological year is retained when the number of missing
+    daily precipitation observations does not exceed max_missing_days;
+    the same years, those of the observed dates, are used for every duration. The d-day maximum of a
+    year is the largest sum of d consecutive valid days ending in that
+    year. Negative values count as missing observations.
+
+    All durations and years are computed in one pass over rolling sums
+    of the daily series, with a mask of the windows that contain a
+    missing day.
+
+    :param dataset: Daily dataset with 'data medicao' and 'precipitacao total diaria (mm)'
+    :param hydro_init: First month of the hydrological year (1 = civil year)
+    :param max_missing_days: Maximum missing days for a year to be retained
+    :param durations: Durations in days
+
+    :return: Long table ('ano hidrologico', 'duracao (dias)', 'precipitacao máxima anual (mm)',
+             'dias validos', 'dias ausentes'), sorted by duration and year
+    """
+    columns = ['ano hidrologico', 'duracao (dias)', 'precipitacao máxima anual (mm)',
+               'dias validos', 'dias ausentes']
+
+    dates = pd.to_datetime(dataset['data medicao'], errors='coerce')
+    precipitation = pd.to_numeric(dataset['precipitacao total diaria (mm)'], errors='coerce')
+    known = dates.notna().to_numpy()
+    if not known.any():
+        return pd.DataFrame(columns=columns)
+
+    # A date is observed when one of its records holds a non-negative value
+    dates = pd.DatetimeIndex(dates[known]).normalize()
+    daily = precipitation[known].where(precipitation[known] >= 0).groupby(dates).max()
+    years = np.unique(hydrological_year_labels(dates, hydro_init))
+
+    # Daily series covering every year with records
+    first_days, next_first_days = hydrological_year_bounds(np.sort(years), hydro_init)
+    index = pd.date_range(first_days[0], next_first_days[-1] - np.timedelta64(1, 'D'), freq='D')
+    values = daily.reindex(index).to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+
+    labels = hydrological_year_labels(index, hydro_init)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    segment_years = labels[starts]
+
+    sums = np.stack([rolling_sum(values, valid, d) for d in durations], axis=1)
+    with np.errstate(invalid='ignore'):
+        maxima = np.fmax.reduceat(sums, starts, axis=0)
+    valid_days = np.add.reduceat(valid.astype(int), starts)
+    missing_days = expected_days(segment_years, hydro_init) - valid_days
+
+    retained = np.isin(segment_years, years) & (missing_days <= max_missing_days)
+    year_idx, duration_idx = np.nonzero(retained[:, None] & (np.nan_to_num(maxima) > 0))
+
+    result = pd.DataFrame({
+        'ano hidrologico': segment_years[year_idx].astype(int),
+        'duracao (dias)': np.asarray(durations, dtype=int)[duration_idx],
+        'precipitacao máxima anual (mm)': maxima[year_idx, duration_idx],
+        'dias validos': valid_days[year_idx],
+        'dias ausentes': missing_days[year_idx],
+    }, columns=columns)
+
+    return result.sort_values(['duracao (dias)', 'ano hidrologico'], ignore_index=True)
+
+
+@timed_stage()
 def compute_max_daily_preciptation(
         dataset: pd.DataFrame,
         hydro_init: int = 1,
@@ -16,130 +149,28 @@ def compute_max_daily_preciptation(
     Incomplete months are not discarded for extreme-value analysis.
     A civil or hydrological year is retained when the number of missing
     daily precipitation observations does not exceed max_missing_days.
+    This is the 1-day duration of compute_max_precipitation_durations.
     """
 
-    df = dataset.copy()
-
-    df['data medicao'] = pd.to_datetime(
-        df['data medicao'],
-        errors='coerce'
+    maxima = compute_max_precipitation_durations(
+        dataset,
+        hydro_init=hydro_init,
+        max_missing_days=max_missing_days,
+        durations=(1,)
     )
 
-    df['precipitacao total diaria (mm)'] = pd.to_numeric(
-        df['precipitacao total diaria (mm)'],
-        errors='coerce'
-    )
+    return maxima.drop(columns='duracao (dias)')
 
-    results = []
 
-    for hydro_year, group in df.groupby('ano hidrologico'):
-
-        if pd.isna(hydro_year):
-            continue
-
-        hydro_year = int(hydro_year)
-
-        if hydro_init == 1:
-
-            start_date = pd.Timestamp(
-                year=hydro_year,
-                month=1,
-                day=1
-            )
-
-            end_date = pd.Timestamp(
-                year=hydro_year,
-                month=12,
-                day=31
-            )
-
-        else:
-
-            start_date = pd.Timestamp(
-                year=hydro_year - 1,
-                month=hydro_init,
-                day=1
-            )
-
-            end_date = (
-                pd.Timestamp(
-                    year=hydro_year,
-                    month=hydro_init,
-                    day=1
-                )
-                - pd.Timedelta(days=1)
-            )
-
-        expected_days = (
-            end_date - start_date
-        ).days + 1
-
-        group = group[
-            (group['data medicao'] >= start_date) &
-            (group['data medicao'] <= end_date)
-        ].copy()
-
-        valid = group.dropna(
-            subset=['precipitacao total diaria (mm)']
-        ).copy()
-
-        valid = valid[
-            valid['precipitacao total diaria (mm)'] >= 0
-        ]
-
-        valid_days = (
-            valid['data medicao']
-            .dt.normalize()
-            .nunique()
-        )
-
-        missing_days = expected_days - valid_days
-
-        if missing_days > max_missing_days:
-            continue
-
-        max_precip = valid[
-            'precipitacao total diaria (mm)'
-        ].max()
-
-        if pd.notna(max_precip) and max_precip > 0:
-
-            results.append({
-                'ano hidrologico': hydro_year,
-                'precipitacao máxima anual (mm)': max_precip,
-                'dias validos': valid_days,
-                'dias ausentes': missing_days
-            })
-
-    return pd.DataFrame(
-        results,
-        columns=[
-            'ano hidrologico',
-            'precipitacao máxima anual (mm)',
-            'dias validos',
-            'dias ausentes'
-        ]
-    )
-
-
-def compute_gev(dataset: pd.DataFrame) -> tuple[float, float, float, list]:
-    """Check the GEV parameters for the top anual precipitation
+def gev_lmoments(x: np.ndarray) -> tuple[float, float, float]:
+    """GEV parameters of a sample by L-moments (Hosking, 1985).
 
-    :param dataset: pd.DataFrame with the biggest daily precipitaion
-                    by hydrological or civil year
+    :param x: Positive annual maximum precipitation values
 
-    :return: [0] = Form parameter (c),
-             [1] = Localization parameter (loc),
-             [2] = Scale parameter (scale),
-             [3] = GEV data for plot
+    :return: [0] = Form parameter (c, SciPy convention), [1] = Localization parameter
+             (loc), [2] = Scale parameter (scale)
     """
-
-    x = pd.to_numeric(
-        dataset['precipitacao máxima anual (mm)'],
-        errors="coerce"
-    ).dropna().to_numpy(dtype=float)
-
-    x = x[x > 0.0]
+    from scipy import special
 
     # Sort data for L-moments calculation
     x = np.sort(x)
@@ -181,7 +212,7 @@ def compute_gev(dataset: pd.DataFrame) -> tuple[float, float, float, list]:
     c = 7.8590 * aux + 2.9554 * aux ** 2
 
     # Scale parameter
-    gamma_value = sc.special.gamma(1 + c)
+    gamma_value = special.gamma(1 + c)
 
     scale = (
         l2 * c
@@ -196,7 +227,33 @@ def compute_gev(dataset: pd.DataFrame) -> tuple[float, float, float, list]:
         scale * (1 - gamma_value) / c
     )
 
-    dist = sc.stats.genextreme(
+    return float(c), float(loc), float(scale)
+
+
+@timed_stage()
+def compute_gev(dataset: pd.DataFrame) -> tuple[float, float, float, list]:
+    """Check the GEV parameters for the top anual precipitation
+
+    :param dataset: pd.DataFrame with the biggest daily precipitaion
+                    by hydrological or civil year
+
+    :return: [0] = Form parameter (c),
+             [1] = Localization parameter (loc),
+             [2] = Scale parameter (scale),
+             [3] = GEV data for plot
+    """
+    from scipy import stats
+
+    x = pd.to_numeric(
+        dataset['precipitacao máxima anual (mm)'],
+        errors="coerce"
+    ).dropna().to_numpy(dtype=float)
+
+    x = x[x > 0.0]
+
+    c, loc, scale = gev_lmoments(x)
+
+    dist = stats.genextreme(
         c,
         loc=loc,
         scale=scale
@@ -221,10 +278,11 @@ def compute_hmax_gev(c: float, loc: float, scale: float) -> pd.DataFrame:
 
     :return: Max daily precipition (mm) based in return period (anos)
     """
+    from scipy import stats
 
     Tr_list = [2, 5, 10, 15, 20, 25, 50, 100]
     p = 1 - 1/np.array(Tr_list, dtype=float)
-    x_Tr = sc.stats.genextreme.ppf(p, c, loc=loc, scale=scale)
+    x_Tr = stats.genextreme.ppf(p, c, loc=loc, scale=scale)
     p_exec = 1/np.array(Tr_list, dtype=float)
     df_hmax1 = pd.DataFrame(
         {"t_r (anos)": Tr_list, "1/Tr": p_exec, "h_max,1 (mm)": x_Tr})
@@ -232,6 +290,25 @@ def compute_hmax_gev(c: float, loc: float, scale: float) -> pd.DataFrame:
     return df_hmax1
 
 
+def plausible_quantiles(x_Tr: np.ndarray) -> np.ndarray:
+    """Whether each row of quantiles (by increasing return period) is physically plausible.
+
+    :param x_Tr: Quantiles (mm), shape (n_tr,) or (stations, n_tr)
+
+    :return: False where any quantile is not finite and positive, exceeds
+             MAX_PLAUSIBLE_HMAX_MM or grows more than MAX_QUANTILE_GROWTH from the
+             first to the last return period
+    """
+    x_Tr = np.atleast_2d(np.asarray(x_Tr, dtype=float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = x_Tr[:, -1] / x_Tr[:, 0]
+
+    return (np.all(np.isfinite(x_Tr) & (x_Tr > 0), axis=1)
+            & np.all(x_Tr <= MAX_PLAUSIBLE_HMAX_MM, axis=1)
+            & (growth <= MAX_QUANTILE_GROWTH))
+
+
+@timed_stage()
 def desag_max_daily_preciptation_intesity(h_max1):
     """
     Desagregação da precipitação máxima diária (mm) em função do tempo de concentração (tc) em minutos e tempo de retorno (tr) em anos para matriz de intensidade de chuva (mm/h)
@@ -304,6 +381,7 @@ def compute_preciptation(dataframe: pd.DataFrame, metadata: dict) -> tuple[pd.Da
     return df_hmax1, matrix
 
 
+@timed_stage()
 def compute_spi(dataset: pd.DataFrame) -> pd.DataFrame:
     """Compute monthly Standardized Precipitation Index (SPI-1).
 
@@ -311,6 +389,7 @@ def compute_spi(dataset: pd.DataFrame) -> pd.DataFrame:
 
     :return: The same dataset but with the SPI-1 column
     """
+    from scipy import stats
 
     col_precip = 'precipitacao mensal (mm)'
 
@@ -329,10 +408,10 @@ def compute_spi(dataset: pd.DataFrame) -> pd.DataFrame:
 
         # Ajuste Gamma e CDF ajustada
         if len(positivos) > 1:
-            a, loc, scale = sc.stats.gamma.fit(positivos, floc=0)
-            cdf = sc.stats.gamma.cdf(dados_mes, a, loc=loc, scale=scale)
+            a, loc, scale = stats.gamma.fit(positivos, floc=0)
+            cdf = stats.gamma.cdf(dados_mes, a, loc=loc, scale=scale)
             cdf_adj = np.clip(q + (1 - q) * cdf, 1e-6, 1 - 1e-6)
-            spi = sc.stats.norm.ppf(cdf_adj)
+            spi = stats.norm.ppf(cdf_adj)
             dataset.loc[dados_mes.index, 'SPI_1'] = spi
 
     return dataset
@@ -0,0 +1,219 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.functions.hydrology import desag_max_daily_preciptation_intesity
+from src.utils.instrumentation import timed_stage
+
+
+# Starting point (K, a, b, c) typical of Brazilian IDF equations
+IDF_DEFAULT_GUESS = (1000.0, 0.15, 10.0, 0.75)
+
+# Smallest R² of an acceptable fit of the equation to the disaggregated matrix
+IDF_MIN_R2 = 0.98
+
+IDF_PARAMETER_COLUMNS = ['K', 'a', 'b', 'c', 'rmse (mm/h)', 'r2', 'ajuste aceitavel']
+
+
+def idf_intensity(K: float, a: float, b: float, c: float, t, tr):
+    """Rainfall intensity (mm/h) of the IDF equation i = K·Tr^a / (t + b)^c.
+
+    :param K, a, b, c: IDF equation parameters
+    :param t: Duration (min), scalar or array
+    :param tr: Return period (anos), scalar or array
+
+    :return: Intensity (mm/h)
+    """
+    return K * np.power(tr, a) / np.power(np.asarray(t, dtype=float) + b, c)
+
+
+class IDFDesign:
+    """Durations and return periods of the disaggregated matrix, shared by all stations.
+
+    The residuals are fitted in log space, log i = log K + a·log Tr - c·log(t + b), so the
+    Jacobian columns of log K and a are constant: they are built once here and only the
+    columns of b and c are refreshed at each evaluation.
+    """
+
+    def __init__(self, t: np.ndarray, tr: np.ndarray):
+        self.t = np.asarray(t, dtype=float)
+        self.tr = np.asarray(tr, dtype=float)
+        self.log_tr = np.log(self.tr)
+        self._jac_template = np.empty((len(self.t), 4))
+        self._jac_template[:, 0] = 1.0
+        self._jac_template[:, 1] = self.log_tr
+
+    @classmethod
+    def from_matrix(cls, rainfall_matrix: pd.DataFrame) -> 'IDFDesign':
+        return cls(rainfall_matrix['t_c (min)'].to_numpy(), rainfall_matrix['t_r (anos)'].to_numpy())
+
+    def residuals(self, theta: np.ndarray, log_i: np.ndarray) -> np.ndarray:
+        log_k, a, b, c = theta
+        return log_k + a * self.log_tr - c * np.log(self.t + b) - log_i
+
+    def jacobian(self, theta: np.ndarray, log_i: np.ndarray) -> np.ndarray:
+        _, _, b, c = theta
+        jac = self._jac_template.copy()
+        jac[:, 2] = -c / (self.t + b)
+        jac[:, 3] = -np.log(self.t + b)
+        return jac
+
+    def fit(self, intensity: np.ndarray, x0: tuple | None = None) -> dict:
+        """Fit (K, a, b, c) to the intensities observed on this design.
+
+        :param intensity: Intensities (mm/h) in the order of the design
+        :param x0: Initial (K, a, b, c); IDF_DEFAULT_GUESS when None
+
+        :return: Parameters, RMSE (mm/h), coefficient of determination and whether it
+                 reaches IDF_MIN_R2
+        """
+        from scipy.optimize import least_squares
+
+        intensity = np.asarray(intensity, dtype=float)
+        log_i = np.log(intensity)
+        K0, a0, b0, c0 = x0 if x0 is not None else IDF_DEFAULT_GUESS
+        theta0 = np.array([np.log(K0), a0, max(b0, 0.0), max(c0, 1e-3)])
+
+        solution = least_squares(
+            self.residuals,
+            theta0,
+            jac=self.jacobian,
+            bounds=([-np.inf, -np.inf, 0.0, 1e-3], [np.inf, np.inf, np.inf, np.inf]),
+            args=(log_i,),
+            method='trf',
+            x_scale='jac',
+        )
+
+        log_k, a, b, c = solution.x
+        K = float(np.exp(log_k))
+        fitted = idf_intensity(K, a, b, c, self.t, self.tr)
+        rmse = float(np.sqrt(np.mean((fitted - intensity) ** 2)))
+        ss_tot = np.sum((intensity - intensity.mean()) ** 2)
+        r2 = float(1 - np.sum((fitted - intensity) ** 2) / ss_tot) if ss_tot > 0 else np.nan
+
+        return {'K': K, 'a': float(a), 'b': float(b), 'c': float(c),
+                'rmse (mm/h)': rmse, 'r2': r2,
+                'ajuste aceitavel': bool(np.isfinite(r2) and r2 >= IDF_MIN_R2)}
+
+
+@timed_stage()
+def fit_idf_equation(rainfall_matrix: pd.DataFrame, x0: tuple | None = None) -> dict:
+    """Fit the IDF equation i = K·Tr^a / (t + b)^c to a disaggregated intensity matrix.
+
+    :param rainfall_matrix: Output of desag_max_daily_preciptation_intesity
+    :param x0: Initial (K, a, b, c), e.g. the solution of a neighbouring station
+
+    :return: {'K', 'a', 'b', 'c', 'rmse (mm/h)', 'r2', 'ajuste aceitavel'}
+    """
+    design = IDFDesign.from_matrix(rainfall_matrix)
+
+    return design.fit(rainfall_matrix['y_obs (mm/h)'].to_numpy(), x0)
+
+
+def neighbour_chain(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """Order points so each one follows a near neighbour (greedy nearest-neighbour tour).
+
+    :return: Indices of the points in visiting order, starting at the southernmost point
+    """
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    n = len(xyz)
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=int)
+    current = int(np.argmin(lat)) if n else 0
+    for k in range(n):
+        order[k] = current
+        visited[current] = True
+        if k == n - 1:
+            break
+        distance = np.sum((xyz - xyz[current]) ** 2, axis=1)
+        distance[visited] = np.inf
+        current = int(np.argmin(distance))
+
+    return order
+
+
+def _fit_segment(segment: tuple) -> list:
+    t, tr, codes, intensities = segment
+    design = IDFDesign(t, tr)
+
+    rows = []
+    previous = None
+    for code, intensity in zip(codes, intensities):
+        try:
+            params = design.fit(intensity, previous)
+        except (ValueError, FloatingPointError):
+            params = design.fit(intensity)
+        # Warm start the next (neighbouring) station from this solution
+        previous = (params['K'], params['a'], params['b'], params['c'])
+        rows.append({'Codigo Estacao': code, **params})
+
+    return rows
+
+
+def fit_idf_catalog(
+        hmax_quantiles: pd.DataFrame,
+        coordinates: pd.DataFrame,
+        max_workers: int | None = None
+    ) -> pd.DataFrame:
+    """Fit the IDF equation of every station.
+
+    Stations are visited along a nearest-neighbour chain so each fit starts from the
+    solution of its neighbour; the chain is split into contiguous segments fitted in
+    parallel processes. All stations share the same (t, Tr) design, hence the same
+    IDFDesign and Jacobian structure. Fits below IDF_MIN_R2 are kept, flagged by
+    'ajuste aceitavel' = False.
+
+    :param hmax_quantiles: 'Codigo Estacao', 't_r (anos)' and 'h_max,1 (mm)' of every station
+                           (catalog_hmax_quantiles, which drops the short records)
+    :param coordinates: 'Codigo Estacao', 'Latitude' and 'Longitude'
+    :param max_workers: Number of processes (None = number of CPUs, 1 = run in this process)
+
+    :return: One row per station with IDF_PARAMETER_COLUMNS
+    """
+    codes = []
+    intensities = []
+    design_matrix = None
+    for code, group in hmax_quantiles.groupby('Codigo Estacao', sort=True):
+        matrix = desag_max_daily_preciptation_intesity(
+            group.sort_values('t_r (anos)'))
+        if design_matrix is None:
+            design_matrix = matrix
+        codes.append(code)
+        intensities.append(matrix['y_obs (mm/h)'].to_numpy(dtype=float))
+
+    if not codes:
+        return pd.DataFrame(columns=['Codigo Estacao'] + IDF_PARAMETER_COLUMNS)
+
+    coords = (
+        pd.DataFrame({'Codigo Estacao': codes})
+        .merge(coordinates[['Codigo Estacao', 'Latitude', 'Longitude']]
+               .drop_duplicates('Codigo Estacao'), on='Codigo Estacao', how='left')
+    )
+    coords[['Latitude', 'Longitude']] = coords[['Latitude', 'Longitude']].fillna(0.0)
+    order = neighbour_chain(coords['Latitude'], coords['Longitude'])
+
+    n_segments = 1 if max_workers == 1 else min(len(order), max_workers or 4)
+    t = design_matrix['t_c (min)'].to_numpy(dtype=float)
+    tr = design_matrix['t_r (anos)'].to_numpy(dtype=float)
+    segments = [
+        (t, tr, [codes[i] for i in chunk], [intensities[i] for i in chunk])
+        for chunk in np.array_split(order, n_segments) if len(chunk)
+    ]
+
+    if max_workers == 1:
+        fitted = map(_fit_segment, segments)
+        rows = [row for segment_rows in fitted for row in segment_rows]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = [row for segment_rows in executor.map(_fit_segment, segments)
+                    for row in segment_rows]
+
+    return (
+        pd.DataFrame(rows, columns=['Codigo Estacao'] + IDF_PARAMETER_COLUMNS)
+        .sort_values('Codigo Estacao')
+        .reset_index(drop=True)
+    )
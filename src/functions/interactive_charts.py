@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.utils.instrumentation import timed_stage
+
+
+# Points sent to the browser per trace: a min/max pair for every bucket
+MAX_BUCKETS = 2000
+
+# SPI categories: (lower bound, upper bound, colour, label key)
+_SPI_BANDS = [
+    (-4.0, -2.0, '#A50026', 'seco_extremo'),
+    (-2.0, -1.5, '#D73027', 'seco_severo'),
+    (-1.5, -1.0, '#FC8D59', 'seco_moderado'),
+    (1.0, 1.5, '#91BFDB', 'umido_moderado'),
+    (1.5, 2.0, '#4575B4', 'umido_severo'),
+    (2.0, 4.0, '#313695', 'umido_extremo'),
+]
+
+
+def decimate_minmax(x: np.ndarray, y: np.ndarray, n_buckets: int = MAX_BUCKETS) -> tuple[np.ndarray, np.ndarray]:
+    """Reduce a series to the minimum and maximum of n_buckets consecutive slices.
+
+    Peaks survive the reduction, which is what matters on precipitation charts.
+    Buckets without any valid value become a single NaN point, so long gaps keep
+    breaking the line. Series with up to 2 * n_buckets points are returned as is.
+
+    :param x: Abscissas, in plotting order
+    :param y: Values (NaN for missing data)
+    :param n_buckets: Number of slices
+
+    :return: [0] = Decimated abscissas, [1] = Decimated values
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return x, y
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    valid = np.flatnonzero(~np.isnan(y))
+    bucket = np.searchsorted(edges, valid, side='right') - 1
+
+    # Sorted by bucket, then by value: first/last of each bucket are its min/max
+    order = np.lexsort((y[valid], bucket))
+    sorted_bucket = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    min_pos = valid[order[starts]]
+    max_pos = valid[order[ends]]
+    filled = sorted_bucket[starts]
+
+    empty = np.setdiff1d(np.arange(n_buckets), filled)
+
+    # Keep the time order inside every bucket, empty buckets sorting by their first sample
+    positions = np.concatenate([np.minimum(min_pos, max_pos), np.maximum(min_pos, max_pos), edges[empty]])
+    keys = np.concatenate([2 * filled, 2 * filled + 1, 2 * empty])
+    order = np.argsort(keys, kind='stable')
+    positions = positions[order]
+
+    values = y[positions]
+    values[order >= 2 * len(filled)] = np.nan
+
+    return x[positions], values
+
+
+def _base_layout(xlabel: str, ylabel: str) -> dict:
+    return dict(
+        xaxis=dict(title=xlabel, rangeslider=dict(visible=True), type='date'),
+        yaxis=dict(title=ylabel, gridcolor='rgba(0,0,0,0.15)', griddash='dash'),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='center', x=0.5),
+        margin=dict(l=60, r=20, t=40, b=40),
+        hovermode='x',
+        height=420,
+    )
+
+
+@timed_stage()
+def plotly_time_series(
+        df: pd.DataFrame,
+        date_col: str,
+        value_col: str,
+        value_label: str,
+        lang: str = 'pt',
+        n_buckets: int = MAX_BUCKETS
+    ):
+    """Interactive (WebGL) version of charts.plot_time_series.
+
+    The series is decimated once, on the server (decimate_minmax), before being sent
+    to the browser, so the payload stays bounded whatever the length of the record.
+    Zooming in the browser only magnifies that single level (a min/max envelope on
+    long records): Streamlit does not send Plotly's zoom events back. Daily detail
+    comes from narrowing the period passed in df (the explorer's period filter),
+    which is decimated anew; periods of up to 2 * n_buckets days are sent whole.
+
+    :param df: DataFrame containing the date and value columns
+    :param date_col: Name of the date column
+    :param value_col: Name of the numeric column to plot
+    :param value_label: Label used on the y-axis
+    :param lang: 'pt' or 'en'
+    :param n_buckets: Decimation buckets (see decimate_minmax)
+
+    :return: [0] = Plotly figure, [1] = Number of points drawn
+    """
+    labels = {
+        'pt': {'xlabel': 'Data', 'legend': 'Dados observados'},
+        'en': {'xlabel': 'Date', 'legend': 'Observed data'},
+    }
+
+    data = df[[date_col, value_col]].sort_values(date_col)
+    x, y = decimate_minmax(data[date_col].to_numpy(), data[value_col].to_numpy(dtype=float), n_buckets)
+
+    fig = go.Figure(go.Scattergl(
+        x=x, y=y, mode='lines', name=labels[lang]['legend'],
+        line=dict(color='steelblue', width=1), connectgaps=False
+    ))
+    fig.update_layout(showlegend=True, **_base_layout(labels[lang]['xlabel'], value_label))
+
+    return fig, len(y)
+
+
+@timed_stage()
+def plotly_spi(dataset: pd.DataFrame, lang: str = 'pt', n_buckets: int = MAX_BUCKETS):
+    """Interactive (WebGL) version of charts.plot_spi.
+
+    Positive and negative SPI-1 values are drawn as two filled traces over the
+    drought/wet category bands; months excluded by the completeness criterion
+    appear as gaps.
+
+    :param dataset: DataFrame with 'ano civil', 'mes' and 'SPI_1' columns
+    :param lang: 'pt' or 'en'
+    :param n_buckets: Decimation buckets (see decimate_minmax)
+
+    :return: [0] = Plotly figure, [1] = Number of points drawn
+    """
+    labels = {
+        'pt': {
+            'ylabel': 'SPI-1',
+            'xlabel': 'Data',
+            'positive': 'SPI-1 ≥ 0',
+            'negative': 'SPI-1 < 0',
+            'seco_extremo': 'Extremamente seco',
+            'seco_severo': 'Severamente seco',
+            'seco_moderado': 'Moderadamente seco',
+            'umido_moderado': 'Moderadamente úmido',
+            'umido_severo': 'Severamente úmido',
+            'umido_extremo': 'Extremamente úmido',
+        },
+        'en': {
+            'ylabel': 'SPI-1',
+            'xlabel': 'Date',
+            'positive': 'SPI-1 ≥ 0',
+            'negative': 'SPI-1 < 0',
+            'seco_extremo': 'Extremely dry',
+            'seco_severo': 'Severely dry',
+            'seco_moderado': 'Moderately dry',
+            'umido_moderado': 'Moderately wet',
+            'umido_severo': 'Severely wet',
+            'umido_extremo': 'Extremely wet',
+        }
+    }
+
+    df = dataset[['ano civil', 'mes', 'SPI_1']].copy()
+    df['date'] = pd.to_datetime(
+        df['ano civil'].astype(str) + '-' + df['mes'].astype(str) + '-01')
+    df = df.sort_values('date')
+
+    # Complete monthly timeline, so excluded months are gaps (same as plot_spi)
+    if not df.empty:
+        full_monthly_index = pd.date_range(start=df['date'].min(), end=df['date'].max(), freq='MS')
+        df = df.set_index('date').reindex(full_monthly_index).rename_axis('date').reset_index()
+
+    x, y = decimate_minmax(df['date'].to_numpy(), df['SPI_1'].to_numpy(dtype=float), n_buckets)
+
+    fig = go.Figure()
+    for lower, upper, color, key in _SPI_BANDS:
+        fig.add_hrect(y0=lower, y1=upper, fillcolor=color, opacity=0.15, line_width=0,
+                      layer='below', showlegend=True, name=labels[lang][key])
+    fig.add_hline(y=0, line=dict(color='black', width=1, dash='dash'), opacity=0.6)
+
+    for name, values, color in (('positive', np.where(y >= 0, y, 0.0), '#2C7FB8'),
+                                ('negative', np.where(y < 0, y, 0.0), '#D95F0E')):
+        # NaN comparisons are False: keep the gaps as gaps in both traces
+        values = np.where(np.isnan(y), np.nan, values)
+        fig.add_trace(go.Scattergl(
+            x=x, y=values, mode='lines', fill='tozeroy', name=labels[lang][name],
+            line=dict(color=color, width=0.8), connectgaps=False
+        ))
+
+    fig.update_layout(**_base_layout(labels[lang]['xlabel'], labels[lang]['ylabel']))
+    fig.update_yaxes(range=[-4, 4])
+
+    return fig, len(y)
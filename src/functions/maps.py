@@ -0,0 +1,31 @@
+import streamlit as st
+
+from src.functions.catalog import load_station_catalog
+from src.utils.i18n import get_text
+from src.utils.instrumentation import record_cache_miss, timed_stage
+
+
+@timed_stage(cached=True)
+@st.cache_data
+def station_markers(lang: str) -> list[dict]:
+    """Location, tooltip and code of every station marker of the home map.
+
+    :param lang: Language of the tooltips
+
+    :return: [{'location': [lat, lon], 'tooltip': html, 'code': code}, ...]
+    """
+    record_cache_miss()
+    catalog = load_station_catalog()
+    if catalog is None:
+        return []
+    df = catalog.coordinates
+
+    markers = []
+    for row in df.to_dict('records'):
+        markers.append({
+            'location': [row['Latitude'], row['Longitude']],
+            'tooltip': f'<div style="font-size: 16px; white-space: nowrap;"><b>{row.get("Nome", get_text("unknown_station", lang))}</b><br>{get_text("code", lang)}: {row.get("Codigo Estacao", "-")}</div>',
+            'code': row.get('Codigo Estacao'),
+        })
+
+    return markers
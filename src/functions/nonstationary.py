@@ -0,0 +1,275 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.functions.hydrology import gev_lmoments
+from src.utils.cancellation import checkpoint
+from src.utils.instrumentation import timed_stage
+
+
+# Models: name -> (location linear in the year, scale log-linear in the year)
+GEV_MODELS = {
+    'estacionario': (False, False),
+    'mu(t)': (True, False),
+    'sigma(t)': (False, True),
+    'mu(t), sigma(t)': (True, True),
+}
+
+# Bounds of the shape parameter c (SciPy convention) in the likelihood fits: the
+# plausible range of hydrological samples, which keeps short records from running
+# into degenerate shapes
+GEV_SHAPE_BOUNDS = (-0.5, 0.5)
+
+# Below this |c| the likelihood uses c = ±GUMBEL_SHAPE (the Gumbel limit), where the
+# closed-form gradient would lose its precision to cancellation
+GUMBEL_SHAPE = 1e-4
+
+# Negative log-likelihood outside the support: finite, so that the line searches of
+# L-BFGS-B backtrack instead of stopping at the first infeasible step
+INFEASIBLE_NLL = 1e10
+
+# Significance level of the likelihood-ratio tests
+NSGEV_ALPHA = 0.05
+
+# Fewest annual maxima of the batch fits
+NSGEV_MIN_YEARS = 10
+
+NSGEV_COLUMNS = [
+    'Codigo Estacao',
+    'duracao (dias)',
+    'modelo',
+    'n anos',
+    'ano referencia',
+    'mu0 (mm)',
+    'mu1 (mm/ano)',
+    'sigma0 (mm)',
+    'sigma1 (%/ano)',
+    'forma (c)',
+    'log-verossimilhanca',
+    'AIC',
+    'razao de verossimilhanca',
+    'p-valor',
+    'selecionado',
+]
+
+
+def _expand(theta: np.ndarray, model: str) -> tuple[float, float, float, float, float]:
+    """(mu0, mu1, log sigma0, log-sigma slope, c) of a model's free parameters."""
+    trend_mu, trend_sigma = GEV_MODELS[model]
+    values = iter(theta)
+    mu0 = next(values)
+    mu1 = next(values) if trend_mu else 0.0
+    log_sigma0 = next(values)
+    log_sigma1 = next(values) if trend_sigma else 0.0
+
+    return mu0, mu1, log_sigma0, log_sigma1, next(values)
+
+
+def gev_negative_log_likelihood(theta: np.ndarray, x: np.ndarray, t: np.ndarray, model: str) -> tuple[float, np.ndarray]:
+    """Negative log-likelihood of a GEV with time covariates and its analytic gradient.
+
+    mu = mu0 + mu1·t and log sigma = s0 + s1·t; with z = (x - mu)/sigma and
+    y = 1 - c·z (SciPy sign of c), each year contributes
+    log sigma + (1 - 1/c)·log y + y^(1/c).
+
+    :param theta: Free parameters of the model, in the order of _expand
+    :param x: Annual maxima
+    :param t: Centred years
+    :param model: Key of GEV_MODELS
+
+    :return: [0] = Negative log-likelihood (INFEASIBLE_NLL outside the support), [1] = Gradient
+    """
+    mu0, mu1, s0, s1, c = _expand(theta, model)
+    if abs(c) < GUMBEL_SHAPE:
+        c = GUMBEL_SHAPE if c >= 0 else -GUMBEL_SHAPE
+
+    log_sigma = s0 + s1 * t
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        sigma = np.exp(log_sigma)
+        z = (x - mu0 - mu1 * t) / sigma
+        y = 1 - c * z
+        if not np.all(y > 0):
+            return INFEASIBLE_NLL, np.zeros(len(theta))
+
+        w = np.log(y)
+        u = np.exp(w / c)
+        nll = np.sum(log_sigma + (1 - 1 / c) * w + u)
+    if not np.isfinite(nll):
+        return INFEASIBLE_NLL, np.zeros(len(theta))
+
+    # d/dz of each term, then the chain rule to mu, log sigma and c
+    dz = (1 - c - u) / y
+    d_mu = -dz / sigma
+    d_log_sigma = 1 - z * dz
+    d_c = np.sum(w / c ** 2 * (1 - u) - z / (c * y) * (c - 1 + u))
+
+    trend_mu, trend_sigma = GEV_MODELS[model]
+    grad = [d_mu.sum()]
+    if trend_mu:
+        grad.append(np.sum(d_mu * t))
+    grad.append(d_log_sigma.sum())
+    if trend_sigma:
+        grad.append(np.sum(d_log_sigma * t))
+    grad.append(d_c)
+
+    return float(nll), np.array(grad)
+
+
+def _feasible_start(x: np.ndarray) -> np.ndarray:
+    """Stationary L-moment parameters (mu, log sigma, c), with the shape shrunk towards
+    the Gumbel case until every observation lies inside the support."""
+    c, loc, scale = gev_lmoments(x)
+    c = float(np.clip(c, *GEV_SHAPE_BOUNDS))
+    for _ in range(30):
+        if np.all(1 - c * (x - loc) / scale > 0):
+            break
+        c /= 2
+
+    return np.array([loc, np.log(scale), c])
+
+
+def _minimize(x: np.ndarray, t: np.ndarray, model: str, start: np.ndarray):
+    from scipy import optimize
+
+    bounds = [(None, None)] * (len(start) - 1) + [GEV_SHAPE_BOUNDS]
+    return optimize.minimize(gev_negative_log_likelihood, start, args=(x, t, model), jac=True,
+                             method='L-BFGS-B', bounds=bounds)
+
+
+@timed_stage()
+def fit_nonstationary_gev(x: np.ndarray, years: np.ndarray, models: list | None = None) -> pd.DataFrame:
+    """Maximum-likelihood GEV fits with the location and/or scale varying with the year.
+
+    The stationary fit starts from the L-moment estimates and every
+    non-stationary model starts from the stationary optimum with zero trends, so
+    each fit only refines a nearby solution. Each non-stationary model is compared
+    with the stationary one by a likelihood-ratio test (chi-squared with as many
+    degrees of freedom as trend parameters); 'selecionado' marks the smallest AIC.
+
+    :param x: Annual maxima (mm)
+    :param years: Year of every maximum
+    :param models: Keys of GEV_MODELS (default: all; the stationary model is always fitted)
+
+    :return: One row per model with the parameters in the columns of NSGEV_COLUMNS
+             (from 'modelo' on); 'ano referencia' is the year where t = 0
+    :raises ValueError: With fewer than three positive maxima
+    """
+    from scipy import stats
+
+    years = np.asarray(years, dtype=float)
+    x = np.asarray(x, dtype=float)
+    keep = np.isfinite(x) & (x > 0)
+    x, years = x[keep], years[keep]
+
+    reference = float(np.round(years.mean())) if len(years) else 0.0
+    t = years - reference
+    start = _feasible_start(x)
+
+    models = [model for model in GEV_MODELS if models is None or model in models or model == 'estacionario']
+    fits = {'estacionario': _minimize(x, t, 'estacionario', start)}
+    mu, log_sigma, c = fits['estacionario'].x
+    for model in models:
+        if model == 'estacionario':
+            continue
+        checkpoint()
+        trend_mu, trend_sigma = GEV_MODELS[model]
+        warm = [mu] + ([0.0] if trend_mu else []) + [log_sigma] + ([0.0] if trend_sigma else []) + [c]
+        fits[model] = _minimize(x, t, model, np.array(warm))
+
+    rows = []
+    nll0 = fits['estacionario'].fun
+    for model, fit in fits.items():
+        mu0, mu1, s0, s1, shape = _expand(fit.x, model)
+        extra = len(fit.x) - 3
+        nll = fit.fun
+        # Nested models started at the stationary optimum: only rounding makes it negative
+        statistic = max(0.0, 2 * (nll0 - nll))
+        rows.append({
+            'modelo': model,
+            'n anos': len(x),
+            'ano referencia': int(reference),
+            'mu0 (mm)': mu0,
+            'mu1 (mm/ano)': mu1,
+            'sigma0 (mm)': float(np.exp(s0)),
+            'sigma1 (%/ano)': 100 * float(np.expm1(s1)),
+            'forma (c)': shape,
+            'log-verossimilhanca': -nll,
+            'AIC': 2 * nll + 2 * len(fit.x),
+            'razao de verossimilhanca': statistic if extra else np.nan,
+            'p-valor': float(stats.chi2.sf(statistic, extra)) if extra else np.nan,
+        })
+
+    table = pd.DataFrame(rows)
+    table['selecionado'] = table.index == table['AIC'].idxmin()
+
+    return table
+
+
+def effective_return_levels(fit: pd.Series, year: int, tr_list: list) -> pd.DataFrame:
+    """Return levels of a fitted model with its parameters at one year.
+
+    :param fit: Row of fit_nonstationary_gev
+    :param year: Target year (e.g. the end of a design horizon)
+    :param tr_list: Return periods (years)
+
+    :return: 't_r (anos)', '1/Tr' and 'h_max,1 (mm)' as in the stationary table
+    """
+    from scipy import stats
+
+    t = year - fit['ano referencia']
+    loc = fit['mu0 (mm)'] + fit['mu1 (mm/ano)'] * t
+    scale = fit['sigma0 (mm)'] * (1 + fit['sigma1 (%/ano)'] / 100) ** t
+    tr = np.array(tr_list, dtype=float)
+
+    return pd.DataFrame({
+        't_r (anos)': tr_list,
+        '1/Tr': 1 / tr,
+        'h_max,1 (mm)': stats.genextreme.ppf(1 - 1 / tr, fit['forma (c)'], loc=loc, scale=scale),
+    })
+
+
+def _fit_sample(item: tuple) -> pd.DataFrame:
+    code, duration, x, years = item
+    try:
+        table = fit_nonstationary_gev(x, years)
+    except ValueError:
+        return pd.DataFrame(columns=NSGEV_COLUMNS)
+    table.insert(0, 'Codigo Estacao', code)
+    table.insert(1, 'duracao (dias)', duration)
+
+    return table
+
+
+def fit_nonstationary_gev_batch(
+        annual_maxima: pd.DataFrame,
+        max_workers: int | None = None,
+        min_years: int = NSGEV_MIN_YEARS
+    ) -> pd.DataFrame:
+    """fit_nonstationary_gev of every station and duration of the annual maxima, in parallel processes.
+
+    :param annual_maxima: Long-format table of compute_catalog_annual_maxima
+    :param max_workers: Number of processes (None = number of CPUs, 1 = run in this process)
+    :param min_years: Fewest positive maxima of a fitted sample
+
+    :return: One row per station, duration and model (columns of NSGEV_COLUMNS)
+    """
+    items = []
+    for (code, duration), group in annual_maxima.groupby(['Codigo Estacao', 'duracao (dias)'], sort=True):
+        group = group[group['precipitacao máxima anual (mm)'] > 0]
+        if len(group) >= min_years:
+            items.append((code, int(duration),
+                          group['precipitacao máxima anual (mm)'].to_numpy(dtype=float),
+                          group['ano hidrologico'].to_numpy(dtype=float)))
+
+    if max_workers == 1:
+        frames = list(map(_fit_sample, items))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(_fit_sample, items, chunksize=8))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=NSGEV_COLUMNS)
+
+    return pd.concat(frames, ignore_index=True)[NSGEV_COLUMNS]
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.instrumentation import timed_stage
+
+
+# Threshold of the fit: this percentile of the wet days (>= 1 mm) of the station
+POT_THRESHOLD_PERCENTILE = 95
+
+# Exceedances separated by fewer than this many days below the threshold belong
+# to the same storm (run declustering)
+POT_RUN_LENGTH = 2
+
+# Fewest cluster peaks accepted by fit_gpd
+POT_MIN_PEAKS = 10
+
+
+def daily_precipitation(dataset: pd.DataFrame) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """Continuous daily series of a station (NaN for missing or negative values).
+
+    :param dataset: Daily dataset with 'data medicao' and 'precipitacao total diaria (mm)'
+
+    :return: [0] = Dates, [1] = Daily precipitation
+    """
+    dates = pd.to_datetime(dataset['data medicao'], errors='coerce')
+    precipitation = pd.to_numeric(dataset['precipitacao total diaria (mm)'], errors='coerce')
+    known = dates.notna().to_numpy()
+    daily = (precipitation[known].where(precipitation[known] >= 0)
+             .groupby(pd.DatetimeIndex(dates[known]).normalize()).max())
+    if daily.empty:
+        return pd.DatetimeIndex([]), np.array([])
+
+    index = pd.date_range(daily.index.min(), daily.index.max(), freq='D')
+
+    return index, daily.reindex(index).to_numpy(dtype=float)
+
+
+def decluster_runs(values: np.ndarray, threshold: float, run_length: int = POT_RUN_LENGTH) -> tuple[np.ndarray, np.ndarray]:
+    """Run declustering: one peak per cluster of exceedances.
+
+    A cluster ends when at least run_length consecutive days are not above the
+    threshold (missing days count as not above).
+
+    :param values: Daily precipitation
+    :param threshold: Threshold (mm)
+    :param run_length: Days below the threshold that separate two clusters
+
+    :return: [0] = Row of every cluster peak, [1] = Peak values
+    """
+    above = np.flatnonzero(np.nan_to_num(values, nan=-np.inf) > threshold)
+    if len(above) == 0:
+        return np.array([], dtype=int), np.array([])
+
+    # A gap of run_length non-exceedances means rows further apart than run_length
+    starts = np.flatnonzero(np.r_[True, np.diff(above) > run_length])
+    peaks = np.maximum.reduceat(values[above], starts)
+
+    # Row of the maximum of each cluster: the largest exceedance wins, the first on ties
+    cluster = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(above)]))
+    order = np.lexsort((above, -values[above], cluster))
+    first = np.r_[True, cluster[order][1:] != cluster[order][:-1]]
+
+    return above[order][first], peaks
+
+
+def threshold_sweep(values: np.ndarray, thresholds: np.ndarray) -> pd.DataFrame:
+    """Threshold-selection diagnostics for every threshold of a sweep, computed at once.
+
+    For each threshold u: the mean residual life (mean excess over u, with a 95 %
+    confidence interval), and the GPD shape and modified scale (sigma - xi·u)
+    estimated by probability-weighted moments (Hosking and Wallis, 1987). Above a
+    suitable threshold the mean excess is linear in u and the shape and modified
+    scale are stable. All thresholds come from suffix sums over the sorted sample,
+    with no loop over thresholds.
+
+    :param values: Daily precipitation (NaN ignored)
+    :param thresholds: Candidate thresholds (mm)
+
+    :return: One row per threshold
+    """
+    x = np.sort(values[~np.isnan(values)])
+    u = np.asarray(thresholds, dtype=float)
+    n_total = len(x)
+
+    # Exceedances of u are the top n of the sorted sample, ranks k = n_total - n + 1 .. n_total
+    n = n_total - np.searchsorted(x, u, side='right')
+    k = np.arange(1, n_total + 1, dtype=float)
+
+    def suffix(a: np.ndarray) -> np.ndarray:
+        return np.r_[np.cumsum(a[::-1])[::-1], 0.0][n_total - n]
+
+    sum_x = suffix(x)
+    sum_x2 = suffix(x ** 2)
+    sum_kx = suffix(k * x)
+    sum_k = suffix(k)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_excess = sum_x / n - u
+        var_excess = (sum_x2 - n * (sum_x / n) ** 2) / (n - 1)
+        half_width = 1.96 * np.sqrt(var_excess / n)
+
+        # PWM: a0 = mean(y), a1 = mean(y·(1 - p)), p = (i - 0.35)/n with i the rank among
+        # the exceedances (i = k - n_total + n) and y = x - u
+        c = 1 + (n_total - n + 0.35) / n
+        a0 = mean_excess
+        a1 = (c * (sum_x - n * u) - (sum_kx - u * sum_k) / n) / n
+        shape = 2 - a0 / (a0 - 2 * a1)
+        scale = 2 * a0 * a1 / (a0 - 2 * a1)
+
+    valid = n >= 2
+    return pd.DataFrame({
+        'limiar (mm)': u,
+        'excedencias': n,
+        'excesso medio (mm)': np.where(n > 0, mean_excess, np.nan),
+        'excesso medio inferior (mm)': np.where(valid, mean_excess - half_width, np.nan),
+        'excesso medio superior (mm)': np.where(valid, mean_excess + half_width, np.nan),
+        'forma (xi)': np.where(valid, shape, np.nan),
+        'escala modificada (mm)': np.where(valid, scale - shape * u, np.nan),
+    })
+
+
+def gpd_pwm(excesses: np.ndarray) -> tuple[float, float]:
+    """GPD shape and scale of threshold excesses by probability-weighted moments."""
+    sweep = threshold_sweep(excesses, np.array([0.0]))
+
+    shape = float(sweep['forma (xi)'].iloc[0])
+    return shape, float(sweep['escala modificada (mm)'].iloc[0])
+
+
+@timed_stage()
+def fit_gpd(peaks: np.ndarray, threshold: float) -> tuple[float, float, float]:
+    """Maximum-likelihood GPD fit of the cluster peaks above the threshold.
+
+    The likelihood is maximized from the probability-weighted-moment estimates, with
+    the location fixed at the threshold.
+
+    :return: [0] = Shape (c, SciPy convention), [1] = Location (the threshold), [2] = Scale
+    :raises ValueError: With fewer than POT_MIN_PEAKS peaks
+    """
+    from scipy import stats
+
+    excesses = np.asarray(peaks, dtype=float) - threshold
+    excesses = excesses[excesses > 0]
+    if len(excesses) < POT_MIN_PEAKS:
+        raise ValueError(
+            "Insufficient peaks over threshold "
+            "for generalized Pareto fitting."
+        )
+
+    shape0, scale0 = gpd_pwm(excesses)
+    if not np.isfinite(shape0) or not np.isfinite(scale0) or scale0 <= 0:
+        shape0, scale0 = 0.0, float(excesses.mean())
+    shape, _, scale = stats.genpareto.fit(excesses, shape0, floc=0, scale=scale0)
+
+    return float(shape), float(threshold), float(scale)
+
+
+def gpd_return_levels(params: tuple, rate: float, tr_list: list) -> pd.DataFrame:
+    """Return levels of a POT model, on the return periods of the annual maxima.
+
+    With rate peaks per year following the GPD, the annual maximum has the
+    distribution exp(-rate·(1 - F(x))). The level of return period Tr is then the
+    GPD quantile of exceedance probability -ln(1 - 1/Tr)/rate, directly comparable
+    with the GEV 'h_max,1 (mm)' table.
+
+    :param params: (shape, location, scale) of fit_gpd
+    :param rate: Mean number of cluster peaks per year
+    :param tr_list: Return periods (years)
+
+    :return: 't_r (anos)', '1/Tr' and 'h_max,1 (mm)'
+    """
+    from scipy import stats
+
+    tr = np.array(tr_list, dtype=float)
+    exceedance = np.minimum(-np.log1p(-1 / tr) / rate, 1.0)
+
+    return pd.DataFrame({
+        't_r (anos)': tr_list,
+        '1/Tr': 1 / tr,
+        'h_max,1 (mm)': stats.genpareto.isf(exceedance, *params),
+    })
+
+
+@timed_stage()
+def compute_pot_analysis(
+        dataset: pd.DataFrame,
+        tr_list: list,
+        threshold: float | None = None,
+        run_length: int = POT_RUN_LENGTH,
+        n_thresholds: int = 40
+    ) -> dict:
+    """Peaks-over-threshold analysis of the daily precipitation of one station.
+
+    :param dataset: Daily dataset with 'data medicao' and 'precipitacao total diaria (mm)'
+                    (prepare_extreme_dataset output: incomplete months are kept)
+    :param tr_list: Return periods (years) of the return-level table
+    :param threshold: Threshold (mm); default: POT_THRESHOLD_PERCENTILE of the wet days
+    :param run_length: Declustering run length (days)
+    :param n_thresholds: Thresholds of the diagnostic sweep, from the 80th to the
+                         99.5th percentile of the wet days
+
+    :return: 'threshold', 'sweep' (threshold_sweep), 'peaks' (date and value of every
+             cluster peak), 'rate' (peaks per year), 'years' (years of valid data),
+             'params' (fit_gpd) and 'df_hmax' (gpd_return_levels)
+    :raises ValueError: Without wet days or with too few peaks
+    """
+    dates, values = daily_precipitation(dataset)
+    wet = values[values >= 1]
+    if len(wet) == 0:
+        raise ValueError("No wet days for the peaks-over-threshold analysis.")
+
+    if threshold is None:
+        threshold = float(np.percentile(wet, POT_THRESHOLD_PERCENTILE))
+    sweep = threshold_sweep(values, np.percentile(wet, np.linspace(80, 99.5, n_thresholds)))
+
+    rows, peaks = decluster_runs(values, threshold, run_length)
+    years = np.count_nonzero(~np.isnan(values)) / 365.25
+    rate = len(peaks) / years
+
+    params = fit_gpd(peaks, threshold)
+
+    return {
+        'threshold': threshold,
+        'sweep': sweep,
+        'peaks': pd.DataFrame({'data medicao': dates[rows], 'precipitacao total diaria (mm)': peaks}),
+        'rate': rate,
+        'years': years,
+        'params': params,
+        'df_hmax': gpd_return_levels(params, rate, tr_list),
+    }
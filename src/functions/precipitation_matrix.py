@@ -0,0 +1,266 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.utils.instrumentation import timed_stage
+
+
+PRECIPITATION_COLUMN = 'PRECIPITACAO TOTAL, DIARIO (AUT)(mm)'
+DATE_COLUMN = 'Data Medicao'
+
+# Directory layout: index.json (dates, station columns, source signatures),
+# values.f4 (float32, days x stations, row-major) and valid.bits (validity bitmap,
+# days x ceil(stations / 8) bytes, np.packbits order along the stations)
+INDEX_FILE = 'index.json'
+VALUES_FILE = 'values.f4'
+VALID_FILE = 'valid.bits'
+
+# Rows are allocated up to the end of the year after the last observation, so the
+# daily appends of the ingest update the matrix in place
+PADDING_YEARS = 1
+
+
+def station_files(data_dir: str) -> dict:
+    """Map each station code to its dados_*.parquet file in data_dir."""
+    return {os.path.basename(path_file).split('_')[1]: path_file
+            for path_file in sorted(glob.glob(os.path.join(data_dir, 'dados_*.parquet')))}
+
+
+def file_signature(path_file: str) -> list:
+    stat = os.stat(path_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_station_series(path_file: str) -> pd.Series:
+    """Daily precipitation of a store file indexed by date (NaN for missing days)."""
+    df = pd.read_parquet(path_file, columns=[DATE_COLUMN, PRECIPITATION_COLUMN])
+    dates = pd.to_datetime(df[DATE_COLUMN], errors='coerce')
+    series = pd.Series(df[PRECIPITATION_COLUMN].to_numpy(dtype=float), index=dates)
+
+    return series[series.index.notna()].groupby(level=0).last()
+
+
+def _set_column(values: np.ndarray, valid_bytes: np.ndarray, column: int, row0: int, column_values: np.ndarray):
+    """Write one station column (NaN = invalid) starting at row0; the other rows are cleared."""
+    values[:, column] = np.nan
+    values[row0:row0 + len(column_values), column] = column_values
+
+    mask = np.uint8(1 << (7 - column % 8))
+    bit = (~np.isnan(values[:, column])).astype(np.uint8) * mask
+    valid_bytes[:, column // 8] = (valid_bytes[:, column // 8] & ~mask) | bit
+
+
+def _allocated_rows(start: pd.Timestamp, last: pd.Timestamp) -> int:
+    end = pd.Timestamp(year=last.year + PADDING_YEARS, month=12, day=31)
+    return (end - start).days + 1
+
+
+@timed_stage()
+def build_precipitation_matrix(data_dir: str, out_dir: str) -> dict:
+    """Rebuild the whole matrix from the station files of data_dir.
+
+    The files are written in a temporary directory that then replaces out_dir.
+
+    :return: The index (see INDEX_FILE)
+    """
+    files = station_files(data_dir)
+    series = {code: read_station_series(path_file) for code, path_file in files.items()}
+    series = {code: s for code, s in series.items() if not s.empty}
+    codes = sorted(series)
+
+    start = min(s.index.min() for s in series.values())
+    last = max(s.index.max() for s in series.values())
+    n_days = _allocated_rows(start, last)
+
+    tmp_dir = out_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    values = np.memmap(os.path.join(tmp_dir, VALUES_FILE), dtype='<f4', mode='w+',
+                       shape=(n_days, len(codes)))
+    values[:] = np.nan
+    valid_bytes = np.zeros((n_days, (len(codes) + 7) // 8), dtype=np.uint8)
+    for column, code in enumerate(codes):
+        s = series[code]
+        row0 = (s.index.min() - start).days
+        full = s.reindex(pd.date_range(s.index.min(), s.index.max(), freq='D'))
+        values[row0:row0 + len(full), column] = full.to_numpy(dtype=np.float32)
+    valid_bytes[:] = np.packbits(~np.isnan(values), axis=1)
+    values.flush()
+    del values
+    valid_bytes.tofile(os.path.join(tmp_dir, VALID_FILE))
+
+    index = {
+        'start': start.strftime('%Y-%m-%d'),
+        'n_days': n_days,
+        'last': last.strftime('%Y-%m-%d'),
+        'stations': codes,
+        'sources': {code: [os.path.basename(files[code])] + file_signature(files[code]) for code in codes},
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+
+    return index
+
+
+@timed_stage()
+def update_precipitation_matrix(data_dir: str, out_dir: str) -> tuple[dict, list]:
+    """Bring the matrix up to date with the station files, rebuilding as little as possible.
+
+    Only the columns of the stations whose file changed (size or modification time)
+    are rewritten, in place. The matrix is rebuilt from scratch when it does not exist,
+    when stations were added or removed, or when a changed file has dates outside
+    the allocated rows.
+
+    :return: [0] = Index, [1] = Codes of the rewritten stations (all of them after a rebuild)
+    """
+    index_path = os.path.join(out_dir, INDEX_FILE)
+    files = station_files(data_dir)
+    if not os.path.exists(index_path):
+        index = build_precipitation_matrix(data_dir, out_dir)
+        return index, index['stations']
+
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+
+    changed = [code for code, path_file in files.items()
+               if index['sources'].get(code) != [os.path.basename(path_file)] + file_signature(path_file)]
+    if set(files) != set(index['sources']):
+        index = build_precipitation_matrix(data_dir, out_dir)
+        return index, index['stations']
+    if not changed:
+        return index, []
+
+    start = pd.Timestamp(index['start'])
+    n_days = index['n_days']
+    columns = {code: i for i, code in enumerate(index['stations'])}
+    series = {code: read_station_series(files[code]) for code in changed}
+    for s in series.values():
+        if not s.empty and (s.index.min() < start or (s.index.max() - start).days >= n_days):
+            index = build_precipitation_matrix(data_dir, out_dir)
+            return index, index['stations']
+
+    values = np.memmap(os.path.join(out_dir, VALUES_FILE), dtype='<f4', mode='r+',
+                       shape=(n_days, len(columns)))
+    valid_bytes = np.memmap(os.path.join(out_dir, VALID_FILE), dtype=np.uint8, mode='r+',
+                            shape=(n_days, (len(columns) + 7) // 8))
+    last = pd.Timestamp(index['last'])
+    for code, s in series.items():
+        if s.empty:
+            _set_column(values, valid_bytes, columns[code], 0, np.empty(0, dtype=np.float32))
+            continue
+        full = s.reindex(pd.date_range(s.index.min(), s.index.max(), freq='D'))
+        _set_column(values, valid_bytes, columns[code], (s.index.min() - start).days,
+                    full.to_numpy(dtype=np.float32))
+        last = max(last, s.index.max())
+    values.flush()
+    valid_bytes.flush()
+
+    index['last'] = last.strftime('%Y-%m-%d')
+    for code in changed:
+        index['sources'][code] = [os.path.basename(files[code])] + file_signature(files[code])
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+    return index, changed
+
+
+class PrecipitationMatrix:
+    """Memory-mapped days x stations matrix written by build_precipitation_matrix.
+
+    Rows are consecutive days from self.start, columns the station codes in
+    self.codes. Missing days are NaN in the values and 0 in the validity bitmap.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+        self.directory = directory
+        self.start = pd.Timestamp(index['start'])
+        self.last = pd.Timestamp(index['last'])
+        self.n_days = index['n_days']
+        self.codes = list(index['stations'])
+        self._columns = {code: i for i, code in enumerate(self.codes)}
+        self.values = np.memmap(os.path.join(directory, VALUES_FILE), dtype='<f4', mode='r',
+                                shape=(self.n_days, len(self.codes)))
+        self.valid_bytes = np.memmap(os.path.join(directory, VALID_FILE), dtype=np.uint8, mode='r',
+                                     shape=(self.n_days, (len(self.codes) + 7) // 8))
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        """Dates of the observed rows (self.start to self.last)."""
+        return pd.date_range(self.start, self.last, freq='D')
+
+    def rows(self, start=None, end=None) -> slice:
+        """Row slice of the dates between start and end (inclusive, clipped to the data)."""
+        first = 0 if start is None else max(0, (pd.Timestamp(start) - self.start).days)
+        stop = (self.last - self.start).days + 1
+        if end is not None:
+            stop = min(stop, (pd.Timestamp(end) - self.start).days + 1)
+
+        return slice(first, max(first, stop))
+
+    def columns(self, codes=None) -> np.ndarray:
+        """Column positions of the station codes (all stations when None; unknown codes are skipped)."""
+        if codes is None:
+            return np.arange(len(self.codes))
+
+        return np.array([self._columns[code] for code in codes if code in self._columns], dtype=int)
+
+    def query(self, start=None, end=None, codes=None) -> tuple[np.ndarray, np.ndarray]:
+        """Values and validity of a date range and station subset.
+
+        :return: [0] = float32 values (days, stations), [1] = Boolean validity of the same shape
+        """
+        rows = self.rows(start, end)
+        cols = self.columns(codes)
+        values = np.asarray(self.values[rows])
+        valid = np.unpackbits(self.valid_bytes[rows], axis=1, count=len(self.codes)).astype(bool)
+        if codes is not None:
+            values = values[:, cols]
+            valid = valid[:, cols]
+
+        return values, valid
+
+    def frame(self, start=None, end=None, codes=None) -> pd.DataFrame:
+        """Date-indexed table of the query, one column per station."""
+        values, _ = self.query(start, end, codes)
+        rows = self.rows(start, end)
+
+        return pd.DataFrame(
+            values,
+            index=pd.date_range(self.start + pd.Timedelta(days=rows.start), periods=len(values), freq='D'),
+            columns=[self.codes[i] for i in self.columns(codes)]
+        )
+
+    def exceedances(self, date, threshold_mm: float) -> pd.Series:
+        """Stations whose precipitation on date exceeded threshold_mm (mm, sorted descending)."""
+        row = (pd.Timestamp(date) - self.start).days
+        if not 0 <= row < self.n_days:
+            return pd.Series(dtype=float, name=PRECIPITATION_COLUMN)
+
+        day = np.asarray(self.values[row])
+        hits = np.flatnonzero(day > threshold_mm)
+
+        return pd.Series(day[hits].astype(float), index=[self.codes[i] for i in hits],
+                         name=PRECIPITATION_COLUMN).sort_values(ascending=False)
+
+    def daily_totals(self, start=None, end=None, codes=None) -> pd.DataFrame:
+        """Sum of the valid observations and number of reporting stations of every day."""
+        values, valid = self.query(start, end, codes)
+        rows = self.rows(start, end)
+
+        return pd.DataFrame({
+            'precipitacao total (mm)': np.where(valid, values, 0.0).sum(axis=1, dtype=np.float64),
+            'estacoes com dados': valid.sum(axis=1),
+        }, index=pd.date_range(self.start + pd.Timedelta(days=rows.start), periods=len(values), freq='D'))
@@ -0,0 +1,190 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.utils.instrumentation import timed_stage
+
+
+# Accumulation scales (months) of the cube
+SPI_SCALES = (1, 3, 6, 12)
+
+# SPI categories: (upper bound, colour, label key), in increasing order;
+# the bands of the SPI charts plus the near-normal class in between
+SPI_CATEGORIES = [
+    (-2.0, '#A50026', 'seco_extremo'),
+    (-1.5, '#D73027', 'seco_severo'),
+    (-1.0, '#FC8D59', 'seco_moderado'),
+    (1.0, '#D9D9D9', 'normal'),
+    (1.5, '#91BFDB', 'umido_moderado'),
+    (2.0, '#4575B4', 'umido_severo'),
+    (np.inf, '#313695', 'umido_extremo'),
+]
+
+
+def monthly_totals(values: np.ndarray, valid: np.ndarray, start: pd.Timestamp) -> tuple[pd.PeriodIndex, np.ndarray]:
+    """Monthly precipitation of every station from a days x stations matrix.
+
+    Same completeness rule as clean_dataset: a month counts only when every one of
+    its days has a non-negative observation; otherwise it is NaN.
+
+    :param values: Daily precipitation (days, stations), NaN when missing
+    :param valid: Validity of the same shape
+    :param start: Date of the first row
+
+    :return: [0] = Months, [1] = Monthly totals (months, stations)
+    """
+    dates = pd.date_range(start, periods=len(values), freq='D')
+    months = dates.to_period('M')
+    month_starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+
+    observed = valid & (values >= 0)
+    totals = np.add.reduceat(np.where(observed, values, 0.0).astype(np.float64), month_starts, axis=0)
+    observed_days = np.add.reduceat(observed.astype(np.int32), month_starts, axis=0)
+
+    unique_months = months[month_starts]
+    days_in_month = unique_months.days_in_month.to_numpy()[:, None]
+    totals[observed_days != days_in_month] = np.nan
+
+    return unique_months, totals
+
+
+def accumulate(totals: np.ndarray, scale: int) -> np.ndarray:
+    """Sum of the scale months ending at each month (NaN if any of them is missing)."""
+    if scale == 1:
+        return totals.copy()
+
+    padded = np.vstack([np.full((scale - 1, totals.shape[1]), np.nan), totals])
+    cumulative = np.vstack([np.zeros((1, totals.shape[1])), np.cumsum(np.nan_to_num(padded), axis=0)])
+    missing = np.vstack([np.zeros((1, totals.shape[1]), dtype=int), np.cumsum(np.isnan(padded), axis=0)])
+
+    sums = cumulative[scale:] - cumulative[:-scale]
+    sums[(missing[scale:] - missing[:-scale]) > 0] = np.nan
+
+    return sums
+
+
+def gamma_shape_mle(mean: np.ndarray, mean_log: np.ndarray, iterations: int = 20) -> np.ndarray:
+    """Maximum-likelihood shape of gamma samples (location 0), vectorized.
+
+    Solves log(a) - digamma(a) = log(mean) - mean(log x) by Newton iterations
+    started from Thom's approximation; this is the fit of stats.gamma.fit(x, floc=0).
+    """
+    from scipy import special
+
+    A = np.log(mean) - mean_log
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = (1 + np.sqrt(1 + 4 * A / 3)) / (4 * A)
+        for _ in range(iterations):
+            f = np.log(a) - special.digamma(a) - A
+            a = a - f / (1 / a - special.polygamma(1, a))
+            a = np.where(a > 0, a, np.nan)
+
+    return np.where(A > 0, a, np.nan)
+
+
+def spi_from_totals(totals: np.ndarray, calendar_months: np.ndarray) -> np.ndarray:
+    """SPI of accumulated totals, fitted separately for each station and calendar month.
+
+    Same method as compute_spi: gamma fitted to the positive totals, mixed with the
+    probability of zero, then mapped to the standard normal. Station-months with
+    fewer than two positive totals are NaN.
+
+    :param totals: Accumulated precipitation (months, stations)
+    :param calendar_months: Calendar month (1-12) of every row
+
+    :return: SPI (months, stations)
+    """
+    from scipy import special
+
+    spi = np.full(totals.shape, np.nan)
+    for month in range(1, 13):
+        rows = calendar_months == month
+        x = totals[rows]
+        present = ~np.isnan(x)
+        positive = present & (x > 0)
+        n_present = present.sum(axis=0)
+        n_positive = positive.sum(axis=0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(positive, x, 0.0).sum(axis=0) / n_positive
+            mean_log = np.where(positive, np.log(np.where(positive, x, 1.0)), 0.0).sum(axis=0) / n_positive
+            shape = gamma_shape_mle(mean, mean_log)
+            scale = mean / shape
+            q = (n_present - n_positive) / n_present
+
+            cdf = special.gammainc(shape, np.where(present, x, 0.0) / scale)
+            cdf_adj = np.clip(q + (1 - q) * cdf, 1e-6, 1 - 1e-6)
+            values = special.ndtri(cdf_adj)
+
+        values[~present | (n_positive < 2)[None, :] | np.isnan(shape)[None, :]] = np.nan
+        spi[rows] = values
+
+    return spi
+
+
+@timed_stage()
+def build_spi_cube(matrix, scales: tuple = SPI_SCALES) -> dict:
+    """SPI of every station, month and accumulation scale from the precipitation matrix.
+
+    :param matrix: PrecipitationMatrix
+    :param scales: Accumulation scales (months)
+
+    :return: {'spi': float32 (scales, months, stations), 'scales', 'months' ('YYYY-MM'), 'stations'}
+    """
+    values, valid = matrix.query()
+    months, totals = monthly_totals(values, valid, matrix.start)
+    calendar_months = months.month.to_numpy()
+
+    cube = np.stack([spi_from_totals(accumulate(totals, scale), calendar_months) for scale in scales])
+
+    return {
+        'spi': cube.astype(np.float32),
+        'scales': np.array(scales, dtype=np.int16),
+        'months': months.strftime('%Y-%m').to_numpy(dtype=str),
+        'stations': np.array(matrix.codes, dtype=str),
+    }
+
+
+def write_spi_cube(cube: dict, path_file: str):
+    """Write the cube as an .npz archive through a temporary file."""
+    tmp_path = path_file + '.tmp.npz'
+    np.savez_compressed(tmp_path, **cube)
+    os.replace(tmp_path, path_file)
+
+
+def spi_category(values: np.ndarray) -> np.ndarray:
+    """Index in SPI_CATEGORIES of every SPI value (-1 for NaN)."""
+    bounds = np.array([upper for upper, _, _ in SPI_CATEGORIES[:-1]])
+    categories = np.searchsorted(bounds, values, side='left')
+
+    return np.where(np.isnan(values), -1, categories)
+
+
+class SPICube:
+    """Station x month SPI cube written by write_spi_cube, held in memory."""
+
+    def __init__(self, path_file: str):
+        with np.load(path_file) as archive:
+            self.spi = archive['spi']
+            self.scales = archive['scales'].astype(int).tolist()
+            self.months = archive['months'].tolist()
+            self.codes = archive['stations'].tolist()
+        self._months = {month: i for i, month in enumerate(self.months)}
+
+    def snapshot(self, month: str, scale: int) -> pd.Series:
+        """SPI of every station for one month ('YYYY-MM') and scale: a slice of the cube."""
+        values = self.spi[self.scales.index(scale), self._months[month]]
+
+        return pd.Series(values, index=self.codes, name=f'SPI_{scale}')
+
+    def coverage(self, scale: int) -> np.ndarray:
+        """Number of stations with an SPI value in every month."""
+        return (~np.isnan(self.spi[self.scales.index(scale)])).sum(axis=1)
+
+    def latest_month(self, scale: int, min_fraction: float = 0.5) -> str:
+        """Last month covered by at least min_fraction of the stations of the best-covered month."""
+        coverage = self.coverage(scale)
+        covered = np.flatnonzero(coverage >= min_fraction * coverage.max())
+
+        return self.months[covered[-1]] if len(covered) else self.months[-1]
@@ -1,7 +1,20 @@
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import scipy as sc
 import pandas as pd
 
+from src.utils.cancellation import checkpoint
+from src.utils.instrumentation import timed_stage
+
+
+# Candidate distributions (SciPy name -> display name) compared by the KS criterion
+DISTRIBUTION_CANDIDATES = {
+    'genextreme': 'Generalized Extreme Value (GEV)',
+    'gumbel_r': 'Gumbel',
+    'lognorm': 'Log-Normal',
+    'pearson3': 'Pearson Type III',
+}
+
 
 def compute_cdf(x: list) -> tuple[list, list]:
     """Compute Cumulative Distribution Function (CDF) from a list of values.
@@ -17,6 +30,52 @@ def compute_cdf(x: list) -> tuple[list, list]:
     return list(x_sorted), list(x_cdf)
 
 
+def ks_statistic(cdf_values: np.ndarray) -> np.ndarray:
+    """Two-sided Kolmogorov-Smirnov statistic from CDF values of a sorted sample.
+
+    Equivalent to scipy.stats.kstest(x, dist).statistic, but computed for several
+    candidate distributions at once: each row of cdf_values holds F(x_(1)), ..., F(x_(n))
+    of one candidate evaluated at the sorted sample.
+
+    :param cdf_values: Array (..., n) of fitted CDF values at the sorted sample
+
+    :return: KS statistic of each row
+    """
+    n = cdf_values.shape[-1]
+    i = np.arange(1, n + 1)
+    d_plus = np.max(i / n - cdf_values, axis=-1)
+    d_minus = np.max(cdf_values - (i - 1) / n, axis=-1)
+
+    return np.maximum(d_plus, d_minus)
+
+
+def fit_candidate_distributions(x: np.ndarray) -> tuple[list, np.ndarray]:
+    """Fit the candidate distributions by maximum likelihood and compute their KS statistics.
+
+    :param x: Positive annual maximum precipitation values
+
+    :return: [0] = Fitted parameters of each candidate (DISTRIBUTION_CANDIDATES order), [1] = KS statistics
+    """
+    from scipy import stats
+
+    x_sorted = np.sort(x)
+    params_list = []
+    cdf_values = np.empty((len(DISTRIBUTION_CANDIDATES), len(x_sorted)))
+
+    for i, dist in enumerate(DISTRIBUTION_CANDIDATES):
+        checkpoint()
+        dist_obj = getattr(stats, dist)
+        if dist == 'lognorm':
+            params = dist_obj.fit(x_sorted, floc=0)
+        else:
+            params = dist_obj.fit(x_sorted)
+        params_list.append(params)
+        cdf_values[i] = dist_obj.cdf(x_sorted, *params)
+
+    return params_list, ks_statistic(cdf_values)
+
+
+@timed_stage()
 def verify_probability_distribuition(dataset: pd.DataFrame):
     """
     Fit candidate probability distributions to the annual maximum
@@ -43,20 +102,6 @@ def verify_probability_distribuition(dataset: pd.DataFrame):
         SciPy name of the selected distribution.
     """
 
-    distribution_list = [
-        'genextreme',
-        'gumbel_r',
-        'lognorm',
-        'pearson3'
-    ]
-
-    results = {
-        "Tipo de Distribuição": [],
-        "Nome Scipy": [],
-        "Parâmetros": [],
-        "Estatística KS": []
-    }
-
     data = dataset[
         'precipitacao máxima anual (mm)'
     ].dropna().values
@@ -69,58 +114,14 @@ def verify_probability_distribuition(dataset: pd.DataFrame):
             "for probability distribution fitting."
         )
 
-    for dist in distribution_list:
-
-        if dist == 'genextreme':
-            dist_name = 'Generalized Extreme Value (GEV)'
-            dist_obj = sc.stats.genextreme
-            params = dist_obj.fit(x)
-
-        elif dist == 'gumbel_r':
-            dist_name = 'Gumbel'
-            dist_obj = sc.stats.gumbel_r
-            params = dist_obj.fit(x)
-
-        elif dist == 'lognorm':
-            dist_name = 'Log-Normal'
-            dist_obj = sc.stats.lognorm
-
-            params = dist_obj.fit(
-                x,
-                floc=0
-            )
-
-        elif dist == 'pearson3':
-            dist_name = 'Pearson Type III'
-            dist_obj = sc.stats.pearson3
-            params = dist_obj.fit(x)
-
-        else:
-            continue
-
-        ks_stat = sc.stats.kstest(
-            x,
-            dist,
-            args=params
-        ).statistic
+    params_list, ks_stats = fit_candidate_distributions(x)
 
-        results[
-            "Tipo de Distribuição"
-        ].append(dist_name)
-
-        results[
-            "Nome Scipy"
-        ].append(dist)
-
-        results[
-            "Parâmetros"
-        ].append(params)
-
-        results[
-            "Estatística KS"
-        ].append(ks_stat)
-
-    results_df = pd.DataFrame(results)
+    results_df = pd.DataFrame({
+        "Tipo de Distribuição": list(DISTRIBUTION_CANDIDATES.values()),
+        "Nome Scipy": list(DISTRIBUTION_CANDIDATES.keys()),
+        "Parâmetros": params_list,
+        "Estatística KS": ks_stats
+    })
 
     results_df = results_df.sort_values(
         by="Estatística KS",
@@ -132,3 +133,74 @@ def verify_probability_distribuition(dataset: pd.DataFrame):
         results_df.loc[0, "Parâmetros"],
         results_df.loc[0, "Nome Scipy"]
     )
+
+
+def _fit_station(item: tuple) -> list:
+    code, duration, x = item
+    x = x[x > 0]
+    if len(x) < 2:
+        return []
+
+    params_list, ks_stats = fit_candidate_distributions(x)
+    ranks = np.argsort(np.argsort(ks_stats, kind='stable'), kind='stable') + 1
+
+    rows = []
+    for (dist, dist_name), params, ks_stat, rank in zip(
+            DISTRIBUTION_CANDIDATES.items(), params_list, ks_stats, ranks):
+        padded = list(params) + [np.nan] * (3 - len(params))
+        rows.append({
+            'Codigo Estacao': code,
+            'duracao (dias)': duration,
+            'Tipo de Distribuição': dist_name,
+            'Nome Scipy': dist,
+            'Estatística KS': float(ks_stat),
+            'parametro 1': float(padded[0]),
+            'parametro 2': float(padded[1]),
+            'parametro 3': float(padded[2]),
+            'n anos': len(x),
+            'posicao': int(rank),
+            'selecionada': bool(rank == 1),
+        })
+
+    return rows
+
+
+def verify_probability_distribuition_batch(
+        annual_maxima: pd.DataFrame,
+        max_workers: int | None = None
+    ) -> pd.DataFrame:
+    """Fit every candidate distribution to the annual maxima of all stations.
+
+    Stations are fitted in parallel processes; within a station the KS statistics of
+    all candidates are computed at once from the sorted sample (see ks_statistic).
+    With a 'duracao (dias)' column, every duration of a station is a separate sample
+    with its own selected distribution. Samples with fewer than two positive maxima
+    are skipped.
+
+    :param annual_maxima: Long-format table with 'Codigo Estacao', 'precipitacao máxima anual (mm)'
+                          and optionally 'duracao (dias)'
+    :param max_workers: Number of processes (None = number of CPUs, 1 = run in this process)
+
+    :return: One row per station, duration and candidate with the KS statistic, the
+             parameters ('parametro 1..3', in SciPy order), the rank and the 'selecionada' flag
+    """
+    by_duration = 'duracao (dias)' in annual_maxima.columns
+    keys = ['Codigo Estacao', 'duracao (dias)'] if by_duration else ['Codigo Estacao']
+    items = [
+        (key[0], int(key[1]) if by_duration else 1,
+         group['precipitacao máxima anual (mm)'].dropna().to_numpy(dtype=float))
+        for key, group in annual_maxima.groupby(keys, sort=True)
+    ]
+
+    if max_workers == 1:
+        fitted = map(_fit_station, items)
+        rows = [row for station_rows in fitted for row in station_rows]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            fitted = executor.map(_fit_station, items, chunksize=8)
+            rows = [row for station_rows in fitted for row in station_rows]
+
+    return pd.DataFrame(rows, columns=[
+        'Codigo Estacao', 'duracao (dias)', 'Tipo de Distribuição', 'Nome Scipy', 'Estatística KS',
+        'parametro 1', 'parametro 2', 'parametro 3', 'n anos', 'posicao', 'selecionada'
+    ])
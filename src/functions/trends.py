@@ -0,0 +1,353 @@
+import warnings
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+from src.utils.instrumentation import timed_stage
+
+
+# Series shorter than this (years) are not tested
+MIN_TREND_YEARS = 10
+
+# Significance level of the 'tendencia' and 'mudanca' columns
+TREND_ALPHA = 0.05
+
+# Stations per array block of the pairwise kernel (bounds its memory)
+TREND_BLOCK = 64
+
+# Simulated series per length for the SNHT p-values
+SNHT_SIMULATIONS = 2000
+
+# Tests of the map, with the suffix of their 'p-valor' and 'mudanca' columns
+TREND_TESTS = {'mk': 'MK', 'pettitt': 'Pettitt', 'snht': 'SNHT'}
+
+# Map classes of the station markers: (key, colour); a change point is significant
+# when the test's p-value is below TREND_ALPHA
+TREND_CLASSES = [
+    ('aumento', '#2166AC'),
+    ('reducao', '#B2182B'),
+    ('mudanca', '#762A83'),
+    ('sem tendencia', '#D9D9D9'),
+]
+
+TREND_COLUMNS = [
+    'Codigo Estacao',
+    'serie',
+    'n',
+    'inicio',
+    'fim',
+    'S',
+    'tau de Kendall',
+    'Z',
+    'p-valor MK',
+    'declividade de Sen (mm/ano)',
+    'tendencia',
+    'K de Pettitt',
+    'p-valor Pettitt',
+    'mudanca Pettitt',
+    'T0 SNHT',
+    'p-valor SNHT',
+    'mudanca SNHT',
+]
+
+
+def pairwise_differences(x: np.ndarray) -> np.ndarray:
+    """x[..., j] - x[..., i] for every pair (i, j) of a batch of series (NaN if either is missing).
+
+    :param x: Series (..., n), NaN for missing values
+
+    :return: Array (..., n, n), element [..., i, j]
+    """
+    return x[..., None, :] - x[..., :, None]
+
+
+def mann_kendall_batch(x: np.ndarray, t: np.ndarray) -> dict:
+    """Mann-Kendall S, its tie-corrected variance and Sen's slopes of a batch of series.
+
+    All pairs are compared at once on a (series, n, n) array instead of a double loop.
+
+    :param x: Series (m, n) on the time grid t, NaN where missing
+    :param t: Times of the grid (n,)
+
+    :return: {'n', 'S', 'var', 'slopes'} with slopes (m, n·n), NaN outside the pairs i < j
+    """
+    n_grid = x.shape[-1]
+    d = pairwise_differences(x)
+    upper = np.triu(np.ones((n_grid, n_grid), dtype=bool), k=1)
+    pairs = upper & ~np.isnan(d)
+
+    n = np.count_nonzero(~np.isnan(x), axis=-1)
+    s = np.where(pairs, np.sign(d), 0.0).sum(axis=(-2, -1))
+
+    # Ties: an element in a group of t equal values sees t values equal to itself, so
+    # the sum over the elements of (c - 1)(2c + 5) is the sum over the groups of t(t - 1)(2t + 5)
+    equal = np.count_nonzero(d == 0, axis=-1)
+    ties = np.where(~np.isnan(x), (equal - 1) * (2 * equal + 5), 0).sum(axis=-1)
+    var = (n * (n - 1) * (2 * n + 5) - ties) / 18
+
+    dt = pairwise_differences(np.asarray(t, dtype=float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = np.where(pairs, d / dt, np.nan)
+
+    return {'n': n, 'S': s, 'var': var, 'slopes': slopes.reshape(x.shape[:-1] + (-1,))}
+
+
+def mann_kendall_z(s: np.ndarray, var: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Continuity-corrected Z of the Mann-Kendall S and its two-sided p-value."""
+    from scipy import special
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(s > 0, (s - 1) / np.sqrt(var), np.where(s < 0, (s + 1) / np.sqrt(var), 0.0))
+
+    return z, special.erfc(np.abs(z) / np.sqrt(2))
+
+
+def pettitt_batch(x: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pettitt change-point test of a batch of series.
+
+    U_t = V_1 + ... + V_t with V_i = sum_j sign(x_i - x_j) over all the values, so the
+    whole statistic sequence is a cumulative sum of the pairwise sign matrix.
+
+    :param x: Series (m, n), NaN where missing
+
+    :return: [0] = K = max |U_t|, [1] = Approximate p-value, [2] = Grid position of the
+             last value before the change (-1 if untested)
+    """
+    n = np.count_nonzero(~np.isnan(x), axis=-1)
+    v = -np.nan_to_num(np.sign(pairwise_differences(x))).sum(axis=-1)
+    u = np.cumsum(np.where(np.isnan(x), 0.0, v), axis=-1)
+    u = np.where(np.isnan(x), 0.0, u)
+
+    position = np.argmax(np.abs(u), axis=-1)
+    k = np.abs(np.take_along_axis(u, position[:, None], axis=-1))[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        p = np.minimum(1.0, 2 * np.exp(-6 * k ** 2 / (n.astype(float) ** 3 + n.astype(float) ** 2)))
+
+    return k, p, np.where(k > 0, position, -1)
+
+
+def snht_statistic(x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Alexandersson's standard normal homogeneity test statistic of a batch of series.
+
+    :param x: Series (m, n), NaN where missing
+
+    :return: [0] = T0 = max_k k·mean(z_1..k)² + (n - k)·mean(z_k+1..n)², [1] = Grid
+             position of the last value before the change
+    """
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(x, axis=-1, keepdims=True) / n
+        std = np.sqrt(np.nansum((x - mean) ** 2, axis=-1, keepdims=True) / (n - 1))
+        z = np.where(valid, (x - mean) / std, 0.0)
+
+        k = np.cumsum(valid, axis=-1)
+        head = np.cumsum(z, axis=-1)
+        tail = head[..., -1:] - head
+        t = k * (head / k) ** 2 + (n - k) * (tail / (n - k)) ** 2
+    t = np.where(valid & (k < n), t, -np.inf)
+
+    position = np.argmax(t, axis=-1)
+    t0 = np.take_along_axis(t, position[:, None], axis=-1)[:, 0]
+
+    return np.where(np.isfinite(t0), t0, np.nan), position
+
+
+@cache
+def _snht_null(n: int) -> np.ndarray:
+    """Sorted T0 of SNHT_SIMULATIONS independent standard normal series of length n."""
+    rng = np.random.default_rng(n)
+    t0, _ = snht_statistic(rng.standard_normal((SNHT_SIMULATIONS, n)))
+
+    return np.sort(t0)
+
+
+def snht_pvalue(t0: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Monte Carlo p-value of SNHT statistics (simulated once per series length)."""
+    p = np.full(len(t0), np.nan)
+    for length in np.unique(n[np.isfinite(t0)]):
+        rows = (n == length) & np.isfinite(t0)
+        null = _snht_null(int(length))
+        p[rows] = (len(null) - np.searchsorted(null, t0[rows], side='left') + 1) / (len(null) + 1)
+
+    return p
+
+
+def _blocks(m: int):
+    for start in range(0, m, TREND_BLOCK):
+        yield slice(start, min(m, start + TREND_BLOCK))
+
+
+def _label(p: np.ndarray, sign: np.ndarray) -> np.ndarray:
+    """'aumento', 'reducao' or 'sem tendencia' at TREND_ALPHA."""
+    labels = np.where(sign > 0, 'aumento', 'reducao').astype(object)
+    labels[~(p < TREND_ALPHA) | (sign == 0)] = 'sem tendencia'
+    labels[np.isnan(p)] = None
+
+    return labels
+
+
+@timed_stage()
+def annual_trend_tests(series: pd.DataFrame, series_name: str) -> pd.DataFrame:
+    """Mann-Kendall, Sen's slope, Pettitt and SNHT of annual series of every station.
+
+    :param series: Wide table, one row per station code (index) and one column per year
+    :param series_name: Value of the 'serie' column
+
+    :return: One row per station (columns of TREND_COLUMNS); stations with fewer than
+             MIN_TREND_YEARS values are left out
+    """
+    series = series[series.notna().sum(axis=1) >= MIN_TREND_YEARS]
+    years = series.columns.to_numpy(dtype=float)
+    x = series.to_numpy(dtype=float)
+
+    s, var, n, slope = (np.empty(len(x)) for _ in range(4))
+    k, p_pettitt, pos_pettitt = (np.empty(len(x)) for _ in range(3))
+    t0, pos_snht = np.empty(len(x)), np.empty(len(x), dtype=int)
+    for rows in _blocks(len(x)):
+        mk = mann_kendall_batch(x[rows], years)
+        s[rows], var[rows], n[rows] = mk['S'], mk['var'], mk['n']
+        slope[rows] = np.nanmedian(mk['slopes'], axis=-1)
+        k[rows], p_pettitt[rows], pos_pettitt[rows] = pettitt_batch(x[rows])
+        t0[rows], pos_snht[rows] = snht_statistic(x[rows])
+
+    z, p_mk = mann_kendall_z(s, var)
+    p_snht = snht_pvalue(t0, n)
+    valid = ~np.isnan(x)
+
+    return pd.DataFrame({
+        'Codigo Estacao': series.index.to_numpy(),
+        'serie': series_name,
+        'n': n.astype(int),
+        'inicio': [str(int(years[row].min())) for row in valid],
+        'fim': [str(int(years[row].max())) for row in valid],
+        'S': s,
+        'tau de Kendall': s / (n * (n - 1) / 2),
+        'Z': z,
+        'p-valor MK': p_mk,
+        'declividade de Sen (mm/ano)': slope,
+        'tendencia': _label(p_mk, s),
+        'K de Pettitt': k,
+        'p-valor Pettitt': p_pettitt,
+        'mudanca Pettitt': [str(int(years[int(i)])) if i >= 0 else None for i in pos_pettitt],
+        'T0 SNHT': t0,
+        'p-valor SNHT': p_snht,
+        'mudanca SNHT': [str(int(years[i])) for i in pos_snht],
+    }, columns=TREND_COLUMNS)
+
+
+@timed_stage()
+def monthly_trend_tests(totals: np.ndarray, months: pd.PeriodIndex, codes: list,
+                        series_name: str) -> pd.DataFrame:
+    """Trend and change-point tests of the monthly precipitation of every station.
+
+    Trends use the seasonal Mann-Kendall test (Hirsch et al., 1982): S and its
+    variance are summed over the twelve calendar months, each compared only across
+    years, and Sen's slope is the median of the within-month slopes (mm/year).
+    Pettitt and SNHT run on the monthly anomalies (departure from the calendar-month
+    mean, in units of its standard deviation) in time order.
+
+    :param totals: Monthly totals (months, stations), NaN for incomplete months
+    :param months: Month of every row (consecutive)
+    :param codes: Station code of every column
+    :param series_name: Value of the 'serie' column
+
+    :return: One row per station with at least MIN_TREND_YEARS years of complete months
+    """
+    years = np.arange(months[0].year, months[-1].year + 1)
+    grid = np.full((len(codes), len(years), 12), np.nan)
+    grid[:, months.year.to_numpy() - years[0], months.month.to_numpy() - 1] = totals.T
+
+    n_months = np.count_nonzero(~np.isnan(grid), axis=(1, 2))
+    keep = np.flatnonzero(n_months >= 12 * MIN_TREND_YEARS)
+    grid = grid[keep]
+
+    with warnings.catch_warnings():
+        # Calendar months without any complete value
+        warnings.simplefilter('ignore', RuntimeWarning)
+        anomalies = (grid - np.nanmean(grid, axis=1, keepdims=True)) / np.nanstd(grid, axis=1, ddof=1, keepdims=True)
+    anomalies = anomalies.reshape(len(keep), -1)
+
+    m = len(keep)
+    s, var, n, slope, pairs = (np.empty(m) for _ in range(5))
+    k, p_pettitt, pos_pettitt = (np.empty(m) for _ in range(3))
+    t0, pos_snht = np.empty(m), np.empty(m, dtype=int)
+    for rows in _blocks(m):
+        # Series of one calendar month across the years: (stations, 12, years)
+        mk = mann_kendall_batch(np.swapaxes(grid[rows], 1, 2), years)
+        s[rows] = mk['S'].sum(axis=-1)
+        var[rows] = mk['var'].sum(axis=-1)
+        n[rows] = mk['n'].sum(axis=-1)
+        pairs[rows] = (mk['n'] * (mk['n'] - 1) / 2).sum(axis=-1)
+        slope[rows] = np.nanmedian(mk['slopes'].reshape(len(mk['S']), -1), axis=-1)
+        k[rows], p_pettitt[rows], pos_pettitt[rows] = pettitt_batch(anomalies[rows])
+        t0[rows], pos_snht[rows] = snht_statistic(anomalies[rows])
+
+    z, p_mk = mann_kendall_z(s, var)
+    p_snht = snht_pvalue(t0, n)
+    labels = pd.period_range(pd.Period(year=int(years[0]), month=1, freq='M'),
+                             periods=len(years) * 12, freq='M').strftime('%Y-%m')
+    valid = ~np.isnan(anomalies)
+
+    return pd.DataFrame({
+        'Codigo Estacao': np.asarray(codes, dtype=object)[keep],
+        'serie': series_name,
+        'n': n.astype(int),
+        'inicio': [labels[np.flatnonzero(row)[0]] for row in valid],
+        'fim': [labels[np.flatnonzero(row)[-1]] for row in valid],
+        'S': s,
+        'tau de Kendall': s / pairs,
+        'Z': z,
+        'p-valor MK': p_mk,
+        'declividade de Sen (mm/ano)': slope,
+        'tendencia': _label(p_mk, s),
+        'K de Pettitt': k,
+        'p-valor Pettitt': p_pettitt,
+        'mudanca Pettitt': [labels[int(i)] if i >= 0 else None for i in pos_pettitt],
+        'T0 SNHT': t0,
+        'p-valor SNHT': p_snht,
+        'mudanca SNHT': [labels[i] for i in pos_snht],
+    }, columns=TREND_COLUMNS)
+
+
+def catalog_trend_tests(annual_maxima: pd.DataFrame, matrix, duration: int = 1) -> pd.DataFrame:
+    """Trend and change-point tests of every station on two series.
+
+    'maximos anuais': annual maxima of one duration (compute_catalog_annual_maxima
+    output), per hydrological year. 'totais mensais': complete monthly totals of the
+    PrecipitationMatrix (the completeness rule of clean_dataset).
+
+    :return: Long table with the columns of TREND_COLUMNS
+    """
+    from src.functions.spi_cube import monthly_totals
+
+    maxima = annual_maxima[annual_maxima['duracao (dias)'] == duration].pivot(
+        index='Codigo Estacao', columns='ano hidrologico', values='precipitacao máxima anual (mm)')
+    if len(maxima.columns):
+        maxima = maxima.reindex(columns=range(int(maxima.columns.min()), int(maxima.columns.max()) + 1))
+
+    values, valid = matrix.query()
+    months, totals = monthly_totals(values, valid, matrix.start)
+
+    return pd.concat([
+        annual_trend_tests(maxima, 'maximos anuais'),
+        monthly_trend_tests(totals, months, matrix.codes, 'totais mensais'),
+    ], ignore_index=True)
+
+
+def trend_map_classes(trends: pd.DataFrame, series_name: str, test: str) -> pd.Series:
+    """Map class (key of TREND_CLASSES) of every tested station for one series and test.
+
+    :param trends: catalog_trend_tests table
+    :param series_name: 'maximos anuais' or 'totais mensais'
+    :param test: One of TREND_TESTS
+
+    :return: Class keys indexed by station code
+    """
+    table = trends[trends['serie'] == series_name].set_index('Codigo Estacao')
+    if test == 'mk':
+        return table['tendencia']
+
+    changed = table[f'p-valor {TREND_TESTS[test]}'] < TREND_ALPHA
+    return pd.Series(np.where(changed, 'mudanca', 'sem tendencia'), index=table.index)
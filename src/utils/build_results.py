@@ -0,0 +1,235 @@
+"""Build the precomputed catalog-wide result tables browsed by the app.
+
+Usage:
+    python -m src.utils.build_results <product> [--data-dir ./data] [--results-dir ./results] [--workers N]
+                                         [--resolution 0.1] [--gap-fill-method regressao]
+
+Products:
+    ks   Annual maxima of every station for the 1- to 10-day durations of MAX_DURATIONS
+         (annual_maxima.parquet) and the KS model-selection report of the candidate
+         distributions of every station and duration (ks_report.parquet)
+    idf  Parameters K, a, b, c of the IDF equation i = K·Tr^a / (t + b)^c of every
+         station (idf_parameters.parquet), fitted to the disaggregated matrix of the
+         selected distribution's quantiles, with the 'ajuste aceitavel' flag of the
+         fits reaching IDF_MIN_R2. Stations with fewer than MIN_QUANTILE_YEARS annual
+         maxima or implausible quantiles are left out (builds ks first if missing)
+    grid Memory-mapped national grid of the maximum daily precipitation quantiles,
+         interpolated by IDW from the stations with at least MIN_QUANTILE_YEARS annual
+         maxima and plausible quantiles (hmax_grid.bin; builds ks first if missing)
+    matrix
+         Memory-mapped days x stations daily precipitation matrix with a validity
+         bitmap (precipitation_matrix/). Incremental: only the stations whose file
+         changed since the last run are rewritten
+    spi  Station x month SPI cube at the scales of SPI_SCALES (spi_cube.npz), computed
+         from the precipitation matrix (brought up to date first)
+    etccdi
+         ETCCDI extreme-precipitation indices of every station and hydrological year
+         (etccdi_indices.parquet), from the precipitation matrix with the hydrological
+         year of the annual maxima (computed first if missing; civil year for the
+         stations without annual maxima)
+    trends
+         Mann-Kendall trend (with Sen's slope) and Pettitt and SNHT change-point tests
+         of every station (trend_tests.parquet) on its 1-day annual maxima (computed
+         first if missing) and on its monthly totals of the precipitation matrix
+         (seasonal Mann-Kendall)
+    nsgev
+         Stationary and non-stationary GEV fits (location and/or log-scale linear in
+         the year) of the annual maxima of every station and duration with at least
+         NSGEV_MIN_YEARS years, with their likelihood-ratio tests against the
+         stationary model (nonstationary_gev.parquet; annual maxima computed first
+         if missing)
+    gapfill
+         Estimates of the missing days of every station from its nearest neighbours
+         on the same days (gap_fill.parquet, one row per filled station-day), from
+         the precipitation matrix; --gap-fill-method idw or regressao. The analysis
+         page can rerun a station with these days filled
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.functions.analysis import catalog_hmax_quantiles, compute_catalog_annual_maxima
+from src.functions.data import write_parquet_atomic
+from src.functions.etccdi import catalog_etccdi_indices
+from src.functions.gap_filling import GAP_FILL_METHODS, catalog_gap_fill
+from src.functions.grid import build_design_rainfall_grid, write_design_rainfall_grid
+from src.functions.idf import IDF_MIN_R2, fit_idf_catalog
+from src.functions.nonstationary import fit_nonstationary_gev_batch
+from src.functions.precipitation_matrix import PrecipitationMatrix, update_precipitation_matrix
+from src.functions.spi_cube import build_spi_cube, write_spi_cube
+from src.functions.statistic import verify_probability_distribuition_batch
+from src.functions.trends import catalog_trend_tests
+
+
+ANNUAL_MAXIMA_FILE = 'annual_maxima.parquet'
+KS_REPORT_FILE = 'ks_report.parquet'
+IDF_PARAMETERS_FILE = 'idf_parameters.parquet'
+HMAX_GRID_FILE = 'hmax_grid.bin'
+PRECIPITATION_MATRIX_DIR = 'precipitation_matrix'
+SPI_CUBE_FILE = 'spi_cube.npz'
+ETCCDI_INDICES_FILE = 'etccdi_indices.parquet'
+TREND_TESTS_FILE = 'trend_tests.parquet'
+NONSTATIONARY_GEV_FILE = 'nonstationary_gev.parquet'
+GAP_FILL_FILE = 'gap_fill.parquet'
+METADATA_FILE = 'metadata_estacoes.parquet'
+
+
+def load_or_build_annual_maxima(args, rebuild: bool = False) -> pd.DataFrame:
+    path_file = os.path.join(args.results_dir, ANNUAL_MAXIMA_FILE)
+    if os.path.exists(path_file) and not rebuild:
+        return pd.read_parquet(path_file)
+
+    annual_maxima = compute_catalog_annual_maxima(args.data_dir, args.workers)
+    write_parquet_atomic(annual_maxima, path_file)
+    print(f"{ANNUAL_MAXIMA_FILE}: {annual_maxima['Codigo Estacao'].nunique()} stations, "
+          f"{len(annual_maxima)} annual maxima over {annual_maxima['duracao (dias)'].nunique()} durations")
+
+    return annual_maxima
+
+
+def build_ks(args):
+    annual_maxima = load_or_build_annual_maxima(args, rebuild=True)
+    report = verify_probability_distribuition_batch(annual_maxima, args.workers)
+    write_parquet_atomic(report, os.path.join(args.results_dir, KS_REPORT_FILE))
+
+    selected = report[report['selecionada']]
+    winners = pd.crosstab(selected['Tipo de Distribuição'], selected['duracao (dias)'])
+    print(f"{KS_REPORT_FILE}: {report['Codigo Estacao'].nunique()} stations")
+    print(winners.to_string())
+
+
+def load_or_build_ks_report(args) -> pd.DataFrame:
+    path_file = os.path.join(args.results_dir, KS_REPORT_FILE)
+    if not os.path.exists(path_file):
+        build_ks(args)
+
+    return pd.read_parquet(path_file)
+
+
+def build_idf(args):
+    ks_report = load_or_build_ks_report(args)
+    coordinates = pd.read_parquet(os.path.join(args.data_dir, METADATA_FILE))
+    hmax_quantiles = catalog_hmax_quantiles(ks_report)
+
+    idf_parameters = fit_idf_catalog(hmax_quantiles, coordinates, args.workers)
+    write_parquet_atomic(idf_parameters, os.path.join(args.results_dir, IDF_PARAMETERS_FILE))
+    print(f"{IDF_PARAMETERS_FILE}: {len(idf_parameters)} stations, "
+          f"median R² = {idf_parameters['r2'].median():.4f}, "
+          f"{(~idf_parameters['ajuste aceitavel']).sum()} below R² = {IDF_MIN_R2}")
+
+
+def build_grid(args):
+    ks_report = load_or_build_ks_report(args)
+    coordinates = pd.read_parquet(os.path.join(args.data_dir, METADATA_FILE))
+    hmax_quantiles = catalog_hmax_quantiles(ks_report)
+
+    values, geometry = build_design_rainfall_grid(
+        hmax_quantiles, coordinates, resolution=args.resolution)
+    write_design_rainfall_grid(values, geometry, os.path.join(args.results_dir, HMAX_GRID_FILE))
+    covered = ~np.isnan(values[:, :, 0])
+    print(f"{HMAX_GRID_FILE}: {values.shape[0]} x {values.shape[1]} cells of "
+          f"{args.resolution}°, {covered.mean():.0%} covered, {len(geometry['tr'])} return periods")
+
+
+def build_matrix(args):
+    index, rewritten = update_precipitation_matrix(
+        args.data_dir, os.path.join(args.results_dir, PRECIPITATION_MATRIX_DIR))
+    print(f"{PRECIPITATION_MATRIX_DIR}: {len(index['stations'])} stations, "
+          f"{index['start']} to {index['last']}, {len(rewritten)} stations rewritten")
+
+
+def build_spi(args):
+    build_matrix(args)
+    matrix = PrecipitationMatrix(os.path.join(args.results_dir, PRECIPITATION_MATRIX_DIR))
+
+    cube = build_spi_cube(matrix)
+    write_spi_cube(cube, os.path.join(args.results_dir, SPI_CUBE_FILE))
+    covered = (~np.isnan(cube['spi'][0])).any(axis=0).sum()
+    print(f"{SPI_CUBE_FILE}: {len(cube['stations'])} stations ({covered} with SPI), "
+          f"{cube['months'][0]} to {cube['months'][-1]}, scales {cube['scales'].tolist()}")
+
+
+def build_etccdi(args):
+    annual_maxima = load_or_build_annual_maxima(args)
+    hydro_inits = annual_maxima.groupby('Codigo Estacao')['mes inicio ano hidrologico'].first().to_dict()
+
+    build_matrix(args)
+    matrix = PrecipitationMatrix(os.path.join(args.results_dir, PRECIPITATION_MATRIX_DIR))
+
+    indices = catalog_etccdi_indices(matrix, hydro_inits)
+    write_parquet_atomic(indices, os.path.join(args.results_dir, ETCCDI_INDICES_FILE))
+    print(f"{ETCCDI_INDICES_FILE}: {indices['Codigo Estacao'].nunique()} stations, "
+          f"{len(indices)} station-years")
+
+
+def build_trends(args):
+    annual_maxima = load_or_build_annual_maxima(args)
+
+    build_matrix(args)
+    matrix = PrecipitationMatrix(os.path.join(args.results_dir, PRECIPITATION_MATRIX_DIR))
+
+    trends = catalog_trend_tests(annual_maxima, matrix)
+    write_parquet_atomic(trends, os.path.join(args.results_dir, TREND_TESTS_FILE))
+    print(f"{TREND_TESTS_FILE}: {trends['Codigo Estacao'].nunique()} stations")
+    print(pd.crosstab(trends['tendencia'], trends['serie']).to_string())
+
+
+def build_nsgev(args):
+    annual_maxima = load_or_build_annual_maxima(args)
+
+    fits = fit_nonstationary_gev_batch(annual_maxima, args.workers)
+    write_parquet_atomic(fits, os.path.join(args.results_dir, NONSTATIONARY_GEV_FILE))
+    selected = fits[fits['selecionado']]
+    print(f"{NONSTATIONARY_GEV_FILE}: {fits['Codigo Estacao'].nunique()} stations")
+    print(pd.crosstab(selected['modelo'], selected['duracao (dias)']).to_string())
+
+
+def build_gapfill(args):
+    build_matrix(args)
+    matrix = PrecipitationMatrix(os.path.join(args.results_dir, PRECIPITATION_MATRIX_DIR))
+    coordinates = pd.read_parquet(os.path.join(args.data_dir, METADATA_FILE))
+
+    fills = catalog_gap_fill(matrix, coordinates, method=args.gap_fill_method)
+    write_parquet_atomic(fills, os.path.join(args.results_dir, GAP_FILL_FILE))
+    print(f"{GAP_FILL_FILE}: {len(fills)} days filled by {args.gap_fill_method} "
+          f"over {fills['Codigo Estacao'].nunique()} stations")
+
+
+PRODUCTS = {
+    'ks': build_ks,
+    'idf': build_idf,
+    'grid': build_grid,
+    'matrix': build_matrix,
+    'spi': build_spi,
+    'etccdi': build_etccdi,
+    'trends': build_trends,
+    'nsgev': build_nsgev,
+    'gapfill': build_gapfill,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the precomputed RainData result tables.')
+    parser.add_argument('product', choices=list(PRODUCTS),
+                        help='Result table to build')
+    parser.add_argument('--data-dir', default='./data',
+                        help='Parquet store directory (default: ./data)')
+    parser.add_argument('--results-dir', default='./results',
+                        help='Output directory (default: ./results)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes (default: CPU count)')
+    parser.add_argument('--resolution', type=float, default=0.1,
+                        help='Grid cell size in degrees (grid only, default: 0.1)')
+    parser.add_argument('--gap-fill-method', choices=GAP_FILL_METHODS, default='regressao',
+                        help='Estimation method (gapfill only, default: regressao)')
+    args = parser.parse_args()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    PRODUCTS[args.product](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Cooperative cancellation of long computations.
+
+A computation runs under a token (with cancellable(token): ...). The pipeline
+functions call checkpoint() between their stages; once the token is cancelled the
+next checkpoint raises OperationCancelled, abandoning the rest of the work.
+
+The token travels in a context variable, so the functions between the caller and
+the checkpoints (st.cache_data loaders, timed stages) need no extra argument, and
+code running without a token (batch jobs, benchmarks, the API) is unaffected.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+
+class OperationCancelled(Exception):
+    """The computation was abandoned because its token was cancelled."""
+
+
+class CancellationToken:
+    """Thread-safe flag shared by the requester and the computation."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+_current_token = contextvars.ContextVar('raindata_cancellation_token', default=None)
+
+
+@contextmanager
+def cancellable(token: CancellationToken):
+    """Run the enclosed code under token."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def checkpoint():
+    """Raise OperationCancelled if the current computation was cancelled."""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
@@ -0,0 +1,256 @@
+"""Shared, bounded executor for the heavy analysis stages.
+
+Every session submits its station analysis to one pool per server process
+(get_compute_pool) instead of running the scipy fits on its own script thread, so
+a burst of visitors queues up instead of running dozens of fits at once:
+
+    bounded     RAINDATA_COMPUTE_WORKERS threads run jobs (default: 2)
+    admission   at most RAINDATA_COMPUTE_QUEUE jobs wait (default: 32); beyond that
+                submit() raises PoolFullError and the page asks the user to retry
+    fairness    waiting jobs are dispatched round-robin across sessions, so one
+                session cannot starve the others
+    coalescing  jobs with the same key (e.g. the same station file) run once and
+                every session asking for it waits on the same future
+    superseding a submission with supersede=True withdraws the session from its
+                other jobs; a job nobody waits for any more is dropped from the
+                queue or, if running, cancelled at its next checkpoint()
+                (see src.utils.cancellation)
+
+The results of the last `remember` keys are kept by the pool itself: asking again
+for one of them returns at once, without waiting in line and without running
+anything on the calling thread (whether or not the st.cache_data entry of the
+loader still exists).
+
+Chart rendering is not submitted: it runs on the session's own thread (see
+src.functions.charts).
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from src.utils.cancellation import CancellationToken, OperationCancelled, cancellable
+from src.utils.i18n import get_text
+
+
+logger = logging.getLogger('raindata.compute')
+
+
+class PoolFullError(RuntimeError):
+    """The compute queue is full; the request was not admitted."""
+
+
+class Job:
+    """One computation of the pool, shared by every session that asked for its key."""
+
+    def __init__(self, key, func, args: tuple, kwargs: dict):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.token = CancellationToken()
+        self.sessions = set()
+        self.submitted_at = time.perf_counter()
+        # Instrumentation of the first session (its run records the stages of the job)
+        self.context = contextvars.copy_context()
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.context.run(self._run_cancellable)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+    def _run_cancellable(self):
+        with cancellable(self.token):
+            return self.func(*self.args, **self.kwargs)
+
+
+class ComputePool:
+    """Fixed set of worker threads fed by per-session queues (see the module docstring)."""
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 32, remember: int = 64):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.remember = remember
+        self._condition = threading.Condition()
+        self._queues = OrderedDict()
+        self._jobs = {}
+        self._completed = OrderedDict()
+        self._running = 0
+        self._workers = [
+            threading.Thread(target=self._work, name=f'raindata-compute-{i}', daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def submit(self, session_id: str, key, func, *args, supersede: bool = False, **kwargs) -> Job:
+        """Queue func(*args, **kwargs) for a session, join the pending job of the same key,
+        or get the kept result of a recently completed one.
+
+        :param supersede: Withdraw the session from its other pending jobs (e.g. the
+                          analysis of the station it was looking at before)
+
+        :raises PoolFullError: When max_queued jobs are already waiting
+        """
+        if supersede:
+            self.withdraw(session_id, keep=key)
+
+        with self._condition:
+            if key in self._completed and key not in self._jobs:
+                self._completed.move_to_end(key)
+                job = Job(key, func, args, kwargs)
+                job.sessions.add(session_id)
+                job.future.set_result(self._completed[key])
+                return job
+
+            job = self._jobs.get(key)
+            if job is None or job.token.cancelled or job.future.cancelled():
+                if self.queued >= self.max_queued:
+                    raise PoolFullError(f"{self.queued} computations are already waiting.")
+                job = Job(key, func, args, kwargs)
+                self._jobs[key] = job
+                self._queues.setdefault(session_id, deque()).append(job)
+                self._condition.notify()
+            job.sessions.add(session_id)
+
+        return job
+
+    def withdraw(self, session_id: str, keep=None):
+        """Stop waiting for the jobs of a session (all but the one of key keep).
+
+        Jobs still wanted by other sessions go on; the others are removed from the
+        queue, or cancelled if they are already running.
+        """
+        with self._condition:
+            for key, job in list(self._jobs.items()):
+                if key == keep or session_id not in job.sessions:
+                    continue
+                job.sessions.discard(session_id)
+                if job.sessions:
+                    continue
+                if job.future.cancel():
+                    # Still queued: drop it
+                    del self._jobs[key]
+                    for queue in self._queues.values():
+                        if job in queue:
+                            queue.remove(job)
+                    logger.info("Job %s dropped from the queue.", key)
+                else:
+                    job.token.cancel()
+                    logger.info("Job %s cancelled while running.", key)
+
+    def position(self, job: Job) -> int:
+        """Jobs dispatched before this one (0 when it is running or done)."""
+        with self._condition:
+            if job.future.done() or job.future.running():
+                return 0
+            # Replay the round-robin dispatch over a snapshot of the queues
+            queues = [list(queue) for queue in self._queues.values() if queue]
+            ahead = 0
+            while queues:
+                for queue in list(queues):
+                    if queue.pop(0) is job:
+                        return ahead
+                    ahead += 1
+                    if not queue:
+                        queues.remove(queue)
+
+        # Just dispatched
+        return 0
+
+    def _next_job(self) -> Job:
+        """Front job of the first session in turn; that session then goes last."""
+        while True:
+            for session_id, queue in self._queues.items():
+                if queue:
+                    job = queue.popleft()
+                    self._queues.move_to_end(session_id)
+                    if not queue:
+                        del self._queues[session_id]
+                    return job
+            self._condition.wait()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                self._running += 1
+            try:
+                job.run()
+            finally:
+                error = None if job.future.cancelled() else job.future.exception()
+                with self._condition:
+                    self._running -= 1
+                    # A cancelled job may already have been replaced by a new one of the same key
+                    if self._jobs.get(job.key) is job:
+                        del self._jobs[job.key]
+                    if not job.future.cancelled() and error is None:
+                        self._completed[job.key] = job.future.result()
+                        if len(self._completed) > self.remember:
+                            self._completed.popitem(last=False)
+                if isinstance(error, OperationCancelled):
+                    logger.info("Job %s abandoned after %.2f s.", job.key, time.perf_counter() - job.submitted_at)
+                else:
+                    logger.info("Job %s done in %.2f s.", job.key, time.perf_counter() - job.submitted_at)
+
+
+@st.cache_resource
+def get_compute_pool() -> ComputePool:
+    """The compute pool of this server process."""
+    return ComputePool(
+        max_workers=int(os.environ.get('RAINDATA_COMPUTE_WORKERS', '2')),
+        max_queued=int(os.environ.get('RAINDATA_COMPUTE_QUEUE', '32')),
+    )
+
+
+def current_session_id() -> str:
+    """Streamlit session of the calling script ('background' outside a session)."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else 'background'
+
+
+def wait_with_status(job: Job, pool: ComputePool, lang: str, poll_s: float = 0.5):
+    """Result of a job, showing a "computing…" placeholder while it is queued or running.
+
+    The placeholder is updated every poll_s seconds; a rerun of the session (e.g. the
+    user selecting another station) interrupts the wait at the next update.
+    """
+    if job.future.done():
+        return job.future.result()
+
+    placeholder = st.empty()
+    while True:
+        position = pool.position(job)
+        if position:
+            placeholder.info(get_text('compute_queued', lang, position=position))
+        else:
+            placeholder.info(get_text('compute_running', lang))
+        try:
+            result = job.future.result(timeout=poll_s)
+        except TimeoutError:
+            continue
+        except BaseException:
+            placeholder.empty()
+            raise
+        placeholder.empty()
+        return result
@@ -145,7 +145,138 @@ translations = {
         'invalid_quantiles_error': (
             'A distribuição de probabilidade selecionada produziu '
             'quantis de precipitação inválidos.'
-        ),       
+        ),
+
+        'ks_report_title': 'Resumo nacional das distribuições (critério KS)',
+        'ks_report_counts': 'Estações por distribuição selecionada',
+        'ks_report_filter_dist': 'Distribuições',
+        'ks_report_max_ks': 'Estatística KS máxima',
+        'ks_report_min_years': 'Mínimo de máximos anuais',
+        'ks_report_only_selected': 'Somente a distribuição selecionada de cada estação',
+        'ks_report_rows': '**{count}** linhas',
+
+        'idf_equation_title': 'Equação IDF ajustada',
+        'idf_equation_fit': 'i em mm/h, t em minutos e Tr em anos. Ajuste à matriz desagregada: RMSE = {rmse:.2f} mm/h, R² = {r2:.4f}.',
+        'idf_equation_unreliable': (
+            'Equação pouco confiável: {n_years} anos de máximas (mínimo de {min_years} para os produtos '
+            'do catálogo) ou R² abaixo de {min_r2}. Os quantis de registros curtos podem ser irreais.'
+        ),
+        'idf_calc_duration': 'Duração, t (min)',
+        'idf_calc_return_period': 'Período de retorno, Tr (anos)',
+        'idf_calc_result': 'Intensidade estimada',
+
+        'grid_overlay_show': 'Mostrar superfície de chuva de projeto',
+        'grid_overlay_tr': 'Período de retorno (anos)',
+        'grid_overlay_legend': 'Precipitação máxima diária (mm), Tr = {tr} anos',
+        'grid_query_title': 'Chuva de projeto em qualquer ponto',
+        'grid_query_lat': 'Latitude',
+        'grid_query_lon': 'Longitude',
+        'grid_query_outside': 'Ponto fora da cobertura da grade (a mais de 150 km de qualquer estação).',
+        'grid_query_hmax': '**Precipitação máxima diária interpolada (mm)**',
+        'grid_query_idf': '**Intensidades (mm/h) por duração (min) e período de retorno (anos)**',
+
+        'warmup_title': 'Preparando o servidor',
+        'warmup_running': 'Carregando dados e análises em segundo plano...',
+        'warmup_done': 'Caches pré-carregados em {seconds:.1f} s.',
+
+        'table_sort_by': 'Ordenar por',
+        'table_no_sort': '(ordem original)',
+        'table_descending': 'Decrescente',
+        'table_page_size': 'Linhas por página',
+        'table_filter_column': 'Filtrar coluna',
+        'table_no_filter': '(sem filtro)',
+        'table_filter_min': 'Mínimo',
+        'table_filter_max': 'Máximo',
+        'table_page': 'Página (de {pages})',
+        'table_rows': 'Linhas {first}–{last} de {total}',       
+
+        'interactive_chart': 'Gráfico interativo',
+        'interactive_chart_points': 'Exibindo {shown} de {total} pontos (mínimo e máximo de cada intervalo, reduzidos no servidor). O zoom do gráfico não recupera os valores diários: estreite o período na barra lateral para vê-los.',
+
+        'compute_queued': '⏳ Calculando… {position} análise(s) na fila antes desta estação.',
+        'compute_running': '⏳ Calculando a análise desta estação…',
+        'compute_busy': 'O servidor está ocupado com muitas análises no momento. Tente novamente em alguns instantes.',
+        'compute_retry': 'Tentar novamente',
+
+        'map_mode': 'Modo do mapa',
+        'map_mode_stations': 'Estações',
+        'map_mode_spi': 'Seca (SPI)',
+        'spi_map_scale': 'Escala do SPI (meses)',
+        'spi_map_month': 'Mês',
+        'spi_map_legend': 'SPI-{scale} em {month}',
+        'spi_map_counts': 'SPI-{scale} em {month}: {counts}. Sem dado: {missing} estações.',
+        'spi_map_unavailable': 'Cubo SPI não encontrado. Gere-o com: python -m src.utils.build_results spi',
+        'spi_cat_seco_extremo': 'Extremamente seco',
+        'spi_cat_seco_severo': 'Severamente seco',
+        'spi_cat_seco_moderado': 'Moderadamente seco',
+        'spi_cat_normal': 'Próximo do normal',
+        'spi_cat_umido_moderado': 'Moderadamente úmido',
+        'spi_cat_umido_severo': 'Severamente úmido',
+        'spi_cat_umido_extremo': 'Extremamente úmido',
+
+        'ks_report_duration': 'Duração da precipitação máxima (dias)',
+
+        'tab_pot': 'Picos acima do limiar (GPD)',
+        'pot_unavailable': 'Picos acima do limiar insuficientes para ajustar a distribuição generalizada de Pareto.',
+        'pot_mrl_title': '**Vida residual média** (excesso médio acima do limiar, IC 95 %)',
+        'pot_stability_title': '**Estabilidade do parâmetro de forma**',
+        'pot_summary': (
+            '**Limiar:** {threshold:.1f} mm | **Picos:** {n_peaks} em {years:.1f} anos de dados '
+            '({rate:.1f} por ano) | **Forma (ξ):** {shape:.3f} | **Escala:** {scale:.2f} mm'
+        ),
+        'pot_hmax_table': '**Níveis de retorno: máximos anuais × picos acima do limiar**',
+        'quality_frequency_pot': (
+            'A aba de picos acima do limiar ajusta uma distribuição generalizada de Pareto a '
+            '{n_peaks} eventos independentes, em vez de um máximo por ano, e oferece uma '
+            'estimativa complementar para séries curtas.'
+        ),
+
+        'map_mode_trend': 'Tendências',
+        'trend_map_series': 'Série',
+        'trend_series_maximos_anuais': 'Máximos anuais (1 dia)',
+        'trend_series_totais_mensais': 'Totais mensais',
+        'trend_map_test': 'Teste',
+        'trend_test_mk': 'Tendência (Mann-Kendall)',
+        'trend_test_pettitt': 'Ponto de mudança (Pettitt)',
+        'trend_test_snht': 'Ponto de mudança (SNHT)',
+        'trend_class_aumento': 'Aumento',
+        'trend_class_reducao': 'Redução',
+        'trend_class_mudanca': 'Mudança significativa',
+        'trend_class_sem_tendencia': 'Não significativo',
+        'trend_map_counts': '{counts} (nível de 5 %, {tested} estações testadas; estações com menos de {min_years} anos em cinza claro).',
+        'trend_map_tooltip_mk': 'Sen: {slope:+.2f} mm/ano (p = {p:.3f})',
+        'trend_map_tooltip_change': 'Mudança após {when} (p = {p:.3f})',
+        'trend_map_unavailable': 'Testes de tendência não encontrados. Gere-os com: python -m src.utils.build_results trends',
+
+        'tab_nsgev': 'GEV não estacionária',
+        'nsgev_unavailable': 'A GEV não estacionária requer pelo menos {min_years} máximos anuais.',
+        'nsgev_significant': (
+            'O teste de razão de verossimilhança rejeita a estacionariedade ao nível de 5 % '
+            '(menor p-valor: {p:.3f}). Modelo de menor AIC: **{model}**.'
+        ),
+        'nsgev_not_significant': (
+            'Nenhum modelo com tendência difere significativamente do estacionário ao nível de 5 % '
+            '(menor p-valor: {p:.3f}). Modelo de menor AIC: **{model}**.'
+        ),
+        'nsgev_models_title': '**Modelos ajustados** (μ linear e log σ linear no ano hidrológico)',
+        'nsgev_model': 'Modelo',
+        'nsgev_target_year': 'Ano alvo',
+        'nsgev_hmax_table': '**Níveis de retorno efetivos em {year}**',
+        'nsgev_levels_title': '**Níveis de retorno efetivos ao longo dos anos**',
+
+        'gap_fill_toggle': 'Preencher falhas com estações vizinhas',
+        'gap_fill_help': (
+            'Estima os dias sem observação a partir das estações mais próximas (até 100 km) '
+            'nos mesmos dias e refaz a análise. Gere as estimativas com: '
+            'python -m src.utils.build_results gapfill'
+        ),
+        'gap_fill_summary': 'Análise com {filled_days} dias preenchidos a partir de estações vizinhas.',
+        'gap_fill_compare': 'Comparar ajustes com e sem preenchimento',
+        'gap_fill_fits': (
+            '**Sem preenchimento:** {years_before} máximos anuais, {dist_before} | '
+            '**Com preenchimento:** {years_after} máximos anuais, {dist_after}'
+        ),
+        'gap_fill_no_baseline': 'Sem preenchimento, a estação não tem máximos anuais suficientes para o ajuste.',
     },
     'en': {
         'app_title': '🌧️ Precipitation Data Explorer',
@@ -271,7 +402,138 @@ translations = {
         'invalid_quantiles_error': (
             'The selected probability distribution produced '
             'invalid precipitation quantiles.'
-        ),                 
+        ),
+
+        'ks_report_title': 'National distribution summary (KS criterion)',
+        'ks_report_counts': 'Stations by selected distribution',
+        'ks_report_filter_dist': 'Distributions',
+        'ks_report_max_ks': 'Maximum KS statistic',
+        'ks_report_min_years': 'Minimum number of annual maxima',
+        'ks_report_only_selected': 'Only the selected distribution of each station',
+        'ks_report_rows': '**{count}** rows',
+
+        'idf_equation_title': 'Fitted IDF equation',
+        'idf_equation_fit': 'i in mm/h, t in minutes and Tr in years. Fit to the disaggregated matrix: RMSE = {rmse:.2f} mm/h, R² = {r2:.4f}.',
+        'idf_equation_unreliable': (
+            'Unreliable equation: {n_years} years of maxima (at least {min_years} for the catalog '
+            'products) or R² below {min_r2}. The quantiles of short records can be unrealistic.'
+        ),
+        'idf_calc_duration': 'Duration, t (min)',
+        'idf_calc_return_period': 'Return period, Tr (years)',
+        'idf_calc_result': 'Estimated intensity',
+
+        'grid_overlay_show': 'Show design-rainfall surface',
+        'grid_overlay_tr': 'Return period (years)',
+        'grid_overlay_legend': 'Maximum daily precipitation (mm), Tr = {tr} years',
+        'grid_query_title': 'Design rainfall at any point',
+        'grid_query_lat': 'Latitude',
+        'grid_query_lon': 'Longitude',
+        'grid_query_outside': 'Point outside the grid coverage (more than 150 km from any station).',
+        'grid_query_hmax': '**Interpolated maximum daily precipitation (mm)**',
+        'grid_query_idf': '**Intensities (mm/h) by duration (min) and return period (years)**',
+
+        'warmup_title': 'Server warm-up',
+        'warmup_running': 'Loading data and analyses in the background...',
+        'warmup_done': 'Caches pre-loaded in {seconds:.1f} s.',
+
+        'table_sort_by': 'Sort by',
+        'table_no_sort': '(original order)',
+        'table_descending': 'Descending',
+        'table_page_size': 'Rows per page',
+        'table_filter_column': 'Filter column',
+        'table_no_filter': '(no filter)',
+        'table_filter_min': 'Minimum',
+        'table_filter_max': 'Maximum',
+        'table_page': 'Page (of {pages})',
+        'table_rows': 'Rows {first}–{last} of {total}',                 
+
+        'interactive_chart': 'Interactive chart',
+        'interactive_chart_points': 'Showing {shown} of {total} points (the minimum and maximum of each interval, reduced on the server). Zooming the chart does not bring back the daily values: narrow the period in the sidebar to see them.',
+
+        'compute_queued': '⏳ Computing… {position} analysis(es) queued ahead of this station.',
+        'compute_running': '⏳ Computing the analysis of this station…',
+        'compute_busy': 'The server is busy with many analyses right now. Please try again in a moment.',
+        'compute_retry': 'Try again',
+
+        'map_mode': 'Map mode',
+        'map_mode_stations': 'Stations',
+        'map_mode_spi': 'Drought (SPI)',
+        'spi_map_scale': 'SPI scale (months)',
+        'spi_map_month': 'Month',
+        'spi_map_legend': 'SPI-{scale} in {month}',
+        'spi_map_counts': 'SPI-{scale} in {month}: {counts}. No data: {missing} stations.',
+        'spi_map_unavailable': 'SPI cube not found. Build it with: python -m src.utils.build_results spi',
+        'spi_cat_seco_extremo': 'Extremely dry',
+        'spi_cat_seco_severo': 'Severely dry',
+        'spi_cat_seco_moderado': 'Moderately dry',
+        'spi_cat_normal': 'Near normal',
+        'spi_cat_umido_moderado': 'Moderately wet',
+        'spi_cat_umido_severo': 'Severely wet',
+        'spi_cat_umido_extremo': 'Extremely wet',
+
+        'ks_report_duration': 'Maximum precipitation duration (days)',
+
+        'tab_pot': 'Peaks over threshold (GPD)',
+        'pot_unavailable': 'Not enough peaks over the threshold to fit the generalized Pareto distribution.',
+        'pot_mrl_title': '**Mean residual life** (mean excess over the threshold, 95 % CI)',
+        'pot_stability_title': '**Shape parameter stability**',
+        'pot_summary': (
+            '**Threshold:** {threshold:.1f} mm | **Peaks:** {n_peaks} in {years:.1f} years of data '
+            '({rate:.1f} per year) | **Shape (ξ):** {shape:.3f} | **Scale:** {scale:.2f} mm'
+        ),
+        'pot_hmax_table': '**Return levels: annual maxima vs peaks over threshold**',
+        'quality_frequency_pot': (
+            'The peaks-over-threshold tab fits a generalized Pareto distribution to '
+            '{n_peaks} independent storms instead of one maximum per year, giving a '
+            'complementary estimate for short records.'
+        ),
+
+        'map_mode_trend': 'Trends',
+        'trend_map_series': 'Series',
+        'trend_series_maximos_anuais': 'Annual maxima (1 day)',
+        'trend_series_totais_mensais': 'Monthly totals',
+        'trend_map_test': 'Test',
+        'trend_test_mk': 'Trend (Mann-Kendall)',
+        'trend_test_pettitt': 'Change point (Pettitt)',
+        'trend_test_snht': 'Change point (SNHT)',
+        'trend_class_aumento': 'Increase',
+        'trend_class_reducao': 'Decrease',
+        'trend_class_mudanca': 'Significant change',
+        'trend_class_sem_tendencia': 'Not significant',
+        'trend_map_counts': '{counts} (5 % level, {tested} stations tested; stations with fewer than {min_years} years in light grey).',
+        'trend_map_tooltip_mk': 'Sen: {slope:+.2f} mm/year (p = {p:.3f})',
+        'trend_map_tooltip_change': 'Change after {when} (p = {p:.3f})',
+        'trend_map_unavailable': 'Trend tests not found. Build them with: python -m src.utils.build_results trends',
+
+        'tab_nsgev': 'Non-stationary GEV',
+        'nsgev_unavailable': 'The non-stationary GEV requires at least {min_years} annual maxima.',
+        'nsgev_significant': (
+            'The likelihood-ratio test rejects stationarity at the 5 % level '
+            '(smallest p-value: {p:.3f}). Lowest-AIC model: **{model}**.'
+        ),
+        'nsgev_not_significant': (
+            'No trend model differs significantly from the stationary one at the 5 % level '
+            '(smallest p-value: {p:.3f}). Lowest-AIC model: **{model}**.'
+        ),
+        'nsgev_models_title': '**Fitted models** (μ linear and log σ linear in the hydrological year)',
+        'nsgev_model': 'Model',
+        'nsgev_target_year': 'Target year',
+        'nsgev_hmax_table': '**Effective return levels in {year}**',
+        'nsgev_levels_title': '**Effective return levels over the years**',
+
+        'gap_fill_toggle': 'Fill gaps from neighbouring stations',
+        'gap_fill_help': (
+            'Estimates the days without observations from the nearest stations (within 100 km) '
+            'on the same days and reruns the analysis. Build the estimates with: '
+            'python -m src.utils.build_results gapfill'
+        ),
+        'gap_fill_summary': 'Analysis with {filled_days} days filled from neighbouring stations.',
+        'gap_fill_compare': 'Compare fits with and without gap filling',
+        'gap_fill_fits': (
+            '**Without filling:** {years_before} annual maxima, {dist_before} | '
+            '**With filling:** {years_after} annual maxima, {dist_after}'
+        ),
+        'gap_fill_no_baseline': 'Without filling, the station does not have enough annual maxima for the fit.',
     }
 }
 
@@ -291,6 +553,10 @@ categorical_value_labels = {
     'Operante':   {'pt': 'Operante',   'en': 'Operational'},
     'Pane':       {'pt': 'Pane',       'en': 'Malfunction'},
     'Diaria':     {'pt': 'Diária',     'en': 'Daily'},
+    'estacionario':    {'pt': 'Estacionário', 'en': 'Stationary'},
+    'mu(t)':           {'pt': 'μ(t)',         'en': 'μ(t)'},
+    'sigma(t)':        {'pt': 'σ(t)',         'en': 'σ(t)'},
+    'mu(t), sigma(t)': {'pt': 'μ(t), σ(t)',   'en': 'μ(t), σ(t)'},
 }
 
 # Column / field names produced by the raw BDMEP parquet and by the
@@ -406,10 +672,125 @@ column_labels = {
         'en': 'End date'
     },
 
+    'Nome Scipy': {
+        'pt': 'Nome SciPy',
+        'en': 'SciPy name'
+    },
+
+    'parametro 1': {
+        'pt': 'Parâmetro 1',
+        'en': 'Parameter 1'
+    },
+
+    'parametro 2': {
+        'pt': 'Parâmetro 2',
+        'en': 'Parameter 2'
+    },
+
+    'parametro 3': {
+        'pt': 'Parâmetro 3',
+        'en': 'Parameter 3'
+    },
+
+    'n anos': {
+        'pt': 'Nº de máximos anuais',
+        'en': 'No. of annual maxima'
+    },
+
+    'posicao': {
+        'pt': 'Posição KS',
+        'en': 'KS rank'
+    },
+
+    'selecionada': {
+        'pt': 'Selecionada',
+        'en': 'Selected'
+    },
+
     'Periodicidade da Medicao': {
         'pt': 'Periodicidade da medição',
         'en': 'Measurement frequency'
     },
+
+    'h_max,1 POT (mm)': {
+        'pt': 'Precipitação máxima diária, picos acima do limiar (mm)',
+        'en': 'Maximum daily precipitation, peaks over threshold (mm)'
+    },
+
+    'limiar (mm)': {
+        'pt': 'Limiar (mm)',
+        'en': 'Threshold (mm)'
+    },
+
+    'excesso medio (mm)': {
+        'pt': 'Excesso médio (mm)',
+        'en': 'Mean excess (mm)'
+    },
+
+    'excesso medio inferior (mm)': {
+        'pt': 'Limite inferior IC 95 % (mm)',
+        'en': '95 % CI lower bound (mm)'
+    },
+
+    'excesso medio superior (mm)': {
+        'pt': 'Limite superior IC 95 % (mm)',
+        'en': '95 % CI upper bound (mm)'
+    },
+
+    'forma (xi)': {
+        'pt': 'Forma (ξ)',
+        'en': 'Shape (ξ)'
+    },
+
+    'modelo': {
+        'pt': 'Modelo',
+        'en': 'Model'
+    },
+
+    'mu1 (mm/ano)': {
+        'pt': 'Tendência de μ (mm/ano)',
+        'en': 'μ trend (mm/year)'
+    },
+
+    'sigma1 (%/ano)': {
+        'pt': 'Tendência de σ (%/ano)',
+        'en': 'σ trend (%/year)'
+    },
+
+    'forma (c)': {
+        'pt': 'Forma (c)',
+        'en': 'Shape (c)'
+    },
+
+    'razao de verossimilhanca': {
+        'pt': 'Razão de verossimilhança',
+        'en': 'Likelihood ratio'
+    },
+
+    'p-valor': {
+        'pt': 'p-valor',
+        'en': 'p-value'
+    },
+
+    'precipitacao máxima anual (mm)': {
+        'pt': 'Máximo anual observado (mm)',
+        'en': 'Observed annual maximum (mm)'
+    },
+
+    'h_max,1 sem preenchimento (mm)': {
+        'pt': 'Precipitação máxima diária sem preenchimento (mm)',
+        'en': 'Maximum daily precipitation without gap filling (mm)'
+    },
+
+    'h_max,1 com preenchimento (mm)': {
+        'pt': 'Precipitação máxima diária com preenchimento (mm)',
+        'en': 'Maximum daily precipitation with gap filling (mm)'
+    },
+
+    'h_max,1 efetivo (mm)': {
+        'pt': 'Precipitação máxima diária efetiva (mm)',
+        'en': 'Effective maximum daily precipitation (mm)'
+    },
 }
 
 
@@ -0,0 +1,292 @@
+"""Incremental ingestion of raw BDMEP CSV exports into the parquet store.
+
+Usage:
+    python -m src.utils.ingest_bdmep <source_dir> [--data-dir ./data] [--workers 4]
+
+Every ``*.csv`` file in ``source_dir`` is parsed in parallel. For each station only
+the dates not yet present in ``data/dados_<code>_D_<start>_<end>.parquet`` are
+appended, the station file and ``metadata_estacoes.parquet`` are rewritten atomically
+and the changes are recorded in ``data/manifest.json`` so downstream caches can
+invalidate only the stations that actually changed.
+"""
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import pandas as pd
+
+from src.functions.data import read_bdmep_csv, write_parquet_atomic
+
+
+DATE_COL = 'Data Medicao'
+METADATA_FILE = 'metadata_estacoes.parquet'
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_CHUNKSIZE = 50_000
+
+# Header keys (as returned by parse_bdmep_header) -> metadata_estacoes.parquet columns
+METADATA_COLUMNS = {
+    'nome': 'Nome',
+    'codigo_estacao': 'Codigo Estacao',
+    'latitude': 'Latitude',
+    'longitude': 'Longitude',
+    'altitude': 'Altitude',
+    'situacao': 'Situacao',
+    'periodicidade_da_medicao': 'Periodicidade da Medicao',
+}
+
+
+def _existing_dates(data_dir: str, code: str) -> set:
+    files = glob.glob(os.path.join(data_dir, f"dados_{code}_*.parquet"))
+    if not files:
+        return set()
+    return set(pd.read_parquet(files[0], columns=[DATE_COL])[DATE_COL])
+
+
+def read_bdmep_export(path_file: str, data_dir: str = './data',
+                      chunksize: int = DEFAULT_CHUNKSIZE) -> tuple[dict, pd.DataFrame]:
+    """Read the records of a raw BDMEP CSV export that are not yet in the store.
+
+    The export is streamed in chunks and only dates missing from the station file
+    are kept, so memory is bounded by the new records rather than the export size.
+
+    :param path_file: Path to the BDMEP CSV file
+    :param data_dir: Directory with the dados_*.parquet files
+    :param chunksize: Number of rows parsed at a time
+
+    :return: [0] = Metadata from the file header, [1] = New daily records with 'Data Medicao' as 'YYYY-MM-DD' strings
+    """
+    cabecalho, chunks = read_bdmep_csv(
+        path_file, chunksize=chunksize, parse_dates=False)
+    known_dates = _existing_dates(
+        data_dir, cabecalho.get('codigo_estacao', ''))
+
+    new_rows = []
+    for chunk in chunks:
+        chunk.columns = chunk.columns.str.strip()
+        dates = pd.to_datetime(
+            chunk[DATE_COL], format='%Y-%m-%d', errors='coerce')
+        new_rows.append(
+            chunk[dates.notna() & ~chunk[DATE_COL].isin(known_dates)])
+
+    if new_rows:
+        df = pd.concat(new_rows, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=[DATE_COL])
+
+    return cabecalho, df
+
+
+def station_file_name(code: str, dates: pd.Series) -> str:
+    """Build the store file name, e.g. 'dados_A001_D_2000-05-06_2025-04-25.parquet'."""
+    return f"dados_{code}_D_{dates.min()}_{dates.max()}.parquet"
+
+
+def merge_station(data_dir: str, code: str, new_data: pd.DataFrame) -> dict:
+    """Append the dates of new_data that are not yet in the station file.
+
+    :param data_dir: Directory with the dados_*.parquet files
+    :param code: Station code (e.g. 'A001')
+    :param new_data: Daily records parsed from the BDMEP exports of the station
+
+    :return: Change record for the manifest
+    """
+    existing_files = sorted(glob.glob(
+        os.path.join(data_dir, f"dados_{code}_*.parquet")))
+    previous_file = existing_files[0] if existing_files else None
+    new_data = new_data.drop_duplicates(subset=[DATE_COL], keep='last')
+
+    if previous_file is not None:
+        existing = pd.read_parquet(previous_file)
+        added = new_data[~new_data[DATE_COL].isin(existing[DATE_COL])]
+        # Keep the schema of the existing store file
+        added = added.reindex(columns=existing.columns)
+        combined = pd.concat([existing, added], ignore_index=True)
+    else:
+        added = new_data
+        combined = new_data.copy()
+
+    change = {
+        'codigo': code,
+        'action': 'unchanged',
+        'rows_added': int(len(added)),
+        'previous_file': os.path.basename(previous_file) if previous_file else None,
+        'file': os.path.basename(previous_file) if previous_file else None,
+    }
+
+    if added.empty:
+        return change
+
+    combined = combined.sort_values(by=DATE_COL).reset_index(drop=True)
+    new_file = os.path.join(
+        data_dir, station_file_name(code, combined[DATE_COL]))
+    write_parquet_atomic(combined, new_file)
+    if previous_file is not None and os.path.abspath(previous_file) != os.path.abspath(new_file):
+        os.remove(previous_file)
+
+    change.update({
+        'action': 'appended' if previous_file is not None else 'created',
+        'file': os.path.basename(new_file),
+        'rows': int(len(combined)),
+        'data_inicial': combined[DATE_COL].min(),
+        'data_final': combined[DATE_COL].max(),
+    })
+
+    return change
+
+
+def update_metadata(data_dir: str, headers: dict, changes: list) -> pd.DataFrame:
+    """Insert or update the metadata rows of the stations that changed.
+
+    :param data_dir: Directory with metadata_estacoes.parquet
+    :param headers: Station code -> header parsed from its latest BDMEP export
+    :param changes: Change records returned by merge_station
+
+    :return: Updated metadata table
+    """
+    path_file = os.path.join(data_dir, METADATA_FILE)
+    if os.path.exists(path_file):
+        metadata = pd.read_parquet(path_file)
+    else:
+        metadata = pd.DataFrame(columns=['id_arquivo'] + list(METADATA_COLUMNS.values())
+                                + ['Data Inicial', 'Data Final'])
+
+    for change in changes:
+        if change['action'] == 'unchanged':
+            continue
+        code = change['codigo']
+        row = {col: headers[code].get(key)
+               for key, col in METADATA_COLUMNS.items()}
+        row.update({
+            'id_arquivo': code,
+            'Codigo Estacao': code,
+            'Data Inicial': change['data_inicial'],
+            'Data Final': change['data_final'],
+        })
+        mask = metadata['Codigo Estacao'] == code
+        if mask.any():
+            for col, value in row.items():
+                if col in metadata.columns and value is not None:
+                    metadata.loc[mask, col] = value
+        else:
+            metadata = pd.concat(
+                [metadata, pd.DataFrame([row])], ignore_index=True)
+
+    write_parquet_atomic(metadata, path_file)
+
+    return metadata
+
+
+def write_manifest(data_dir: str, source_dir: str, changes: list, started_at: str) -> dict:
+    """Record the ingestion run in data/manifest.json.
+
+    The 'stations' section keeps the current file and last update of every station,
+    so caches keyed by station can compare it with what they were built from.
+    """
+    path_file = os.path.join(data_dir, MANIFEST_FILE)
+    if os.path.exists(path_file):
+        with open(path_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    else:
+        manifest = {'stations': {}, 'runs': []}
+
+    finished_at = datetime.now().isoformat(timespec='seconds')
+    for change in changes:
+        if change['action'] == 'unchanged':
+            continue
+        manifest['stations'][change['codigo']] = {
+            'file': change['file'],
+            'rows': change['rows'],
+            'data_inicial': change['data_inicial'],
+            'data_final': change['data_final'],
+            'updated_at': finished_at,
+        }
+
+    manifest['updated_at'] = finished_at
+    manifest['runs'].append({
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'source_dir': os.path.abspath(source_dir),
+        'changed': [c['codigo'] for c in changes if c['action'] != 'unchanged'],
+        'changes': changes,
+    })
+
+    tmp_path = path_file + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path_file)
+
+    return manifest
+
+
+def ingest(source_dir: str, data_dir: str = './data', workers: int | None = None,
+           chunksize: int = DEFAULT_CHUNKSIZE) -> list:
+    """Ingest every BDMEP CSV export found in source_dir into the parquet store.
+
+    :param source_dir: Directory with the raw BDMEP CSV files
+    :param data_dir: Directory of the parquet store
+    :param workers: Number of parsing processes (None = number of CPUs)
+    :param chunksize: Number of rows parsed at a time per export
+
+    :return: Change records, one per station found in source_dir
+    """
+    started_at = datetime.now().isoformat(timespec='seconds')
+    csv_files = sorted(glob.glob(os.path.join(source_dir, '*.csv'))
+                       + glob.glob(os.path.join(source_dir, '*.CSV')))
+    if not csv_files:
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = list(executor.map(
+            partial(read_bdmep_export, data_dir=data_dir, chunksize=chunksize), csv_files))
+
+    # Several exports of the same station are merged, the latest header wins
+    headers = {}
+    frames = {}
+    for cabecalho, df in parsed:
+        code = cabecalho.get('codigo_estacao')
+        if not code:
+            continue
+        previous = headers.get(code)
+        if previous is None or str(cabecalho.get('data_final')) >= str(previous.get('data_final')):
+            headers[code] = cabecalho
+        frames.setdefault(code, []).append(df)
+
+    changes = [
+        merge_station(data_dir, code, pd.concat(
+            frames[code], ignore_index=True))
+        for code in sorted(frames)
+    ]
+
+    if any(c['action'] != 'unchanged' for c in changes):
+        update_metadata(data_dir, headers, changes)
+    write_manifest(data_dir, source_dir, changes, started_at)
+
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Append new BDMEP CSV exports to the RainData parquet store.')
+    parser.add_argument('source_dir', help='Directory with raw BDMEP CSV files')
+    parser.add_argument('--data-dir', default='./data',
+                        help='Parquet store directory (default: ./data)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of parsing processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f'Rows parsed at a time per export (default: {DEFAULT_CHUNKSIZE})')
+    args = parser.parse_args()
+
+    changes = ingest(args.source_dir, args.data_dir,
+                     args.workers, args.chunksize)
+    for change in changes:
+        print(f"{change['codigo']}: {change['action']} (+{change['rows_added']} rows)"
+              f" -> {change['file']}")
+    print(f"{sum(c['action'] != 'unchanged' for c in changes)} of {len(changes)} stations changed.")
+
+
+if __name__ == "__main__":
+    main()
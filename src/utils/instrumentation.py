@@ -0,0 +1,235 @@
+"""Lightweight per-stage timing and profiling for the Streamlit pages.
+
+A page opens a run with start_run() and closes it with finish_run(). Every function
+decorated with timed_stage() (or block wrapped in stage()) that executes in between is
+recorded with its duration, input/output row counts and, for st.cache_data loaders,
+whether the call was a cache hit or miss. Stages are also written as one JSON object
+per line to the 'raindata.instrumentation' logger; set RAINDATA_METRICS_LOG to a file
+path to persist them.
+
+Outside a run, decorated functions are only timed when that logger is enabled for
+INFO, so the library functions keep their normal cost in batch jobs and benchmarks.
+
+Opt-in switches (environment variable, for every visitor):
+    RAINDATA_DEBUG=1    show the debug panel at the bottom of the page
+    RAINDATA_PROFILE=1  dump a cProfile of the run to ./profiles
+
+On a public deployment the same switches can be turned on for one session with
+?debug=1 / ?profile=1 only when RAINDATA_ADMIN_TOKEN is set and the page also
+carries ?admin=<that token>; the query parameters alone are ignored.
+"""
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+
+logger = logging.getLogger('raindata.instrumentation')
+
+PROFILE_DIR = './profiles'
+
+_current_run = contextvars.ContextVar('raindata_run', default=None)
+_current_stage = contextvars.ContextVar('raindata_stage', default=None)
+
+
+def _configure_from_env():
+    log_path = os.environ.get('RAINDATA_METRICS_LOG')
+    if log_path and not logger.handlers:
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+_configure_from_env()
+
+
+class RunRecorder:
+    """Stages recorded during one execution of a page."""
+
+    def __init__(self, name: str, profile: bool = False, **context):
+        self.name = name
+        self.context = context
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.profile_path = None
+        self.profile_summary = None
+        self._start = time.perf_counter()
+        self._profiler = cProfile.Profile() if profile else None
+        self.total_s = None
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.stages, columns=['stage', 'parent', 'duration_s',
+                                                  'rows_in', 'rows_out', 'cache'])
+
+
+def _row_count(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple):
+        for item in value:
+            if isinstance(item, pd.DataFrame):
+                return len(item)
+    return None
+
+
+def _emit(record: dict):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+def start_run(name: str, profile: bool = False, **context) -> RunRecorder:
+    """Start recording the stages executed by the current page run.
+
+    :param name: Page (or job) name
+    :param profile: Also collect a cProfile of the run
+    :param context: Extra fields written with every stage (e.g. station=...)
+
+    :return: Recorder to pass to finish_run
+    """
+    recorder = RunRecorder(name, profile=profile, **context)
+    _current_run.set(recorder)
+    if recorder._profiler is not None:
+        recorder._profiler.enable()
+
+    return recorder
+
+
+def finish_run(recorder: RunRecorder) -> RunRecorder:
+    """Stop recording, log the run summary and write the profile if requested."""
+    recorder.total_s = time.perf_counter() - recorder._start
+
+    if recorder._profiler is not None:
+        recorder._profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        recorder.profile_path = os.path.join(
+            PROFILE_DIR, f"{recorder.name}_{stamp}.prof")
+        recorder._profiler.dump_stats(recorder.profile_path)
+        buf = io.StringIO()
+        pstats.Stats(recorder._profiler, stream=buf).sort_stats(
+            'cumulative').print_stats(25)
+        recorder.profile_summary = buf.getvalue()
+
+    if _current_run.get() is recorder:
+        _current_run.set(None)
+
+    _emit({
+        'event': 'run',
+        'run': recorder.name,
+        'started_at': recorder.started_at,
+        'total_s': round(recorder.total_s, 6),
+        'stages': len(recorder.stages),
+        'profile': recorder.profile_path,
+        **recorder.context,
+    })
+
+    return recorder
+
+
+@contextmanager
+def stage(name: str, rows_in: int | None = None, cached: bool = False):
+    """Record the block as a stage of the current run.
+
+    The yielded dict can be updated inside the block (e.g. record['rows_out'] = n).
+    With cached=True the stage counts as a cache hit unless the cached function body
+    calls record_cache_miss().
+    """
+    parent = _current_stage.get()
+    record = {
+        'stage': name,
+        'parent': parent['stage'] if parent is not None else None,
+        'duration_s': None,
+        'rows_in': rows_in,
+        'rows_out': None,
+        'cache': 'hit' if cached else None,
+    }
+    token = _current_stage.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['duration_s'] = time.perf_counter() - start
+        _current_stage.reset(token)
+        recorder = _current_run.get()
+        if recorder is not None:
+            recorder.stages.append(record)
+            _emit({'event': 'stage', 'run': recorder.name,
+                   **recorder.context, **record})
+        else:
+            _emit({'event': 'stage', **record})
+
+
+def record_cache_miss():
+    """Mark the enclosing cached stage as a miss (call it inside the cached function)."""
+    record = _current_stage.get()
+    if record is not None:
+        record['cache'] = 'miss'
+
+
+def timed_stage(name: str | None = None, cached: bool = False):
+    """Decorator recording each call of the function as a stage.
+
+    The input row count is taken from the first DataFrame argument and the output row
+    count from the returned DataFrame (or the first DataFrame of a returned tuple).
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_run.get() is None and not logger.isEnabledFor(logging.INFO):
+                return func(*args, **kwargs)
+
+            rows_in = next((len(a) for a in list(args) + list(kwargs.values())
+                            if isinstance(a, pd.DataFrame)), None)
+            with stage(stage_name, rows_in=rows_in, cached=cached) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = _row_count(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def is_enabled(option: str) -> bool:
+    """Whether RAINDATA_<OPTION>=1 is set, or the page was opened with ?<option>=1 together
+    with ?admin= matching RAINDATA_ADMIN_TOKEN (never the query parameter alone)."""
+    if os.environ.get(f"RAINDATA_{option.upper()}") == '1':
+        return True
+    token = os.environ.get('RAINDATA_ADMIN_TOKEN', '')
+    if not token:
+        return False
+    try:
+        import streamlit as st
+        return (st.query_params.get(option) == '1'
+                and hmac.compare_digest(st.query_params.get('admin', ''), token))
+    except Exception:
+        return False
+
+
+def show_debug_panel(recorder: RunRecorder):
+    """Render the recorded stages of the run in an expander."""
+    import streamlit as st
+
+    with st.expander(f"Debug: {recorder.name} ({recorder.total_s:.3f} s)"):
+        frame = recorder.to_frame()
+        st.dataframe(frame, hide_index=True, width='stretch')
+        if not frame.empty:
+            top_level = frame.loc[frame['parent'].isna(), 'duration_s'].sum()
+            st.caption(
+                f"Top-level stages: {top_level:.3f} s of {recorder.total_s:.3f} s")
+        if recorder.profile_path:
+            st.caption(f"Profile: {recorder.profile_path}")
+            st.code(recorder.profile_summary)
@@ -0,0 +1,83 @@
+"""Paginated table widget: only the visible page is sent to the browser."""
+import math
+
+import pandas as pd
+import streamlit as st
+
+from src.functions.data import slice_table
+from src.utils.i18n import get_text, translate_column
+
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def show_paginated_table(df: pd.DataFrame, key: str, lang: str):
+    """Render df one page at a time, with sorting and a numeric range filter.
+
+    Filtering, sorting and slicing run on the server (slice_table); st.dataframe
+    only receives the rows of the current page.
+
+    :param df: Full table
+    :param key: Unique prefix of the widget keys
+    :param lang: Interface language
+    """
+    columns = list(df.columns)
+    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+
+    c1, c2, c3 = st.columns([2, 1, 1])
+    sort_by = c1.selectbox(
+        get_text('table_sort_by', lang),
+        options=[None] + columns,
+        format_func=lambda c: get_text('table_no_sort', lang) if c is None else translate_column(c, lang),
+        key=f"{key}_sort_by"
+    )
+    descending = c2.toggle(get_text('table_descending', lang), key=f"{key}_descending")
+    page_size = c3.selectbox(
+        get_text('table_page_size', lang), options=PAGE_SIZES, key=f"{key}_page_size")
+
+    value_range = None
+    if numeric_cols:
+        f1, f2, f3 = st.columns([2, 1, 1])
+        filter_col = f1.selectbox(
+            get_text('table_filter_column', lang),
+            options=[None] + numeric_cols,
+            format_func=lambda c: get_text('table_no_filter', lang) if c is None else translate_column(c, lang),
+            key=f"{key}_filter_col"
+        )
+        if filter_col is not None:
+            col_min = float(df[filter_col].min()) if df[filter_col].notna().any() else 0.0
+            col_max = float(df[filter_col].max()) if df[filter_col].notna().any() else 0.0
+            minimum = f2.number_input(
+                get_text('table_filter_min', lang), value=col_min, key=f"{key}_min_{filter_col}")
+            maximum = f3.number_input(
+                get_text('table_filter_max', lang), value=col_max, key=f"{key}_max_{filter_col}")
+            value_range = (filter_col, minimum, maximum)
+
+    # Back to the first page whenever the table or its filter/sort changes
+    signature = (len(df), sort_by, descending, page_size, value_range)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_page"] = 1
+
+    total = len(df) if value_range is None else int(df[filter_col].between(minimum, maximum).sum())
+    n_pages = max(1, math.ceil(total / page_size))
+    st.session_state[f"{key}_page"] = min(st.session_state[f"{key}_page"], n_pages)
+
+    page = st.number_input(
+        get_text('table_page', lang, pages=n_pages),
+        min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+
+    page_df, _ = slice_table(df, page, page_size, sort_by=sort_by,
+                             ascending=not descending, value_range=value_range)
+
+    st.dataframe(
+        page_df,
+        width='stretch',
+        column_config={
+            c: st.column_config.Column(translate_column(c, lang))
+            for c in columns
+        }
+    )
+    first = (page - 1) * page_size + 1 if total else 0
+    st.caption(get_text('table_rows', lang, first=first,
+                        last=(page - 1) * page_size + len(page_df), total=total))
@@ -0,0 +1,177 @@
+"""Background warm-up of the app caches after the server starts.
+
+start_warmup() is called by app.py on every run but, being an st.cache_resource,
+only starts the warm-up thread once per server process. The thread fills the same
+st.cache_data caches the pages read, so the first visitors get cache hits:
+
+    catalog        station catalog: metadata and data files (load_station_catalog)
+    map_layer      station markers of the home map, in every language
+    analysis       load_station_analysis of the most visited stations (on the compute pool)
+
+The analysis page records the station visits in results/station_visits.json.
+
+Environment:
+    RAINDATA_WARMUP=0             disable the warm-up
+    RAINDATA_WARMUP_STATIONS=N    number of stations analysed (default: 5)
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from src.functions.analysis import load_station_analysis
+from src.functions.catalog import load_station_catalog
+from src.functions.data import RESULTS_DIR
+from src.functions.maps import station_markers
+from src.utils.compute import get_compute_pool
+from src.utils.i18n import get_text, translations
+
+
+logger = logging.getLogger('raindata.warmup')
+
+VISITS_FILE = os.path.join(RESULTS_DIR, 'station_visits.json')
+
+_visits_lock = threading.Lock()
+
+
+def _read_visits() -> dict:
+    try:
+        with open(VISITS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_station_visit(code: str):
+    """Increment the visit count of a station (best effort, never raises)."""
+    with _visits_lock:
+        visits = _read_visits()
+        visits[code] = visits.get(code, 0) + 1
+        try:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            tmp_path = VISITS_FILE + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(visits, f)
+            os.replace(tmp_path, VISITS_FILE)
+        except OSError:
+            logger.warning("Could not record the visit of station %s.", code)
+
+
+def most_visited_stations(n: int, available: list) -> list:
+    """The n most visited stations among the available codes (sorted codes if no visits yet)."""
+    visits = _read_visits()
+    ranked = sorted(available, key=lambda code: (-visits.get(code, 0), code))
+
+    return ranked[:n]
+
+
+class WarmupStatus:
+    """Progress of the warm-up steps, read by the status panel."""
+
+    def __init__(self, steps: list):
+        self.steps = [{'step': step, 'state': 'pending', 'duration_s': None, 'detail': ''}
+                      for step in steps]
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def progress(self) -> float:
+        finished = sum(step['state'] in ('done', 'failed') for step in self.steps)
+        return finished / len(self.steps) if self.steps else 1.0
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.steps, columns=['step', 'state', 'duration_s', 'detail'])
+
+
+def _run_step(step: dict, func):
+    step['state'] = 'running'
+    start = time.perf_counter()
+    try:
+        step['detail'] = func() or ''
+        step['state'] = 'done'
+    except Exception as e:
+        step['detail'] = str(e)
+        step['state'] = 'failed'
+        logger.exception("Warm-up step %s failed.", step['step'])
+    finally:
+        step['duration_s'] = round(time.perf_counter() - start, 3)
+
+
+def run_warmup(status: WarmupStatus, n_stations: int):
+    """Execute the warm-up steps in order, recording their progress in status."""
+    def catalog():
+        station_catalog = load_station_catalog()
+        if station_catalog is None:
+            return "no metadata"
+        return f"{len(station_catalog)} stations, {station_catalog.frame['arquivo'].notna().sum()} files"
+
+    def map_layer():
+        for lang in translations:
+            station_markers(lang)
+        return f"{len(translations)} languages"
+
+    def analysis():
+        station_catalog = load_station_catalog()
+        if station_catalog is None:
+            return "no metadata"
+        available = [code for code in station_catalog.codes if station_catalog.data_file(code)]
+        codes = most_visited_stations(n_stations, available)
+        analysed = []
+        for code in codes:
+            path_file = station_catalog.data_file(code)
+            try:
+                # Through the compute pool, so visitors' analyses are not starved by the warm-up
+                get_compute_pool().submit(
+                    'warmup', ('analysis', path_file), load_station_analysis, path_file
+                ).future.result()
+                analysed.append(code)
+            except Exception:
+                # Stations the page cannot analyse either (e.g. too few complete years)
+                logger.info("Warm-up skipped station %s.", code)
+            status.steps[-1]['detail'] = f"{len(analysed)}/{len(codes)}: {', '.join(analysed)}"
+        return status.steps[-1]['detail']
+
+    funcs = {'catalog': catalog, 'map_layer': map_layer, 'analysis': analysis}
+    for step in status.steps:
+        _run_step(step, funcs[step['step']])
+
+    status.finished_at = time.time()
+    logger.info("Warm-up finished in %.1f s.", status.finished_at - status.started_at)
+
+
+@st.cache_resource
+def start_warmup() -> WarmupStatus | None:
+    """Start the warm-up thread once per server process (None when disabled)."""
+    if os.environ.get('RAINDATA_WARMUP') == '0':
+        return None
+
+    n_stations = int(os.environ.get('RAINDATA_WARMUP_STATIONS', '5'))
+    status = WarmupStatus(['catalog', 'map_layer', 'analysis'])
+    thread = threading.Thread(target=run_warmup, args=(status, n_stations),
+                              name='raindata-warmup', daemon=True)
+    thread.start()
+
+    return status
+
+
+def show_warmup_status(status: WarmupStatus | None, lang: str, details: bool = False):
+    """Sidebar panel with the warm-up progress (hidden once done unless details is set)."""
+    if status is None or (status.done and not details):
+        return
+
+    with st.sidebar.expander(get_text('warmup_title', lang), expanded=not status.done):
+        if status.done:
+            st.caption(get_text('warmup_done', lang,
+                                seconds=status.finished_at - status.started_at))
+        else:
+            st.progress(status.progress, text=get_text('warmup_running', lang))
+        if details:
+            st.dataframe(status.to_frame(), hide_index=True, width='stretch')
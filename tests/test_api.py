@@ -0,0 +1,78 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+from starlette.testclient import TestClient
+
+from src.api.app import ARROW_MEDIA_TYPE, create_app
+
+
+@pytest.fixture
+def client(tmp_path):
+    data_dir = tmp_path / 'data'
+    results_dir = tmp_path / 'results'
+    data_dir.mkdir()
+    results_dir.mkdir()
+
+    pd.DataFrame({
+        'Codigo Estacao': [f"A{i:03d}" for i in range(1, 41)],
+        'Nome': [f"ESTACAO {i}" for i in range(1, 41)],
+        'Latitude': [-15.0 - i / 10 for i in range(40)],
+        'Longitude': [-47.0 - i / 10 for i in range(40)],
+    }).to_parquet(data_dir / 'metadata_estacoes.parquet')
+    pd.DataFrame({
+        'Codigo Estacao': ['A001', 'A002'],
+        'a': [0.1, 0.2],
+    }).to_parquet(results_dir / 'idf_parameters.parquet')
+
+    app = create_app(data_dir=str(data_dir), results_dir=str(results_dir), max_workers=1)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_stations_json_with_etag(client):
+    response = client.get('/stations')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/json')
+    assert len(response.json()) == 40
+
+    etag = response.headers['etag']
+    cached = client.get('/stations', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['etag'] == etag
+    assert cached.content == b''
+
+
+def test_etag_depends_on_format(client):
+    json_etag = client.get('/stations').headers['etag']
+    response = client.get('/stations?format=arrow', headers={'If-None-Match': json_etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != json_etag
+
+
+def test_large_responses_are_gzipped(client):
+    response = client.get('/stations', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    # httpx decompresses the body transparently
+    assert len(response.json()) == 40
+
+    small = client.get('/results/idf_parameters', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in small.headers
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'params': {'format': 'arrow'}},
+    {'headers': {'Accept': ARROW_MEDIA_TYPE}},
+])
+def test_arrow_stream(client, kwargs):
+    response = client.get('/results/idf_parameters', **kwargs)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == ARROW_MEDIA_TYPE
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column('Codigo Estacao').to_pylist() == ['A001', 'A002']
+
+
+def test_errors(client):
+    assert client.get('/stations?format=csv').status_code == 400
+    assert client.get('/results/missing').status_code == 404
+    assert client.get('/stations/XYZ/daily').status_code == 404